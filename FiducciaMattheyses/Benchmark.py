@@ -0,0 +1,184 @@
+import argparse
+import random
+import sys
+import time
+from collections import namedtuple
+from . import Engines
+from . Evaluate import evaluate
+from . FiducciaMattheyses import FiducciaMattheyses
+from . Formats import read_hmetis, read_metis
+from . Hypergraph import Hypergraph, HypergraphBuilder
+from . Trace import Trace
+from . Util import FIFO, LIFO, RANDOM
+
+__author__ = 'gm'
+
+# name of every configuration and the keyword arguments given to FiducciaMattheyses
+CONFIGURATIONS = [
+    ("fifo", {"policy": FIFO}),
+    ("lifo", {"policy": LIFO}),
+    ("random", {"policy": RANDOM, "seed": 0}),
+    ("fifo+lookahead2", {"policy": FIFO, "lookahead": 2}),
+    ("fifo+lookahead3", {"policy": FIFO, "lookahead": 3}),
+    ("lifo+lookahead3", {"policy": LIFO, "lookahead": 3}),
+]
+
+BenchmarkResult = namedtuple("BenchmarkResult", ["name", "cutset", "passes", "moves", "seconds",
+                                                 "passes_to_target", "seconds_to_target"])
+
+
+def random_hypergraph(num_cells: int, num_nets: int, max_net_size: int = 4, spread: int = 20,
+                      seed: int = 0) -> Hypergraph:
+    """
+    a random hypergraph with some locality: the cells of every net are picked around a random center cell, at most
+    spread cells away from it, which gives the hypergraph a structure that can be cut well
+    """
+    assert 2 <= max_net_size <= 2 * spread + 1 <= num_cells
+    rnd = random.Random(seed)
+    builder = HypergraphBuilder(num_cells)
+    for i in range(num_nets):
+        center = rnd.randrange(num_cells)
+        size = rnd.randint(2, max_net_size)
+        builder.add_net([(center + x) % num_cells for x in rnd.sample(range(-spread, spread + 1), size)])
+    return builder.build()
+
+
+def run(hypergraph: Hypergraph, configurations=None, target=None) -> list:
+    """
+    partition the hypergraph once with every configuration and measure it. The target cut defaults to the best
+    cutset reached by any configuration, passes_to_target and seconds_to_target tell how long each configuration
+    needed to first reach it (None if it never did). Building cell_array and net_array is not timed
+
+    returns a list of BenchmarkResult
+    """
+    if configurations is None:
+        configurations = CONFIGURATIONS
+    runs = []
+    for name, kwargs in configurations:
+        fm = FiducciaMattheyses(**kwargs)
+        fm.input_hypergraph(hypergraph)
+        start = time.perf_counter()
+        fm.find_mincut()
+        seconds = time.perf_counter() - start
+        runs.append((name, fm, seconds))
+
+    if target is None:
+        target = min(fm.cutset for name, fm, seconds in runs)
+    results = []
+    for name, fm, seconds in runs:
+        passes_to_target = None
+        seconds_to_target = None
+        for i, (cutset, elapsed) in enumerate(fm.history):
+            if cutset <= target:
+                passes_to_target = i + 1
+                seconds_to_target = elapsed
+                break
+        results.append(BenchmarkResult(name, fm.cutset, fm.passes, fm.moves, seconds, passes_to_target,
+                                       seconds_to_target))
+    return results
+
+
+def conformance(hypergraph: Hypergraph, engine: str, **kwargs):
+    """
+    partition the hypergraph with the given engine and check the result: every cell is in one block, the cutset,
+    block sizes, net distributions and cut nets agree with the partition, the balance criterion holds and, for
+    engines that are exact, the partition (not the order of the cells) is the one of the python engine. Raises
+    AssertionError otherwise
+
+    returns the FiducciaMattheyses instance that ran the engine
+    """
+    fm = FiducciaMattheyses(engine=engine, **kwargs)
+    fm.input_hypergraph(hypergraph)
+    assert Engines.resolve(fm).name == engine, "the %s engine cannot run these settings" % engine
+    blockA, blockB = fm.find_mincut()
+
+    assert sorted(blockA + blockB) == sorted(fm.cell_array)
+    assert fm.blockA.size == sum(fm.cell_array[n].weight for n in blockA)
+    assert fm.blockB.size == sum(fm.cell_array[n].weight for n in blockB)
+    labels = fm.labels()
+    for net in fm.net_array.values():
+        assert net.blockB == sum(labels[c.n] for c in net.cells)
+        assert net.cut == (0 < net.blockB < len(net.cells))
+    assert set(fm.cut_nets) == set(net for net in fm.net_array.values() if net.cut)
+    assert fm.cutset == sum(net.weight for net in fm.cut_nets)
+    assert fm.cutset == evaluate(hypergraph, labels, fm.r).cut
+    W = fm.blockA.size + fm.blockB.size
+    assert abs(fm.blockA.size - fm.r * W) <= fm.smax
+
+    if Engines.ENGINES[engine].exact and engine != Engines.PYTHON:
+        reference = FiducciaMattheyses(engine=Engines.PYTHON, **kwargs)
+        reference.input_hypergraph(hypergraph)
+        refA, refB = reference.find_mincut()
+        assert sorted(refA) == sorted(blockA) and sorted(refB) == sorted(blockB)
+        assert reference.cutset == fm.cutset and reference.passes == fm.passes
+    return fm
+
+
+def compare_engines(hypergraph: Hypergraph, engines=None, target=None, **kwargs) -> list:
+    """
+    run() with one configuration per engine, all with the same other settings
+
+    :param engines: names of the engines to compare, defaults to all that are available
+    """
+    if engines is None:
+        engines = Engines.available()
+    return run(hypergraph, [(name, dict(kwargs, engine=name)) for name in engines], target)
+
+
+def time_selection(hypergraph: Hypergraph, **kwargs):
+    """
+    partition the hypergraph twice with the given FiducciaMattheyses keyword arguments: once recording a trace and
+    once replaying it. The replay performs the same moves and gain updates but selects no base cells, so the
+    difference of the two times is the cost of selection. Building cell_array and net_array is not timed
+
+    returns (seconds recording, seconds replaying, trace)
+    """
+    trace = Trace()
+    times = []
+    for settings in ({"trace": trace}, {"replay": trace}):
+        fm = FiducciaMattheyses(**settings, **kwargs)
+        fm.input_hypergraph(hypergraph)
+        start = time.perf_counter()
+        fm.find_mincut()
+        times.append(time.perf_counter() - start)
+    return times[0], times[1], trace
+
+
+def format_results(results: list) -> str:
+    lines = ["%-18s %8s %7s %8s %9s %10s %10s" % ("configuration", "cutset", "passes", "moves", "seconds",
+                                                  "to target", "seconds")]
+    for r in results:
+        lines.append("%-18s %8d %7d %8d %9.3f %10s %10s" % (
+            r.name, r.cutset, r.passes, r.moves, r.seconds,
+            "-" if r.passes_to_target is None else "%d" % r.passes_to_target,
+            "-" if r.seconds_to_target is None else "%.3f" % r.seconds_to_target))
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="compare the bucket policies and lookahead levels of "
+                                                 "FiducciaMattheyses on one hypergraph")
+    parser.add_argument("input", nargs="?", help=".hgr or .graph file, a random hypergraph is used if not given")
+    parser.add_argument("--cells", type=int, default=2000, help="cells of the random hypergraph")
+    parser.add_argument("--nets", type=int, default=3000, help="nets of the random hypergraph")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random hypergraph")
+    parser.add_argument("--target", type=int, help="target cut, defaults to the best cut found")
+    parser.add_argument("--engines", action="store_true",
+                        help="compare the available engines instead of the bucket policies")
+    args = parser.parse_args(argv)
+
+    if args.input is None:
+        hypergraph = random_hypergraph(args.cells, args.nets, seed=args.seed)
+    elif args.input.endswith(".graph"):
+        hypergraph = read_metis(args.input)
+    else:
+        hypergraph = read_hmetis(args.input)
+    if args.engines:
+        print(format_results(compare_engines(hypergraph, target=args.target)))
+    else:
+        print(format_results(run(hypergraph, target=args.target)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import hashlib
+import os
+import tempfile
+import numpy as np
+from . Hypergraph import Hypergraph, HypergraphView
+
+__author__ = 'gm'
+
+VERSION = 2  # part of every key, bump it when a change to the engine gives different partitions
+SUFFIX = ".npz"
+
+
+def _update(h, array):
+    """
+    feed an array to the hash h, None and arrays of any integer type holding the same values hash the same
+    """
+    if array is None:
+        h.update(b"none")
+    else:
+        array = np.ascontiguousarray(array, dtype=np.int64)
+        h.update(b"%d:" % len(array))
+        h.update(array.tobytes())
+
+
+def hypergraph_digest(hypergraph) -> str:
+    """
+    returns a hex digest of the cells, nets and weights of a Hypergraph or HypergraphView. Two hypergraphs with the
+    same digest give the same partition
+    """
+    h = hashlib.sha256()
+    if isinstance(hypergraph, HypergraphView):
+        h.update(b"view")
+        h.update(hypergraph_digest(hypergraph.parent).encode())
+        _update(h, hypergraph.cell_ids)
+        _update(h, hypergraph.net_ids)
+    else:
+        assert isinstance(hypergraph, Hypergraph)
+        h.update(b"hypergraph %d" % hypergraph.num_cells)
+        _update(h, hypergraph.net_ptr)
+        _update(h, hypergraph.pins)
+        _update(h, hypergraph.cell_weights)
+        _update(h, hypergraph.net_weights)
+    return h.hexdigest()
+
+
+def cache_key(hypergraph, keep_isolated: bool, r: float, policy: str, lookahead: int, seed,
+              net_threshold, reorder=None, boundary: bool = False, engine: str = None) -> str:
+    """
+    returns the key of a partition result: a digest of the hypergraph and of every parameter that changes the
+    partition FiducciaMattheyses finds. The engine does not if it is exact, the python engine and the kernel give
+    the same partition, see Benchmark.conformance(), so they share results
+
+    :param engine: the name of an engine that is not exact, None for the exact ones
+    """
+    h = hashlib.sha256()
+    h.update(hypergraph_digest(hypergraph).encode())
+    parameters = (VERSION, bool(keep_isolated), float(r), policy, lookahead, seed, net_threshold, reorder,
+                  bool(boundary))
+    if engine is not None:
+        parameters += (engine,)
+    h.update(repr(parameters).encode())
+    return h.hexdigest()
+
+
+class PartitionCache:
+    """
+    partition results stored in a directory, one compressed .npz file per key. Files are written to a temporary
+    name and renamed into place, so processes sharing the directory never read a partly written result. When the
+    files take more than max_bytes the least recently used ones are removed, a hit counts as a use
+    """
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        assert max_bytes > 0
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key: str):
+        """
+        returns (labels, cutset) stored for key or None. labels[i] is 0 or 1 for the block of cell i and -1 for
+        cells that were not part of the partition
+        """
+        path = self.path(key)
+        try:
+            with np.load(path) as data:
+                labels = data["labels"]
+                cutset = int(data["cutset"])
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:  # never stored, or removed by another process
+            self.misses += 1
+            return None
+        except (OSError, ValueError, KeyError):  # unreadable, drop it so that it gets stored again
+            self.__remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return labels, cutset
+
+    def put(self, key: str, labels, cutset: int):
+        """
+        store the labels and cutset of a partition under key, then remove least recently used results if the cache
+        went over max_bytes
+        """
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, labels=np.asarray(labels, dtype=np.int8), cutset=np.int64(cutset))
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            self.__remove(tmp)
+            raise
+        self.__evict()
+
+    def size(self) -> int:
+        """
+        returns the bytes taken by the stored results
+        """
+        return sum(size for path, mtime, size in self.__entries())
+
+    def clear(self):
+        for path, mtime, size in self.__entries():
+            self.__remove(path)
+
+    def __entries(self) -> list:
+        """
+        returns (path, last use, size) of every stored result
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, st.st_mtime, st.st_size))
+        return entries
+
+    def __evict(self):
+        entries = self.__entries()
+        total = sum(size for path, mtime, size in entries)
+        entries.sort(key=lambda e: e[1])
+        for path, mtime, size in entries:
+            if total <= self.max_bytes:
+                break
+            self.__remove(path)
+            total -= size
+
+    @staticmethod
+    def __remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:  # another process got there first
+            pass
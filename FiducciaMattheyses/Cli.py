@@ -0,0 +1,125 @@
+import argparse
+import logging
+import sys
+from . FiducciaMattheyses import FiducciaMattheyses
+from . Cache import PartitionCache
+from . Formats import read_hmetis, read_metis, read_binary, write_binary, write_partition, HmetisStream
+from . import Memory
+from . import Preprocess
+from . import Stream
+from . Reorder import ORDERS
+
+__author__ = 'gm'
+
+READERS = {
+    "hmetis": read_hmetis,
+    "metis": read_metis,
+    "binary": read_binary,
+}
+
+EXTENSIONS = {
+    ".hgr": "hmetis",
+    ".graph": "metis",
+    ".fmhg": "binary",
+}
+
+
+def guess_format(path: str) -> str:
+    """
+    guess the format of an input file from its extension, hMETIS is assumed for unknown extensions
+    """
+    for extension, fmt in EXTENSIONS.items():
+        if path.endswith(extension):
+            return fmt
+    return "hmetis"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="fm-partition",
+                                     description="bipartition an hMETIS hypergraph, a METIS graph or a binary "
+                                                 "hypergraph using the Fiduccia Mattheyses algorithm")
+    parser.add_argument("input", help="the .hgr, .graph or .fmhg file to partition")
+    parser.add_argument("-o", "--output", help="the partition file to write, defaults to <input>.part.2")
+    parser.add_argument("-f", "--format", choices=sorted(READERS.keys()),
+                        help="format of the input file, guessed from its extension if not given")
+    parser.add_argument("-r", "--ratio", type=float, default=FiducciaMattheyses.r,
+                        help="intended size of block 0 relative to the total size (default: %(default)s)")
+    parser.add_argument("-t", "--net-threshold", type=int,
+                        help="nets with more cells than this are left out of gain updates, they still count as cut")
+    parser.add_argument("-c", "--cache", help="directory of a cache of partition results, reused across runs")
+    parser.add_argument("-p", "--preprocess", action="store_true",
+                        help="merge duplicate nets, contract pendant cells and partition connected components apart")
+    parser.add_argument("-s", "--stream", action="store_true",
+                        help="read the nets of an hMETIS file as a stream, assign cells greedily and refine windows "
+                             "of nets, for hypergraphs too large to build")
+    parser.add_argument("--window", type=int, default=Stream.WINDOW,
+                        help="pins refined at a time with --stream (default: %(default)s)")
+    parser.add_argument("--reorder", choices=ORDERS, help="store cells in this order for better memory locality")
+    parser.add_argument("-b", "--write-binary", metavar="PATH",
+                        help="also save the input as a binary hypergraph, which later runs map instead of parsing")
+    parser.add_argument("-m", "--memory-limit", type=float, metavar="MB",
+                        help="refuse inputs that are estimated to need more memory than this before building them")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log the cutset of every pass")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+
+    fmt = args.format if args.format is not None else guess_format(args.input)
+    output = args.output if args.output is not None else args.input + ".part.2"
+    if args.stream:
+        if fmt != "hmetis":
+            print("--stream reads hMETIS files only", file=sys.stderr)
+            return 2
+        nets = HmetisStream(args.input)
+        result = Stream.partition(nets, nets.num_cells, args.ratio, cell_weights=nets.cell_weights,
+                                  window=args.window, net_threshold=args.net_threshold)
+        write_partition(output, result.labels.tolist())
+        print("cells: %d nets: %d cutset: %d sizes: %d %d" % (nets.num_cells, nets.num_nets, result.cutset,
+                                                             result.sizeA, result.sizeB))
+        print("windows: %d refined: %d" % (result.windows, result.refined))
+        return 0
+    hypergraph = READERS[fmt](args.input)
+    if args.write_binary is not None:
+        write_binary(args.write_binary, hypergraph)
+    if args.memory_limit is not None:
+        needed = Memory.estimate(hypergraph.num_cells, hypergraph.num_nets, hypergraph.num_pins).total
+        if needed > args.memory_limit * 2 ** 20:
+            print("estimated memory %.1f MB is above the limit of %.1f MB" % (needed / 2 ** 20, args.memory_limit),
+                  file=sys.stderr)
+            return 3
+
+    if args.preprocess:
+        result = Preprocess.partition(hypergraph, args.ratio, net_threshold=args.net_threshold,
+                                      reorder=args.reorder)
+        labels = result.labels.tolist()
+        blockA = [cell for cell, label in enumerate(labels) if label == 0]
+        blockB = [cell for cell, label in enumerate(labels) if label == 1]
+        cutset = result.cutset
+    else:
+        cache = PartitionCache(args.cache) if args.cache is not None else None
+        fm = FiducciaMattheyses(r=args.ratio, net_threshold=args.net_threshold, cache=cache, reorder=args.reorder)
+        blockA, blockB = fm.partition(hypergraph)
+        labels = [0] * hypergraph.num_cells
+        for cell in blockB:
+            labels[cell] = 1
+        cutset = fm.cutset
+    write_partition(output, labels)
+
+    sizes = [sum(hypergraph.cell_weight(cell) for cell in block) for block in (blockA, blockB)]
+    print("cells: %d nets: %d cutset: %d sizes: %d %d" % (hypergraph.num_cells, hypergraph.num_nets, cutset,
+                                                         sizes[0], sizes[1]))
+    if args.preprocess:
+        print("components: %d split: %d merged nets: %d contracted cells: %d" % (
+            result.components, result.split, result.merged_nets, result.contracted_cells))
+    elif fm.cache_hit:
+        print("partition read from the cache")
+    elif fm.large_nets != 0:
+        print("large nets: %d cutset due to large nets: %d" % (fm.large_nets, fm.large_cut))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,403 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import traceback
+from collections import namedtuple
+import numpy as np
+from . FiducciaMattheyses import FiducciaMattheyses
+from . Formats import read_binary, write_binary
+from . Hypergraph import Hypergraph
+from . import KWay
+
+__author__ = 'gm'
+
+# every message is the length of a json header, the header, then the arrays the header lists as (dtype, length).
+# Messages are never unpickled, a worker only runs the operations of OPERATIONS
+LENGTH = struct.Struct("<I")
+GRAPH = "graph"  # the hypergraph a coordinator works on, in the binary format of Formats.write_binary()
+HAS = "has"  # whether the worker already has a hypergraph, so that it is shipped once per worker
+START = "start"  # one find_mincut() of the whole hypergraph with a seed
+BISECT = "bisect"  # one bisection of a set of cells, a step of KWay.recursive_bisection()
+PAIR = "pair"  # one refinement of a pair of blocks, a step of KWay.refine()
+CLOSE = "close"
+OPERATIONS = (GRAPH, HAS, START, BISECT, PAIR, CLOSE)
+
+StartResult = namedtuple("StartResult", ["seed", "cutset", "labels"])
+StartResult.__doc__ = """
+one find_mincut() of Coordinator.multistart(), labels[i] is the block of cell i
+"""
+
+
+def _receive_exactly(sock: socket.socket, n: int) -> bytes:
+    data = bytearray()
+    while len(data) < n:
+        chunk = sock.recv(min(n - len(data), 1 << 20))
+        if len(chunk) == 0:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return bytes(data)
+
+
+def send(sock: socket.socket, header: dict, arrays=()):
+    """
+    send a message: header is a json serializable dict, arrays are numpy arrays sent as raw bytes after it
+    """
+    arrays = [np.ascontiguousarray(a) for a in arrays]
+    raw = json.dumps(dict(header, arrays=[(a.dtype.str, len(a)) for a in arrays])).encode()
+    sock.sendall(LENGTH.pack(len(raw)) + raw)
+    for a in arrays:
+        sock.sendall(a.data)
+
+
+def receive(sock: socket.socket):
+    """
+    receive a message sent by send(), returns (header, list of arrays)
+    """
+    header = json.loads(_receive_exactly(sock, LENGTH.unpack(_receive_exactly(sock, LENGTH.size))[0]))
+    arrays = []
+    for dtype, length in header.pop("arrays"):
+        dtype = np.dtype(dtype)
+        arrays.append(np.frombuffer(_receive_exactly(sock, dtype.itemsize * length), dtype=dtype))
+    return header, arrays
+
+
+def _run(hypergraph: Hypergraph, header: dict, arrays: list):
+    """
+    perform a task on a worker, returns the (header, arrays) of the reply
+    """
+    settings = header["settings"]
+    if header["op"] == START:
+        fm = FiducciaMattheyses(r=header["r"], seed=header["seed"], **settings)
+        fm.input_hypergraph(hypergraph, keep_isolated=True)
+        labels = fm.find_mincut(as_labels=True)
+        return {"cutset": int(fm.cutset)}, [labels]
+    if header["op"] == BISECT:
+        return {}, [KWay._bisect(hypergraph, arrays[0], header["r"], settings).astype(np.int8)]
+    side, before, after = KWay._refine_pair(hypergraph, arrays[0], arrays[1], settings)
+    return {"before": int(before), "after": int(after)}, [side.astype(np.int8)]
+
+
+class Worker:
+    """
+    a TCP server that performs the tasks of coordinators. Hypergraphs are kept in directory in the binary format and
+    mapped from there, under the hash of their bytes, so a hypergraph is received once whatever the number of
+    coordinators and tasks that use it. Every connection is served by a thread of its own. close() removes the
+    files the worker wrote, and the directory if it is a temporary one: a worker killed without it leaves them
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, directory: str = None):
+        """
+        :param port: 0 picks a free port, see address
+        :param directory: where received hypergraphs are stored, a temporary directory if None
+        """
+        self.server = socket.create_server((host, port))
+        self.address = self.server.getsockname()[:2]  # (host, port) the worker listens on
+        self.directory = directory if directory is not None else tempfile.mkdtemp(prefix="fm-worker-")
+        self.graphs = {}  # hash of the binary form of a hypergraph -> the Hypergraph mapped from it
+        self.__temporary = directory is None  # whether directory was made by the worker and is removed by close()
+        self.__paths = []  # the files written to directory
+        self.__lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def serve_forever(self):
+        """
+        accept connections until close() is called
+        """
+        while True:
+            try:
+                conn, address = self.server.accept()
+            except OSError:  # the server socket was closed
+                return
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def close(self):
+        """
+        stop accepting connections and remove the hypergraphs received from directory, and directory itself if it
+        is a temporary one. Connections being served are not interrupted, the hypergraphs they map stay readable
+        until they are unmapped
+        """
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)  # wakes up a thread blocked in accept()
+        except OSError:
+            pass
+        self.server.close()
+        with self.__lock:
+            self.graphs = {}
+            for path in self.__paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self.__paths = []
+            if self.__temporary:
+                shutil.rmtree(self.directory, ignore_errors=True)
+
+    def handle(self, conn: socket.socket):
+        """
+        serve one coordinator until it closes the connection or sends CLOSE
+        """
+        with conn:
+            while True:
+                try:
+                    header, arrays = receive(conn)
+                except ConnectionError:
+                    return
+                op = header.get("op")
+                if op == CLOSE:
+                    return
+                try:
+                    if op not in OPERATIONS:
+                        raise ValueError("unknown operation %r" % op)
+                    if op == HAS:
+                        reply = {"has": header["graph"] in self.graphs}, []
+                    elif op == GRAPH:
+                        self.__store(header["graph"], arrays[0])
+                        reply = {}, []
+                    else:
+                        reply = _run(self.graphs[header["graph"]], header, arrays)
+                except Exception:
+                    reply = {"error": traceback.format_exc()}, []
+                send(conn, *reply)
+
+    def __store(self, key: str, data: np.ndarray):
+        """
+        write a hypergraph received as bytes to directory and map it, checking that it arrived intact
+        """
+        if hashlib.sha1(data).hexdigest() != key:
+            raise ValueError("the hypergraph was corrupted in transit, its hash is not %s" % key)
+        with self.__lock:
+            if key in self.graphs:
+                return
+            path = os.path.join(self.directory, key + ".fmhg")
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data.data)
+            os.replace(tmp, path)
+            self.__paths.append(path)
+            self.graphs[key] = read_binary(path, verify=True)
+
+
+def _exit(signum, frame):
+    sys.exit(0)
+
+
+def _serve(host: str, port: int, addresses):
+    signal.signal(signal.SIGTERM, _exit)  # terminate() of the process still runs close()
+    with Worker(host, port) as worker:
+        addresses.put(worker.address)
+        worker.serve_forever()
+
+
+def start_local_workers(n: int) -> list:
+    """
+    start n worker processes on this host listening on free ports, for testing and for using all the cores of one
+    machine. returns a list of (process, (host, port)), the processes are daemons and terminate with this one
+    """
+    addresses = multiprocessing.Queue()
+    workers = []
+    for i in range(n):
+        process = multiprocessing.Process(target=_serve, args=("127.0.0.1", 0, addresses), daemon=True)
+        process.start()
+        workers.append((process, tuple(addresses.get())))
+    return workers
+
+
+class Coordinator:
+    """
+    splits partitioning work into tasks for workers on other hosts, reached over TCP: the starts of a multistart,
+    the bisections of every level of a recursive bisection and the pairs of every round of a k-way refinement. A
+    worker gets the hypergraph once, in the binary format, the first time it is used. A worker that cannot be
+    reached, closes its connection or does not answer within timeout is lost: the task it had is given to another
+    worker, and it gets no more tasks. ConnectionError is raised when all workers are lost. A task that fails on a
+    worker raises RuntimeError with the traceback of the worker
+    """
+    def __init__(self, hypergraph: Hypergraph, workers, timeout: float = None):
+        """
+        :param workers: the (host, port) of every worker
+        :param timeout: seconds a worker has to answer a task, None means no limit
+        """
+        assert isinstance(hypergraph, Hypergraph)
+        self.hypergraph = hypergraph
+        self.workers = [tuple(address) for address in workers]
+        self.timeout = timeout
+        self.lost = []  # the workers that were lost
+        self.tasks = {}  # (host, port) -> number of tasks the worker performed
+        self.__connections = {}  # (host, port) -> socket of the workers connected to
+        self.__graph = None  # the binary form of hypergraph, made when first shipped
+        self.__key = None  # the hash of __graph
+        self.__lock = threading.Lock()  # taken by the thread that makes __graph
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        for sock in self.__connections.values():
+            try:
+                send(sock, {"op": CLOSE})
+            except OSError:
+                pass
+            sock.close()
+        self.__connections = {}
+
+    def __binary(self):
+        with self.__lock:
+            return self.__make_binary()
+
+    def __make_binary(self):
+        if self.__graph is None:
+            if self.hypergraph.path is not None:
+                path = self.hypergraph.path
+            else:
+                fd, path = tempfile.mkstemp(suffix=".fmhg")
+                os.close(fd)
+                write_binary(path, self.hypergraph)
+            with open(path, "rb") as f:
+                self.__graph = np.frombuffer(f.read(), dtype=np.uint8)
+            if self.hypergraph.path is None:
+                os.remove(path)
+            self.__key = hashlib.sha1(self.__graph).hexdigest()
+        return self.__graph, self.__key
+
+    def __connect(self, address) -> socket.socket:
+        """
+        connect to a worker and ship it the hypergraph if it does not have it yet
+        """
+        if address not in self.__connections:
+            sock = socket.create_connection(address, timeout=self.timeout)
+            graph, key = self.__binary()
+            send(sock, {"op": HAS, "graph": key})
+            if not self.__check(receive(sock))[0]["has"]:
+                send(sock, {"op": GRAPH, "graph": key}, [graph])
+                self.__check(receive(sock))
+            self.__connections[address] = sock
+        return self.__connections[address]
+
+    @staticmethod
+    def __check(reply):
+        if "error" in reply[0]:
+            raise RuntimeError("task failed on a worker:\n" + reply[0]["error"])
+        return reply
+
+    def __lose(self, address):
+        sock = self.__connections.pop(address, None)
+        if sock is not None:
+            sock.close()
+        self.lost.append(address)
+
+    def map(self, tasks: list) -> list:
+        """
+        perform tasks on the workers, every worker taking the next task when it is done with one. A task is a
+        (header, arrays) message, returns the (header, arrays) replies in the order of tasks
+        """
+        results = [None] * len(tasks)
+        todo = list(range(len(tasks)))[::-1]
+        state = {"done": 0, "busy": 0, "error": None}
+        condition = threading.Condition()
+
+        def run(address):
+            while True:
+                with condition:
+                    while len(todo) == 0 and state["done"] < len(tasks) and state["error"] is None:
+                        condition.wait()
+                    if state["done"] == len(tasks) or state["error"] is not None:
+                        return
+                    i = todo.pop()
+                try:
+                    sock = self.__connect(address)
+                    send(sock, dict(tasks[i][0], graph=self.__key), tasks[i][1])
+                    reply = self.__check(receive(sock))
+                except (OSError, ConnectionError, ValueError):
+                    with condition:
+                        todo.append(i)
+                        self.__lose(address)
+                        condition.notify_all()
+                    return
+                except RuntimeError as e:
+                    with condition:
+                        state["error"] = e
+                        condition.notify_all()
+                    return
+                with condition:
+                    results[i] = reply
+                    state["done"] += 1
+                    self.tasks[address] = self.tasks.get(address, 0) + 1
+                    condition.notify_all()
+
+        threads = [threading.Thread(target=run, args=(address,), daemon=True)
+                   for address in self.workers if address not in self.lost]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if state["error"] is not None:
+            raise state["error"]
+        if state["done"] < len(tasks):
+            raise ConnectionError("all workers were lost, %d of %d tasks were not performed" %
+                                  (len(tasks) - state["done"], len(tasks)))
+        return results
+
+    def multistart(self, seeds, r: float = FiducciaMattheyses.r, **settings) -> list:
+        """
+        run find_mincut() once for every seed, each on a worker. returns a list of StartResult in the order of seeds
+
+        :param settings: passed to FiducciaMattheyses, they must be json serializable
+        """
+        replies = self.map([({"op": START, "r": r, "seed": seed, "settings": settings}, []) for seed in seeds])
+        return [StartResult(seed, header["cutset"], arrays[0]) for seed, (header, arrays) in zip(seeds, replies)]
+
+    def recursive_bisection(self, k: int, **settings) -> np.ndarray:
+        """
+        KWay.recursive_bisection() with the bisections of every level spread over the workers
+        """
+        def bisect(tasks):
+            replies = self.map([({"op": BISECT, "r": r, "settings": s}, [cells]) for cells, r, s in tasks])
+            return [arrays[0] for header, arrays in replies]
+        return KWay._recursive_bisection(self.hypergraph, k, bisect, settings)
+
+    def refine(self, labels, k: int = None, epsilon: float = 0.03, max_rounds: int = 100,
+               **settings) -> KWay.KWayResult:
+        """
+        KWay.refine() with the pairs of every round spread over the workers
+        """
+        def run_pairs(tasks):
+            replies = self.map([({"op": PAIR, "settings": s}, [cells, side]) for cells, side, s in tasks])
+            return [(arrays[0], header["before"], header["after"]) for header, arrays in replies]
+        return KWay._refine(self.hypergraph, labels, k, epsilon, max_rounds, run_pairs, settings)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="fm-worker", description="serve partitioning tasks of a coordinator")
+    parser.add_argument("--host", default="0.0.0.0", help="the address to listen on")
+    parser.add_argument("--port", type=int, default=7070, help="the port to listen on")
+    parser.add_argument("--directory", help="where received hypergraphs are stored, a temporary directory if absent")
+    args = parser.parse_args(argv)
+    signal.signal(signal.SIGTERM, _exit)
+    with Worker(args.host, args.port, args.directory) as worker:
+        print("listening on %s:%d" % worker.address, flush=True)
+        try:
+            worker.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
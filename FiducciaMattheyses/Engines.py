@@ -0,0 +1,163 @@
+import time
+import numpy as np
+from . import Kernel
+from . Util import FIFO, LIFO
+
+__author__ = 'gm'
+
+PYTHON = "python"  # the object based engine of Util: Cell, Net, Block and BucketArray
+KERNEL = "kernel"  # the flat array engine of Kernel, compiled with numba
+AUTO = "auto"  # the kernel for graphs of at least AUTO_KERNEL_PINS pins if it can run them, else the python engine
+AUTO_KERNEL_PINS = 50000  # below this the python engine is about as fast once the cost of building arrays is counted
+
+
+class Engine:
+    """
+    a backend for the passes of find_mincut(). build() is called by input_hypergraph() and builds the representation
+    the engine runs on from the hypergraph of the FiducciaMattheyses instance. run() is called by find_mincut() with
+    all cells in block A: the engine keeps its own gain structure, moves and rolls back passes as it likes, and
+    finally gives the partition it found to set_partition() and sets passes, moves and history
+
+    The interface stops at whole runs on purpose: there are no hooks for the gain structure, single moves or
+    rollback, since the kernel would have to come back from compiled code for every move to call them. An engine
+    is checked by its result instead, see Benchmark.conformance()
+    """
+    name = None
+    exact = True  # whether the engine gives the partition of the python engine, the conformance check expects it
+
+    def available(self) -> bool:
+        """
+        whether the dependencies of the engine are installed
+        """
+        return True
+
+    def unsupported(self, fm) -> str:
+        """
+        returns the reason the engine cannot run fm with its current settings, or None if it can
+        """
+        return None
+
+    def build(self, fm):
+        """
+        build what run() needs from fm.hypergraph. The default builds the Cell and Net objects of cell_array and
+        net_array, an engine with arrays of its own may build those instead and call fm.defer_objects()
+        """
+        fm.build_objects()
+
+    def run(self, fm):
+        raise NotImplementedError
+
+
+class PythonEngine(Engine):
+    name = PYTHON
+
+    def run(self, fm):
+        for result in fm.iter_passes():
+            pass
+
+
+class KernelEngine(Engine):
+    name = KERNEL
+
+    def available(self) -> bool:
+        return Kernel.AVAILABLE
+
+    def unsupported(self, fm) -> str:
+        if fm.lookahead > 1 or fm.policy not in (FIFO, LIFO):
+            return "the kernel supports neither lookahead nor the %s policy" % fm.policy
+        if fm.trace is not None or fm.replay is not None:
+            return "the kernel can neither record nor replay a trace"
+        if fm.boundary:
+            return "the kernel has no boundary mode"
+        return None
+
+    def build(self, fm):
+        """
+        build the arrays of the kernel straight from the CSR arrays of the hypergraph, the Cell and Net objects are
+        only built if something uses them
+        """
+        fm.arrays = Kernel.arrays_from_hypergraph(fm.hypergraph, fm.keep_isolated, fm.reorder, fm.net_threshold)
+        fm.pmax = fm.arrays.pmax
+        fm.smax = fm.arrays.smax
+        fm.large_nets = int(fm.arrays.large.sum())
+        fm.defer_objects()
+
+    def run(self, fm):
+        """
+        history gets the cutset after every pass, the kernel runs all passes in one call so the seconds of every
+        pass are its share of the moves times the time of the whole call
+        """
+        a = fm.arrays
+        if a is None:  # built for another engine, the arrays come in the same order as cell_array
+            a = Kernel.arrays_from_hypergraph(fm.hypergraph, fm.keep_isolated, fm.reorder, fm.net_threshold)
+        if not fm.deferred and fm.blockB.size != 0:
+            raise ValueError("the kernel starts from all cells in block A, as input_routine() or reset() leave them")
+        if fm.seed is None:
+            initial = np.zeros(0, dtype=np.int64)
+        else:  # the shuffle of initial_order(), on positions instead of cells
+            initial = list(range(len(a.cells)))
+            fm.random.shuffle(initial)
+            initial = np.array(initial, dtype=np.int64)
+        start = time.perf_counter()
+        side, cutset, passes, moves, cutsets, pass_moves = Kernel.find_mincut(
+            a.cell_ptr, a.cell_nets, a.net_ptr, a.net_pins, a.cell_w, a.net_w, a.large, a.pmax, a.smax,
+            float(fm.r), fm.policy == LIFO, initial)
+        seconds = time.perf_counter() - start
+        labels = np.full(fm.hypergraph.num_cells, -1, dtype=np.int8)
+        labels[a.cells] = side
+        fm.set_partition(labels, int(cutset))
+        fm.passes = passes
+        fm.moves += moves
+        done = np.cumsum(pass_moves)
+        shares = done / done[-1] if len(done) != 0 and done[-1] != 0 else np.ones(len(done))
+        fm.history = [(int(c), float(share * seconds)) for c, share in zip(cutsets, shares)]
+
+
+ENGINES = {}  # every registered engine by name
+
+
+def register(engine: Engine):
+    """
+    make an engine available to FiducciaMattheyses(engine=...), replacing a registered engine of the same name
+    """
+    assert engine.name is not None and engine.name != AUTO
+    ENGINES[engine.name] = engine
+
+
+def available() -> list:
+    """
+    returns the names of the registered engines that can run here
+    """
+    return [name for name, engine in ENGINES.items() if engine.available()]
+
+
+def resolve(fm, log: bool = True) -> Engine:
+    """
+    returns the engine that runs the passes of fm: the one fm.engine names or, for AUTO, the one chosen by the
+    number of pins of fm.hypergraph. An engine that is not installed or cannot run the settings of fm is replaced by
+    the python engine, the reason is logged unless log is False
+    """
+    name = fm.engine
+    if name == AUTO:
+        pins = fm.hypergraph.num_pins
+        engine = ENGINES[KERNEL]
+        if pins >= AUTO_KERNEL_PINS and engine.available() and engine.unsupported(fm) is None:
+            return engine
+        return ENGINES[PYTHON]
+    if name not in ENGINES:
+        raise ValueError("unknown engine %s, one of %s or %s" % (name, ", ".join(ENGINES), AUTO))
+    engine = ENGINES[name]
+    if not engine.available():
+        if log:
+            fm.logger.info("the %s engine is not installed, using the python engine" % name)
+        return ENGINES[PYTHON]
+    reason = engine.unsupported(fm)
+    if reason is not None:
+        if log:
+            fm.logger.info("%s, using the python engine" % reason)
+        return ENGINES[PYTHON]
+    return engine
+
+
+register(PythonEngine())
+register(KernelEngine())
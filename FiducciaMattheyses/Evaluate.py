@@ -0,0 +1,86 @@
+from collections import namedtuple
+import numpy as np
+from . Hypergraph import HypergraphView
+
+__author__ = 'gm'
+
+Score = namedtuple("Score", ["cut_nets", "cut", "connectivity", "imbalance", "block_weights"])
+Score.__doc__ = """
+the quality of a partition. cut_nets is the number of nets with cells in more than one block, cut their weight,
+connectivity the sum over all nets of weight * (blocks the net spans - 1), which is cut for two blocks. imbalance is
+the largest block weight relative to its target minus one, 0.0 for a perfectly balanced partition, and
+block_weights[b] the weight of the cells in block b. For a batch of label vectors every field is an array with one
+entry per vector
+"""
+
+
+def _csr(hypergraph):
+    """
+    returns (cells, net_ptr, pins, net weights, cell weights) of a Hypergraph or HypergraphView, with cell numbers
+    kept. net weights and cell weights are arrays even if the hypergraph has none, cell weights are the ones of cells
+    """
+    cells = np.asarray(hypergraph.cells(), dtype=np.int64)
+    if isinstance(hypergraph, HypergraphView):
+        nets = [hypergraph.net(i) for i in range(hypergraph.num_nets)]
+        net_ptr = np.zeros(len(nets) + 1, dtype=np.int64)
+        np.cumsum([len(net) for net in nets], out=net_ptr[1:])
+        pins = np.concatenate(nets) if len(nets) != 0 else np.zeros(0, dtype=np.int64)
+    else:
+        net_ptr, pins = hypergraph.net_ptr, hypergraph.pins
+    num_nets = len(net_ptr) - 1
+    net_weights = np.ones(num_nets, dtype=np.int64) if hypergraph.net_weights is None else hypergraph.net_weights
+    cell_weights = (np.ones(len(cells), dtype=np.int64) if hypergraph.cell_weights is None
+                    else np.asarray(hypergraph.cell_weights, dtype=np.int64)[cells])
+    return cells, net_ptr, pins, net_weights, cell_weights
+
+
+def evaluate(hypergraph, labels, r: float = 0.5, k: int = None) -> Score:
+    """
+    score one label vector or a batch of them against a Hypergraph or HypergraphView, all vectors of a batch in the
+    same numpy operations. Cells with a negative label are not part of the partition: they count for no block and
+    their pins are ignored, as the labels FiducciaMattheyses.labels() returns for cells it left out
+
+    :param labels: labels[i] is the block of cell i, 0 .. k - 1, or a 2d array with one label vector per row
+    :param r: the target of block 0 is r times the total weight when k is 2, otherwise every block targets 1 / k
+    :param k: number of blocks, defaults to the highest label + 1 and at least 2
+
+    returns a Score, of ints for one label vector and of arrays for a batch
+    """
+    labels = np.asarray(labels)
+    batched = labels.ndim == 2
+    labels = np.atleast_2d(labels)
+    assert labels.ndim == 2 and labels.shape[1] == hypergraph.num_cells
+    if k is None:
+        k = max(2, int(labels.max()) + 1 if labels.size != 0 else 0)
+    assert labels.size == 0 or labels.max() < k
+    cells, net_ptr, pins, net_weights, cell_weights = _csr(hypergraph)
+    num_nets = len(net_ptr) - 1
+    rows = np.arange(len(labels), dtype=np.int64)[:, None]
+
+    # slot k + 1 of every net collects the pins of unlabelled cells, it is dropped before counting blocks
+    pin_labels = labels[:, pins].astype(np.int64)
+    pin_labels[pin_labels < 0] = k
+    slots = np.repeat(np.arange(num_nets, dtype=np.int64) * (k + 1), np.diff(net_ptr))
+    present = np.zeros((len(labels), num_nets * (k + 1)), dtype=bool)
+    present[rows, slots + pin_labels] = True
+    spans = present.reshape(len(labels), num_nets, k + 1)[:, :, :k].sum(axis=2)
+    cut = spans > 1
+    cut_nets = cut.sum(axis=1)
+    cut_weight = (cut * net_weights).sum(axis=1)
+    connectivity = (np.maximum(spans - 1, 0) * net_weights).sum(axis=1)
+
+    cell_labels = labels[:, cells].astype(np.int64)
+    cell_labels[cell_labels < 0] = k
+    block_weights = np.bincount((cell_labels + rows * (k + 1)).ravel(), np.tile(cell_weights, len(labels)),
+                                minlength=len(labels) * (k + 1)).reshape(len(labels), k + 1)[:, :k]
+    block_weights = block_weights.astype(np.int64)
+    W = block_weights.sum(axis=1, keepdims=True)
+    ratios = np.array([r, 1 - r]) if k == 2 else np.full(k, 1 / k)
+    targets = W * ratios
+    with np.errstate(divide="ignore", invalid="ignore"):
+        imbalance = np.where(W[:, 0] > 0, np.max(block_weights / np.where(targets > 0, targets, np.inf), axis=1) - 1,
+                             0.0)
+
+    if batched:
+        return Score(cut_nets, cut_weight, connectivity, imbalance, block_weights)
+    return Score(int(cut_nets[0]), int(cut_weight[0]), int(connectivity[0]), float(imbalance[0]), block_weights[0])
@@ -1,33 +1,207 @@
 import numpy as np
-from . Util import Cell, Net, Block
+from . Util import Cell, Net, Block, FIFO
+from . Hypergraph import Hypergraph, HypergraphView
+from . import Engines
+from . import Kernel
+from . import Reorder
+from . Cache import PartitionCache, cache_key
+from . Formats import read_binary
+from . Memory import PeakMemory
+from . Trace import Trace
+import asyncio
 import sys
+import time
+import random
 import logging
+from collections import deque, namedtuple
 
 __author__ = 'gm'
 
+PassResult = namedtuple("PassResult", ["n", "cutset", "sizeA", "sizeB", "assignment"])
+PassResult.__doc__ = """
+the state after pass n of iter_passes(). assignment is the Assignment view of the FiducciaMattheyses instance, it is
+not a copy: it shows the partition after the pass most recently performed
+"""
+
+MoveDelta = namedtuple("MoveDelta", ["cut", "sizeA", "sizeB", "balanced"])
+MoveDelta.__doc__ = """
+what moving a set of cells to their complementary blocks would do, see evaluate_moves(). cut is the change of the
+cutset, negative if the cut goes down, sizeA and sizeB the weights of the blocks after the moves and balanced whether
+they meet the balance criterion. evaluate_batch() returns an array for every field, one entry per proposal
+"""
+
+
+class Assignment:
+    """
+    a read only mapping from cell number to block, 0 for block A and 1 for block B. Blocks are read from cell_array
+    when asked for, so creating the view costs nothing and it always reflects the current partition
+    """
+    def __init__(self, fm):
+        self.fm = fm
+        """:type fm FiducciaMattheyses"""
+
+    def __getitem__(self, n: int) -> int:
+        return 0 if self.fm.cell_array[n].block.name == "A" else 1
+
+    def __contains__(self, n) -> bool:
+        return n in self.fm.cell_array
+
+    def __iter__(self):
+        return iter(self.fm.cell_array)
+
+    def __len__(self) -> int:
+        return len(self.fm.cell_array)
+
+    def block(self, label: int) -> list:
+        """
+        returns the numbers of the cells that are in block A (label 0) or B (label 1)
+        """
+        block = self.fm.blockA if label == 0 else self.fm.blockB
+        return [c.n for c in block.cells]
+
+    def labels(self) -> dict:
+        """
+        returns a copy of the assignment as a dict
+        """
+        return {n: 0 if cell.block.name == "A" else 1 for n, cell in self.fm.cell_array.items()}
+
 
 class FiducciaMattheyses:
     INITIAL_BLOCK = "A"  # block that all cells initially belong to
+    # attributes an engine that runs on its own arrays may leave unbuilt, they are built when first used
+    DEFERRED = ("cell_array", "net_array", "blockA", "blockB", "cut_nets")
     r = 0.5  # ratio intended to capture the balance criterion of the final partition produced by the algorithm
 
-    def __init__(self):
+    def __init__(self, jit: bool = False, policy: str = FIFO, lookahead: int = 1, seed=None, r: float = None,
+                 net_threshold: int = None, cache: PartitionCache = None, trace: Trace = None,
+                 replay: Trace = None, boundary: bool = False, engine: str = None, reorder: str = None,
+                 track_memory: bool = False):
+        """
+        :param jit: same as engine="kernel", kept for compatibility
+        :param policy: which cell of the max gain bucket becomes the candidate base cell, one of Util.POLICIES
+        :param lookahead: number of gain levels used to break ties between cells of the max gain bucket, 1 means
+                          plain Fiduccia Mattheyses gains
+        :param seed: seed of the random number generator used by the random policy. If not None the initial pass
+                     also moves cells to block B in random order instead of by gain
+        :param r: balance ratio of this instance, defaults to FiducciaMattheyses.r
+        :param net_threshold: nets with more cells than this are large: they are left out of gain updates, and of
+                              pmax, but still count towards the cutset. None means no net is large
+        :param cache: results of partition() are looked up in and stored to this cache, None disables caching
+        :param trace: every move is appended to this trace. Tracing and replaying use the python engine
+        :param replay: instead of selecting base cells, perform the moves of this trace, which must have been
+                       recorded on the same graph with the same settings. Every move is checked against the trace
+        :param boundary: passes only put cells on cut nets in the buckets, and cells on nets that become cut during
+                         the pass, instead of every cell. Boundary passes use the python engine
+        :param engine: name of the engine of the Engines registry that runs find_mincut(), or "auto" to choose by
+                       graph size. Defaults to "python". An engine that is not installed or does not support the
+                       other settings is replaced by the python engine
+        :param reorder: one of Reorder.ORDERS to store cells and nets in an order that keeps the cells of a net close
+                        together, None keeps the order of the input. Cell numbers are not changed, only the order of
+                        cell_array and net_array, which is the order of the arrays of the kernel
+        :param track_memory: measure the peak memory of find_mincut() with tracemalloc into peak_memory, see
+                             Memory.PeakMemory
+        """
+        if r is not None:
+            self.r = r
+        self.engine = engine if engine is not None else (Engines.KERNEL if jit else Engines.PYTHON)
+        self.policy = policy
+        self.lookahead = lookahead
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.net_threshold = net_threshold
+        self.cache = cache
+        self.cache_hit = False  # whether the last partition() was answered by the cache
+        self.trace = trace
+        self.replay = replay
+        self.__replay_passes = None  # the moves of replay grouped by pass, computed when the initial pass starts
+        self.__replay_queue = deque()  # moves of the current pass that are still to be replayed
+        self.__replay_move = None  # the move of replay that the base cell last returned comes from
+        self.__pass = 0  # number of the current pass, 0 is the initial pass
+        self.__moves = []  # (cell, position in the cells of the block it left) of every move of the current pass
+        self.pruned_nets = None  # nets with locked cells in both blocks pruned from the current pass, see Net.prune()
+        self.boundary = boundary
+        self.reorder = reorder
+        self.track_memory = track_memory
+        self.peak_memory = None  # bytes allocated at most by the last find_mincut() above what it started with
+        self.large_nets = 0  # number of nets above net_threshold, this gets calculated in input_routine
+        self.large_cut = 0  # the part of the cutset due to large nets, this gets calculated in find_mincut
+        self.hypergraph = None  # the Hypergraph or HypergraphView cell_array and net_array were built from
+        self.keep_isolated = False  # whether cells without nets were kept when cell_array was built
         self.cell_array = {}
         self.net_array = {}
         self.pmax = 0  # this gets calculated in input_routine
+        self.smax = 1  # weight of the heaviest cell, this gets calculated in input_routine
 
         self.blockA = None  # this gets initialized when input routine is called (we need to know pmax)
         """:type blockA Block"""
         self.blockB = None  # this gets initialized when input routine is called (we need to know pmax)
         """:type blockB Block"""
         self.cutset = 0  # number of sets that are cut
+        self.cut_nets = {}  # the nets that are cut, a dict used as an insertion ordered set
         self.snapshot = None  # this will hold the state of FiducciaMattheyses at the time a snapshot is taken
+        self.passes = 0  # number of passes the last find_mincut() performed
+        self.moves = 0  # number of moves performed by all passes so far, including the ones rolled back
+        self.history = []  # (cutset, seconds since find_mincut() started) after every pass of the python engine
+        self.stopped = False  # whether the last find_mincut_async() hit its timeout before converging
+        self.arrays = None  # the Kernel.Arrays the kernel engine built from hypergraph, None for other engines
+        self.__deferred = False  # whether the attributes of DEFERRED are still to be built
+        self.__pending = None  # labels of the partition an engine found while the attributes were deferred
+        self.__move_arrays = None  # cell and net arrays of evaluate_batch(), built when first used
         self.logger = logging.getLogger("FiducciaMattheyses")
 
+    def __getattr__(self, name):
+        # only called for attributes that are not set, which are the deferred ones once defer_objects() was called
+        if name in FiducciaMattheyses.DEFERRED and self.__dict__.get("_FiducciaMattheyses__deferred", False):
+            self.__deferred = False
+            self.build_objects()
+            if self.__pending is not None:
+                labels, self.__pending = self.__pending, None
+                self.apply_partition(labels)
+            return getattr(self, name)
+        raise AttributeError(name)
+
+    @property
+    def deferred(self) -> bool:
+        """
+        whether cell_array, net_array, the blocks and cut_nets are still to be built, see defer_objects()
+        """
+        return self.__deferred
+
+    def defer_objects(self):
+        """
+        leave cell_array, net_array, the blocks and cut_nets unbuilt, for engines that run on a representation of
+        their own built from hypergraph. They are built by the first use of any of them, with the partition given
+        to set_partition() meanwhile applied, so they are always there when needed. pmax, smax and large_nets must
+        be set by the engine
+        """
+        for name in FiducciaMattheyses.DEFERRED:
+            self.__dict__.pop(name, None)
+        self.__deferred = True
+        self.__pending = None
+
+    def set_partition(self, labels, cutset: int):
+        """
+        set the partition an engine found: applied with apply_partition() if the blocks are built, kept until they
+        are otherwise
+
+        :param labels: labels[i] is the block of cell i, 0 for A and 1 for B, -1 for cells not in the partition
+        """
+        self.cutset = cutset
+        if self.__deferred:
+            self.__pending = np.asarray(labels, dtype=np.int8)
+        else:
+            self.apply_partition(labels)
+            assert self.cutset == cutset
+
+    @property
+    def jit(self) -> bool:
+        return self.engine == Engines.KERNEL
+
     def take_snapshot(self):
         """
         take a snapshot of the current state of FiducciaMattheyses
         """
-        self.snapshot = self.cutset
+        self.snapshot = self.cutset, dict(self.cut_nets)
         self.blockA.take_snapshot()
         self.blockB.take_snapshot()
         for cell in self.cell_array.values():
@@ -40,7 +214,7 @@ class FiducciaMattheyses:
         load the saved snapshot of FiducciaMattheyses, current FiducciaMattheyses state will be lost
         """
         assert self.snapshot is not None
-        self.cutset = self.snapshot
+        self.cutset, self.cut_nets = self.snapshot
         self.blockA.load_snapshot()
         self.blockB.load_snapshot()
         for cell in self.cell_array.values():
@@ -69,19 +243,154 @@ class FiducciaMattheyses:
         """
         assert isinstance(edge_matrix, np.ndarray)
         if selection is None:
-            Q = [i for i in range(edge_matrix.shape[0])]
+            Q = np.arange(edge_matrix.shape[0], dtype=np.int64)
+        else:
+            Q = np.asarray(selection, dtype=np.int64)
+        # every pair i < j of Q connected in edge_matrix becomes a net, nets are numbered in row major order
+        i, j = np.nonzero(np.triu(edge_matrix[np.ix_(Q, Q)] == 1, k=1))
+        net_ptr = np.arange(0, 2 * len(i) + 1, 2, dtype=np.int64)
+        pins = np.column_stack((Q[i], Q[j])).ravel()
+        self.input_hypergraph(Hypergraph(edge_matrix.shape[0], net_ptr, pins), keep_isolated=False)
+
+    def input_hypergraph(self, hypergraph: Hypergraph, keep_isolated: bool = True):
+        """
+        constructs the cell_array and net_array from a Hypergraph, such as the ones returned by read_hmetis() and
+        read_metis(). Cell and net weights of the hypergraph are taken into account. Contrary to input_routine, cells
+        that belong to no net are kept (and used to balance the partition) unless keep_isolated is False
+
+        The engine that find_mincut() will use builds what it runs on, see Engines.Engine.build(): the python engine
+        builds cell_array and net_array right away, the kernel builds flat arrays and leaves them until first used
+
+        :param hypergraph: the cells and nets to partition
+        :type hypergraph: Hypergraph
+        :param keep_isolated: whether cells that belong to no net are part of the partition
+        """
+        assert isinstance(hypergraph, (Hypergraph, HypergraphView))
+        self.hypergraph = hypergraph
+        self.keep_isolated = keep_isolated
+        Engines.resolve(self, log=False).build(self)
+
+    def input_binary(self, path: str, keep_isolated: bool = True):
+        """
+        input_hypergraph() of a file written by Formats.write_binary(). The file is mapped, not read: with the
+        kernel engine, which builds its arrays straight from the mapped ones, this takes a fraction of the time of
+        building Cell and Net objects
+
+        :param path: the binary hypergraph file
+        :param keep_isolated: whether cells that belong to no net are part of the partition
+        """
+        self.input_hypergraph(read_binary(path), keep_isolated)
+
+    def build_objects(self):
+        """
+        build cell_array and net_array from hypergraph, create the blocks with all cells in block A and compute the
+        initial gains
+        """
+        hypergraph = self.hypergraph
+        keep_isolated = self.keep_isolated
+        self.cell_array = {}
+        self.net_array = {}
+        self.cut_nets = {}
+        self.cutset = 0
+        self.pmax = 0
+        self.smax = 1
+        self.large_nets = 0
+        self.__move_arrays = None
+        if self.reorder is not None:
+            cells = Reorder.cell_order(hypergraph, self.reorder)
+            for i in cells.tolist():
+                self.__add_cell(i)
+            nets = ((n, hypergraph.net(n), hypergraph.net_weight(n))
+                    for n in Reorder.net_order(hypergraph, cells).tolist())
         else:
-            Q = selection
-        net = 0
-        for i in range(len(Q)):
-            for j in range(i + 1, len(Q)):
-                if edge_matrix[Q[i]][Q[j]] == 1:
-                    self.__add_pair(Q[i], Q[j], net)
-                    net += 1
+            if keep_isolated:
+                for i in hypergraph.cells():
+                    self.__add_cell(int(i))
+            nets = hypergraph.nets()
+        for n, cells, weight in nets:
+            net = self.__add_net(n)
+            net.weight = weight
+            for i in cells.tolist():
+                cell = self.__add_cell(i)
+                cell.add_net(net)
+                net.add_cell(cell)
+        if self.reorder is not None and not keep_isolated:
+            for i in [n for n, cell in self.cell_array.items() if len(cell.nets) == 0]:
+                del self.cell_array[i]
+        if hypergraph.cell_weights is not None:
+            for cell in self.cell_array.values():
+                cell.weight = hypergraph.cell_weight(cell.n)
+
+        self.__setup_blocks()
+
+    def induced(self, selection, keep_isolated: bool = False):
+        """
+        returns a new FiducciaMattheyses with the same settings for the cells in selection and the nets that connect
+        them. Unlike input_routine(edge_matrix, selection=...) only the nets of the selected cells are visited: the
+        new instance reads a HypergraphView that shares the incidence arrays of this one and only creates the Cell
+        and Net objects that hold the state of its own partition
+
+        :param selection: list of cells that should not be ignored
+        :param keep_isolated: whether selected cells that belong to no net of the view are part of the partition
+        """
+        assert self.hypergraph is not None
+        fm = FiducciaMattheyses(policy=self.policy, lookahead=self.lookahead, seed=self.seed,
+                                net_threshold=self.net_threshold, boundary=self.boundary, engine=self.engine,
+                                reorder=self.reorder)
+        fm.r = self.r
+        fm.input_hypergraph(self.hypergraph.induced(selection), keep_isolated)
+        return fm
+
+    def partition(self, hypergraph: Hypergraph, keep_isolated: bool = True, as_labels: bool = False):
+        """
+        input_hypergraph() followed by find_mincut(), unless the cache has the result of the same hypergraph and
+        parameters: then the stored partition is returned and cell_array and net_array are not built. cutset is set
+        in both cases. The cells of each block are returned in increasing order
 
+        :param as_labels: return the int8 label array of labels() instead of two lists
+
+        returns the partitions in the form: ([1,3,5],[2,4,6,7])
+        """
+        key = None
+        if self.cache is not None:
+            engine = Engines.ENGINES.get(self.engine)
+            key = cache_key(hypergraph, keep_isolated, self.r, self.policy, self.lookahead, self.seed,
+                            self.net_threshold, self.reorder, self.boundary,
+                            engine.name if engine is not None and not engine.exact else None)
+            stored = self.cache.get(key)
+            if stored is not None:
+                labels, self.cutset = stored
+                self.hypergraph = hypergraph
+                self.keep_isolated = keep_isolated
+                self.cache_hit = True
+                if as_labels:
+                    return labels
+                return np.flatnonzero(labels == 0).tolist(), np.flatnonzero(labels == 1).tolist()
+        self.cache_hit = False
+        self.input_hypergraph(hypergraph, keep_isolated)
+        self.find_mincut()
+        labels = self.labels()
+        if key is not None:
+            self.cache.put(key, labels, self.cutset)
+        if as_labels:
+            return labels
+        return np.flatnonzero(labels == 0).tolist(), np.flatnonzero(labels == 1).tolist()
+
+    def __setup_blocks(self):
+        """
+        compute pmax and smax, create the two blocks, put all cells in block A and compute their initial gains
+        """
+        if self.net_threshold is not None:
+            for net in self.net_array.values():
+                net.large = len(net.cells) > self.net_threshold
+                if net.large:
+                    self.large_nets += 1
         for cell in self.cell_array.values():
-            if cell.pins > self.pmax:
-                self.pmax = cell.pins
+            degree = sum(net.weight for net in cell.nets if not net.large)
+            if degree > self.pmax:
+                self.pmax = degree
+            if cell.weight > self.smax:
+                self.smax = cell.weight
 
         self.blockA = Block("A", self.pmax, self)
         self.blockB = Block("B", self.pmax, self)
@@ -95,20 +404,6 @@ class FiducciaMattheyses:
         self.compute_initial_gains()
         self.blockA.initialize()
 
-    def __add_pair(self, i: int, j: int, net_n: int):
-        """
-        add a connected pair of nodes. Adds cell_i, cell_j, net if they do not already exist to cell_array and
-        net array accordingly. Also adds dependencies between the cells and the net
-        """
-        cell_i = self.__add_cell(i)
-        cell_j = self.__add_cell(j)
-        net = self.__add_net(net_n)
-
-        cell_i.add_net(net)
-        cell_j.add_net(net)
-        net.add_cell(cell_i)
-        net.add_cell(cell_j)
-
     def __add_cell(self, cell: int) -> Cell:
         """
         add a cell to the cell_array if it does not exist, return the new cell created or the existing one
@@ -131,11 +426,90 @@ class FiducciaMattheyses:
             net_obj = self.net_array[net]
         return net_obj
 
+    def apply_partition(self, labels):
+        """
+        put every cell in the block given by labels, all cells unlocked and in the buckets of their block, as if a
+        new pass was about to start. input_routine() must have been called first
+
+        :param labels: maps every cell number to 0 for block A or 1 for block B
+        """
+        self.blockA = Block("A", self.pmax, self)
+        self.blockB = Block("B", self.pmax, self)
+        self.cutset = 0
+        self.cut_nets = {}
+        self.snapshot = None
+        for cell in self.cell_array.values():
+            cell.locked = False
+            cell.bucket_num = None
+            cell.snapshot = None
+            if labels[cell.n] == 0:
+                self.blockA.add_cell(cell)
+            else:
+                assert labels[cell.n] == 1
+                self.blockB.add_cell(cell)
+        for net in self.net_array.values():
+            net.blockA_ref = self.blockA
+            net.blockB_ref = self.blockB
+            net.snapshot = None
+            net.distribute()
+            if net.cut:
+                self.cutset += net.weight
+                self.cut_nets[net] = None
+        self.compute_initial_gains()
+        self.blockA.initialize()
+        self.blockB.initialize()
+
+    def labels(self) -> np.ndarray:
+        """
+        returns the current partition as an int8 array indexed by cell number: 0 for block A, 1 for block B and -1
+        for cells of the hypergraph that are not part of the partition. Evaluate.evaluate() scores such arrays
+        """
+        assert self.hypergraph is not None
+        if self.__pending is not None:
+            return self.__pending.copy()
+        labels = np.full(self.hypergraph.num_cells, -1, dtype=np.int8)
+        labels[[c.n for c in self.blockA.cells]] = 0
+        labels[[c.n for c in self.blockB.cells]] = 1
+        return labels
+
+    def reset(self, r: float = None, seed=None):
+        """
+        bring all cells back to block A, unpartitioned, as input_routine leaves them. The cells and nets that were
+        built are kept, so find_mincut() can run again without rebuilding them, possibly with another ratio or seed.
+        After a partition() answered by the cache nothing was built yet, the engine builds it now. The results of
+        the last run (passes, moves, history, large_cut, stopped, cache_hit, peak_memory) are cleared
+
+        :param r: new balance ratio, the current one is kept if None
+        :param seed: new seed, the current one is kept if None. The random number generator is always reseeded
+        """
+        assert self.hypergraph is not None
+        if not self.__deferred and self.blockA is None:
+            Engines.resolve(self, log=False).build(self)
+        if r is not None:
+            self.r = r
+        if seed is not None:
+            self.seed = seed
+        self.random.seed(self.seed)
+        self.passes = 0
+        self.moves = 0
+        self.history = []
+        self.large_cut = 0
+        self.stopped = False
+        self.cache_hit = False
+        self.peak_memory = None
+        if self.__deferred:  # nothing to undo but the partition the engine found
+            self.__pending = None
+            self.cutset = 0
+        else:
+            self.apply_partition({n: 0 for n in self.cell_array})
+
     def get_base_cell(self) -> Cell:
         """
         get the base cell. That is a cell with maximum gain that also gives the best balance if moved to its
         complementary block or null if no such cell exists
         """
+        if self.replay is not None:
+            return self.__replayed_cell()
         a = self.get_candidate_base_cell_from_block(self.blockA)
         b = self.get_candidate_base_cell_from_block(self.blockB)
 
@@ -175,15 +549,15 @@ class FiducciaMattheyses:
         the closer the partition is to the expected (based on ratio r)
         """
         if cell.block.name == "A":
-            A = self.blockA.size - 1
-            B = self.blockB.size + 1
+            A = self.blockA.size - cell.weight
+            B = self.blockB.size + cell.weight
         else:
             assert cell.block.name == "B"
-            A = self.blockA.size + 1
-            B = self.blockB.size - 1
+            A = self.blockA.size + cell.weight
+            B = self.blockB.size - cell.weight
         W = A + B
-        smax = self.pmax
-        r = FiducciaMattheyses.r
+        smax = self.smax
+        r = self.r
         if r * W - smax <= A <= r * W + smax:
             return abs(A - r * W)
         else:
@@ -194,31 +568,114 @@ class FiducciaMattheyses:
         check the balance criterion and return true if the current partition is balanced
         """
         W = self.blockA.size + self.blockB.size
-        smax = 1  # self.pmax
-        r = FiducciaMattheyses.r
+        smax = self.smax
+        r = self.r
         A = self.blockA.size
         return r * W - smax <= A <= r * W + smax
 
+    def evaluate_moves(self, cells) -> MoveDelta:
+        """
+        what moving cells to their complementary blocks would do to the cutset and the balance, without moving them:
+        the new number of cells of every net in each block is worked out from its counters, so the time is that of
+        visiting the nets of the cells. Nothing is changed. Cells listed twice move once, cells that are not part of
+        the partition raise ValueError. The counters are exact between passes, during a pass nets pruned by
+        Net.prune() are not kept up to date
+
+        :param cells: numbers of the cells to move
+        """
+        blockA = self.blockA
+        moved = {}  # net -> change of its number of cells in block A
+        sizeA = blockA.size
+        for n in dict.fromkeys(cells):
+            cell = self.cell_array.get(n)
+            if cell is None:
+                raise ValueError("cell %s is not part of the partition" % n)
+            step = -1 if cell.block is blockA else 1
+            sizeA += step * cell.weight
+            for net in cell.nets:
+                moved[net] = moved.get(net, 0) + step
+        cut = 0
+        for net, step in moved.items():
+            if step != 0:
+                cut += net.weight * ((net.blockA + step != 0 and net.blockB - step != 0) - net.cut)
+        W = blockA.size + self.blockB.size
+        return MoveDelta(cut, sizeA, W - sizeA, self.r * W - self.smax <= sizeA <= self.r * W + self.smax)
+
+    def evaluate_batch(self, proposals) -> MoveDelta:
+        """
+        evaluate_moves() of many proposals at once, every one on the current partition, not on the ones before it.
+        The nets of the cells of all proposals are gathered from flat arrays, built from cell_array and net_array
+        the first time, and the counters of each net are read once however many proposals touch it
+
+        :param proposals: lists of numbers of the cells to move
+
+        returns a MoveDelta of arrays, entry i is the result of proposals[i]
+        """
+        rows, cells, weights, cell_ptr, cell_nets, nets, net_weights = self.__evaluation_arrays()
+        blockA = self.blockA
+        proposals = [np.asarray(p, dtype=np.int64).ravel() for p in proposals]
+        P = len(proposals)
+        numbers = np.concatenate(proposals) if P != 0 else np.zeros(0, dtype=np.int64)
+        outside = (numbers < 0) | (numbers >= len(rows))
+        outside[~outside] = rows[numbers[~outside]] < 0
+        if np.any(outside):
+            raise ValueError("cell %d is not part of the partition" % numbers[np.argmax(outside)])
+        R = max(len(cells), 1)
+        # one entry per distinct (proposal, cell), as proposal * R + row
+        keys = np.unique(np.repeat(np.arange(P, dtype=np.int64), [len(p) for p in proposals]) * R + rows[numbers])
+        proposal = keys // R
+        row = keys % R
+        step = np.where(np.fromiter((cells[i].block is blockA for i in row.tolist()), dtype=bool, count=len(row)),
+                        -1, 1)
+        W = blockA.size + self.blockB.size
+        sizeA = blockA.size + np.bincount(proposal, step * weights[row], minlength=P).astype(np.int64)
+
+        # the nets of every entry, then one entry per distinct (proposal, net) with the change of its A count
+        lengths = cell_ptr[row + 1] - cell_ptr[row]
+        starts = np.repeat(cell_ptr[row] - (np.cumsum(lengths) - lengths), lengths)
+        N = max(len(nets), 1)
+        keys, inverse = np.unique(np.repeat(proposal, lengths) * N + cell_nets[starts + np.arange(len(starts))],
+                                  return_inverse=True)
+        change = np.bincount(inverse, np.repeat(step, lengths)).astype(np.int64)
+        net = keys % N
+        touched, position = np.unique(net, return_inverse=True)
+        A = np.fromiter((nets[i].blockA for i in touched.tolist()), dtype=np.int64, count=len(touched))[position]
+        B = np.fromiter((nets[i].blockB for i in touched.tolist()), dtype=np.int64, count=len(touched))[position]
+        before = (A != 0) & (B != 0)
+        after = (A + change != 0) & (B - change != 0)
+        cut = np.bincount(keys // N, net_weights[net] * (after.astype(np.int64) - before), minlength=P)
+        return MoveDelta(cut.astype(np.int64), sizeA, W - sizeA,
+                         (self.r * W - self.smax <= sizeA) & (sizeA <= self.r * W + self.smax))
+
+    def __evaluation_arrays(self):
+        """
+        the arrays evaluate_batch() reads: the row of every cell number (-1 for cells not in cell_array), the cells
+        and their weights by row, the nets of every row in csr form as indexes of nets, the nets and their weights.
+        Only which nets a cell has is stored, the counters are read from the nets
+        """
+        if self.__move_arrays is None:
+            cells = list(self.cell_array.values())
+            nets = list(self.net_array.values())
+            index = {net: i for i, net in enumerate(nets)}
+            rows = np.full(self.hypergraph.num_cells, -1, dtype=np.int64)
+            rows[[cell.n for cell in cells]] = np.arange(len(cells), dtype=np.int64)
+            weights = np.fromiter((cell.weight for cell in cells), dtype=np.int64, count=len(cells))
+            cell_ptr = np.zeros(len(cells) + 1, dtype=np.int64)
+            cell_ptr[1:] = np.cumsum([len(cell.nets) for cell in cells])
+            cell_nets = np.fromiter((index[net] for cell in cells for net in cell.nets), dtype=np.int64,
+                                    count=int(cell_ptr[-1]))
+            net_weights = np.fromiter((net.weight for net in nets), dtype=np.int64, count=len(nets))
+            self.__move_arrays = rows, cells, weights, cell_ptr, cell_nets, nets, net_weights
+        return self.__move_arrays
+
     def compute_initial_gains(self):
         """
         computes initial gains for all cells
         """
         for cell in self.cell_array.values():
-            cell.gain = 0
-            for net in cell.nets:
-                if cell.block.name == "A":
-                    if net.blockA == 1:
-                        cell.gain += 1
-                    if net.blockB == 0:
-                        cell.gain -= 1
-                else:
-                    assert cell.block.name == "B"
-                    if net.blockB == 1:
-                        cell.gain += 1
-                    if net.blockA == 0:
-                        cell.gain -= 1
-                if cell.bucket_num is not None:  # if None then this cell is in the free cell list
-                    cell.yank()
+            cell.compute_gain()
+            if cell.bucket_num is not None:  # if None then this cell is in the free cell list
+                cell.yank()
 
     def initial_pass(self):
         """
@@ -228,54 +685,322 @@ class FiducciaMattheyses:
         assert self.blockB is not None
 
         assert self.blockA.size >= self.blockB.size
-        while not self.is_partition_balanced():
-            bcell = self.blockA.get_candidate_base_cell()
-            assert bcell.block.name == "A"  # all cells initially belong to block A
-            self.blockA.move_cell(bcell)
+        self.__start_pass(0)
+        if self.replay is not None:
+            bcell = self.__replayed_cell()
+            while bcell is not None:
+                self.__move(bcell)
+                bcell = self.__replayed_cell()
+            self.__end_pass(len(self.__moves))
+            return
+        order = self.initial_order()
+        if order is not None:
+            for bcell in order:
+                if self.is_partition_balanced():
+                    break
+                self.__move(bcell)
+        else:
+            while not self.is_partition_balanced():
+                bcell = self.blockA.get_candidate_base_cell()
+                assert bcell.block.name == "A"  # all cells initially belong to block A
+                self.__move(bcell)
+        self.__end_pass(len(self.__moves))
+
+    def initial_order(self):
+        """
+        the cells of block A in random order if a seed was given, these are moved to block B by initial_pass() until
+        the partition is balanced. None if no seed was given, then the cells with the highest gain are moved instead
+        """
+        if self.seed is None:
+            return None
+        order = list(self.blockA.cells)
+        self.random.shuffle(order)
+        return order
 
     def perform_pass(self):
         """
         perform a full pass, until no more cells are able to move or the balance criterion does not let any more moves.
-        the input_routine() and initial_pass() functions must have been called first
+        the input_routine() and initial_pass() functions must have been called first.
+        The pass keeps its first prefix of lowest cutset, or none of its moves if every prefix has a higher cutset
+        than the pass started with, so a pass never makes the partition worse
         """
+        start_cutset = self.cutset
         best_cutset = sys.maxsize
+        best = 0  # number of moves of the best prefix of the pass
 
-        self.compute_initial_gains()
-        self.blockA.initialize()
-        self.blockB.initialize()
+        self.__start_pass(self.__pass + 1)
+        if self.boundary:
+            self.__fill_boundary()
+        else:
+            self.__rebuild_buckets()
         bcell = self.get_base_cell()
         while bcell is not None:
-            if bcell.block.name == "A":
-                self.blockA.move_cell(bcell)
-            else:
-                assert bcell.block.name == "B"
-                self.blockB.move_cell(bcell)
+            self.__move(bcell)
+            self.moves += 1
             if self.cutset < best_cutset:
                 best_cutset = self.cutset
-                self.take_snapshot()
+                best = len(self.__moves)
 
             bcell = self.get_base_cell()
-        if self.snapshot is not None:
-            self.load_snapshot()
+        if best_cutset > start_cutset:
+            best = 0
+        self.__end_pass(best)
+
+    def __rebuild_buckets(self):
+        """
+        start a pass: gains are already correct, put the free cells in the buckets in the order of cell_array, then
+        unlock the cells moved by the previous pass and add them too. The buckets end up exactly as
+        compute_initial_gains() followed by initialize() of both blocks leaves them
+        """
+        self.blockA.bucket_array.clear_buckets()
+        self.blockB.bucket_array.clear_buckets()
+        for cell in self.cell_array.values():
+            if not cell.locked:
+                cell.block.bucket_array.add_cell(cell)
+        self.blockA.initialize()
+        self.blockB.initialize()
 
-    def find_mincut(self):
+    def __end_pass(self, best: int):
+        """
+        undo the moves of the pass after the first best ones, then recompute the gains of the cells that share a
+        net with a moved cell: the gains of all cells are then correct for the partition the pass ends with, and
+        the cells that are still free are in the buckets of their block. Nets pruned during the pass are restored
+        first
+        """
+        for net in self.pruned_nets:
+            net.restore()
+        self.pruned_nets = None
+        touched = {}  # cells whose gain may have changed, a dict used as an insertion ordered set
+        for cell, index in self.__moves:
+            touched[cell] = None
+            for net in cell.nets:
+                if not net.large:
+                    for c in net.cells:
+                        touched[c] = None
+        while len(self.__moves) > best:
+            cell, index = self.__moves.pop()
+            cell.block.undo_move(cell, index)
+        for cell in touched:
+            cell.compute_gain()
+            if cell.locked:
+                continue
+            if cell.bucket_num is None:
+                cell.block.bucket_array.add_cell(cell)
+            else:
+                cell.yank()
+
+    def __fill_boundary(self):
+        """
+        start a boundary pass: empty the buckets of both blocks, then put only the cells on cut nets in the buckets,
+        their gains are already correct. The other cells wait out of the buckets until a net of theirs becomes cut
+        """
+        self.blockA.bucket_array.clear()
+        self.blockB.bucket_array.clear()
+        for net in self.cut_nets:
+            if net.large:
+                continue
+            for cell in net.cells:
+                if cell.bucket_num is None:
+                    cell.block.bucket_array.add_cell(cell)
+
+    def __start_pass(self, n: int):
+        """
+        set the number of the pass about to be performed, and queue the moves of that pass if replaying
+        """
+        self.__pass = n
+        self.__moves = []
+        self.pruned_nets = []
+        if self.replay is None:
+            return
+        if n == 0:
+            self.__replay_passes = self.replay.by_pass()
+        self.__replay_queue = deque(self.__replay_passes[n] if n < len(self.__replay_passes) else ())
+
+    def __replayed_cell(self):
+        """
+        the cell of the next move of the current pass of replay, None when the pass has no more moves
+        """
+        if len(self.__replay_queue) == 0:
+            return None
+        self.__replay_move = self.__replay_queue.popleft()
+        cell = self.cell_array.get(self.__replay_move[1])
+        if cell is None or cell.locked:
+            raise ValueError("replay diverged from the trace: cell %d of move %s is %s" % (
+                self.__replay_move[1], self.__replay_move, "not in the partition" if cell is None else "locked"))
+        return cell
+
+    def __move(self, bcell: Cell):
+        """
+        move the base cell to its complementary block, append the move to trace and check it against replay
+        """
+        side = 0 if bcell.block.name == "A" else 1
+        gain = bcell.gain
+        self.__moves.append((bcell, bcell.block.move_cell(bcell)))
+        move = (self.__pass, bcell.n, side, gain, self.cutset)
+        if self.trace is not None:
+            self.trace.record(*move)
+        if self.replay is not None and move != self.__replay_move:
+            raise ValueError("replay diverged from the trace: %s instead of %s" % (move, self.__replay_move))
+
+    def find_mincut(self, as_labels: bool = False):
         """
         perform multiple passes until no more improvements are given, keep the best pass.
         input_routine() must have been called first.
 
+        :param as_labels: return the int8 label array of labels() instead of two lists
+
+        returns the partitions in the form: ([1,3,5],[2,4,6,7])
+        """
+        engine = Engines.resolve(self)
+        if self.track_memory:
+            with PeakMemory() as peak:
+                engine.run(self)
+            self.peak_memory = peak.bytes
+        else:
+            engine.run(self)
+
+        self.logger.info("found mincut in %d iterations with the %s engine: %d" % (self.passes, engine.name,
+                                                                                  self.cutset))
+        self.__report_large_nets()
+
+        if as_labels:
+            return self.labels()
+        if self.__pending is not None:  # the blocks hold cells in the order of arrays, which is the one of cell_array
+            sides = self.__pending[self.arrays.cells]
+            return self.arrays.cells[sides == 0].tolist(), self.arrays.cells[sides == 1].tolist()
+        return [c.n for c in self.blockA.cells], [c.n for c in self.blockB.cells]
+
+    def refine(self, labels=None):
+        """
+        improve the current partition with passes until the cutset stops changing, without an initial pass. Meant
+        for partitions that are already good, such as a projected coarse partition in a multilevel flow, where
+        boundary=True makes every pass put only the cells around the cut in the buckets
+
+        :param labels: if not None the partition to start from is applied first, see apply_partition()
+
         returns the partitions in the form: ([1,3,5],[2,4,6,7])
         """
-        self.initial_pass()
+        if labels is not None:
+            self.apply_partition(labels)
+        for result in self.iter_passes(initial=False):
+            pass
+        self.logger.info("refined in %d iterations: %d" % (self.passes, self.cutset))
+        return [c.n for c in self.blockA.cells], [c.n for c in self.blockB.cells]
+
+    def iter_passes(self, initial: bool = True):
+        """
+        the python engine of find_mincut() one pass at a time: the initial pass is performed, then a PassResult is
+        yielded after every pass until a pass other than the first does not change the cutset, so at least two
+        passes are run, as the kernel does. The caller may stop iterating at any
+        point, cell_array and net_array then hold the partition of the last pass yielded.
+        input_routine() must have been called first
+
+        :param initial: whether to perform the initial pass, False continues from the current partition
+        """
+        start = time.perf_counter()
+        self.history = []
+        self.passes = 0
+        assignment = Assignment(self)
+        if initial:
+            self.initial_pass()
         prev_cutset = sys.maxsize
-        self.perform_pass()
-        self.logger.debug("current iteration: %d cutset: %d" % (1, self.cutset))
-        iterations = 1
-        while self.cutset != prev_cutset:
-            prev_cutset = self.cutset
+        while self.passes == 0 or self.cutset != prev_cutset:  # the first pass is compared with the second
+            if self.passes != 0:
+                prev_cutset = self.cutset
             self.perform_pass()
-            self.logger.debug("current iteration: %d cutset: %d" % (iterations + 1, self.cutset))
-            iterations += 1
+            self.passes += 1
+            self.history.append((self.cutset, time.perf_counter() - start))
+            self.logger.debug("current iteration: %d cutset: %d" % (self.passes, self.cutset))
+            yield PassResult(self.passes, self.cutset, self.blockA.size, self.blockB.size, assignment)
+
+    async def find_mincut_async(self, executor=None, timeout: float = None):
+        """
+        same as find_mincut() but the initial pass and every pass run in an executor, so the event loop is free
+        while they do. Between passes the timeout is checked, when it has expired no more passes are started and
+        stopped is set. If the coroutine is cancelled the pass in progress is allowed to finish, the best partition
+        found so far is loaded and CancelledError is raised, cell_array and net_array stay consistent either way.
+        Passes always run in the python engine, the kernel runs all passes in one call and could not stop between
+        them. input_routine() must have been called first
+
+        :param executor: a concurrent.futures executor that shares memory with this process, such as a
+                         ThreadPoolExecutor. None means the default executor of the running loop
+        :param timeout: seconds after which no more passes are started, None means no limit
+
+        returns the partitions in the form: ([1,3,5],[2,4,6,7])
+        """
+        if self.engine != Engines.PYTHON:
+            self.logger.info("find_mincut_async() uses the python engine")
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        start = time.perf_counter()
+        self.stopped = False
+        self.history = []
+        await self.__run_in_executor(loop, executor, self.initial_pass)
+        best = None  # (cutset, labels) of the best partition reached after a pass
+        prev_cutset = sys.maxsize
 
-        self.logger.info("found mincut in %d iterations: %d" % (iterations, self.cutset))
+        def record():
+            nonlocal best
+            self.passes += 1
+            self.history.append((self.cutset, time.perf_counter() - start))
+            self.logger.debug("current iteration: %d cutset: %d" % (self.passes, self.cutset))
+            if best is None or self.cutset < best[0]:
+                best = self.cutset, {cell.n: 0 if cell.block is self.blockA else 1 for cell in self.cell_array.values()}
+
+        self.passes = 0
+        try:
+            while self.passes == 0 or self.cutset != prev_cutset:  # the first pass is compared with the second
+                if deadline is not None and loop.time() >= deadline:
+                    self.stopped = True
+                    break
+                if self.passes != 0:
+                    prev_cutset = self.cutset
+                try:
+                    await self.__run_in_executor(loop, executor, self.perform_pass)
+                except asyncio.CancelledError:
+                    record()  # the pass was completed before the cancellation is raised
+                    raise
+                record()
+        finally:
+            if best is not None and best[0] < self.cutset:
+                self.apply_partition(best[1])
+
+        self.logger.info("found mincut in %d iterations: %d%s" % (self.passes, self.cutset,
+                                                                  " (timed out)" if self.stopped else ""))
+        self.__report_large_nets()
 
         return [c.n for c in self.blockA.cells], [c.n for c in self.blockB.cells]
+
+    @staticmethod
+    async def __run_in_executor(loop, executor, func):
+        """
+        run func in executor. If the awaiting task is cancelled, func cannot be interrupted: wait for it to return
+        and raise CancelledError afterwards, so that the caller never sees a half done pass
+        """
+        future = loop.run_in_executor(executor, func)
+        try:
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            while not future.done():
+                try:
+                    await asyncio.wait({future})
+                except asyncio.CancelledError:
+                    pass
+            raise
+
+    def __report_large_nets(self):
+        """
+        compute large_cut, the weight of the large nets that are cut, and log how much of the cutset they make up
+        """
+        if self.large_nets == 0:
+            return
+        if self.__pending is not None:
+            a = self.arrays
+            cut = Kernel.cut_flags(a.net_ptr, a.net_pins, self.__pending[a.cells]) & a.large
+            large_cut_nets = int(cut.sum())
+            self.large_cut = int(a.net_w[cut].sum())
+        else:
+            large_cut_nets = sum(1 for net in self.net_array.values() if net.large and net.cut)
+            self.large_cut = sum(net.weight for net in self.net_array.values() if net.large and net.cut)
+        self.logger.info("%d nets above the threshold of %d cells, %d of them cut: %d of cutset %d"
+                         % (self.large_nets, self.net_threshold, large_cut_nets, self.large_cut, self.cutset))
@@ -0,0 +1,306 @@
+import os
+import struct
+import zlib
+import numpy as np
+from . Hypergraph import Hypergraph, HypergraphBuilder
+
+__author__ = 'gm'
+
+BINARY_MAGIC = b"FMHGRAPH"  # first bytes of a binary hypergraph file
+BINARY_VERSION = 1
+# magic, version, flags, number of cells, number of nets, number of pins, crc32 of the arrays, unused. The header is
+# followed by net_ptr, pins, then the cell weights if flags has CELL_WEIGHTS and the net weights if it has
+# NET_WEIGHTS, all little endian int64 so that every array is aligned for mapping
+BINARY_HEADER = struct.Struct("<8sIIqqqII")
+CELL_WEIGHTS = 1
+NET_WEIGHTS = 2
+
+
+def _open(source):
+    """
+    returns (file object, whether the caller should close it) for a path or an already open file
+    """
+    if hasattr(source, "readline"):
+        return source, False
+    return open(source, "r"), True
+
+
+def _lines(f):
+    """
+    yields the lines of f with comment lines (starting with %) skipped and line endings stripped
+    """
+    for line in f:
+        if line.startswith("%"):
+            continue
+        yield line.rstrip("\r\n")
+
+
+def _header(lines, name: str) -> list:
+    for line in lines:
+        fields = line.split()
+        if len(fields) != 0:
+            return [int(x) for x in fields]
+    raise ValueError("%s file has no header line" % name)
+
+
+def read_hmetis(source, chunk_size: int = 65536) -> Hypergraph:
+    """
+    read a hypergraph in hMETIS format (.hgr). The header is "|E| |V| [fmt]" where fmt 1 means nets are weighted,
+    10 means cells are weighted and 11 means both. Cells are numbered from 1 in the file and from 0 in the
+    returned Hypergraph. The file is streamed, nets are built in chunks of chunk_size
+
+    :param source: path of the file or an open text file
+    :param chunk_size: number of nets gathered before they are flushed to arrays
+    """
+    f, close = _open(source)
+    try:
+        lines = _lines(f)
+        num_nets, num_cells, weighted_nets, weighted_cells = _hmetis_header(lines)
+        builder = HypergraphBuilder(num_cells, chunk_size)
+        for i in range(num_nets):
+            builder.add_net(*_hmetis_net(lines, i, num_cells, weighted_nets))
+        if weighted_cells:
+            builder.set_cell_weights(_hmetis_cell_weights(lines, num_cells))
+        return builder.build()
+    finally:
+        if close:
+            f.close()
+
+
+def _hmetis_header(lines):
+    """
+    returns (number of nets, number of cells, whether nets are weighted, whether cells are weighted)
+    """
+    header = _header(lines, "hMETIS")
+    if len(header) not in (2, 3):
+        raise ValueError("invalid hMETIS header: %s" % header)
+    fmt = header[2] if len(header) == 3 else 0
+    if fmt not in (0, 1, 10, 11):
+        raise ValueError("unsupported hMETIS fmt: %d" % fmt)
+    return header[0], header[1], fmt % 10 == 1, fmt // 10 == 1
+
+
+def _hmetis_net(lines, i: int, num_cells: int, weighted_nets: bool):
+    """
+    returns (cells numbered from 0, weight) of net i, the next one in lines
+    """
+    fields = _next_fields(lines, "net %d" % (i + 1))
+    weight = 1
+    if weighted_nets:
+        weight = fields[0]
+        fields = fields[1:]
+    if len(fields) == 0 or min(fields) < 1 or max(fields) > num_cells:
+        raise ValueError("invalid cells in net %d" % (i + 1))
+    return [x - 1 for x in fields], weight
+
+
+def _hmetis_cell_weights(lines, num_cells: int) -> list:
+    weights = []
+    for i in range(num_cells):
+        fields = _next_fields(lines, "weight of cell %d" % (i + 1))
+        weights.append(fields[0])
+    return weights
+
+
+class HmetisStream:
+    """
+    the nets of an hMETIS file as an iterable of (cells, weight), cells numbered from 0 without duplicates. The file
+    is read again every time the stream is iterated and only one net is held at a time, so hypergraphs too large to
+    build can be partitioned by Stream.partition(). The header, and the cell weights that hMETIS puts after the
+    nets, are read when the stream is created
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "r") as f:
+            lines = _lines(f)
+            self.num_nets, self.num_cells, self.weighted_nets, weighted_cells = _hmetis_header(lines)
+            self.cell_weights = None  # weight of every cell or None if all cells weigh 1
+            """:type cell_weights np.ndarray"""
+            if weighted_cells:
+                for i in range(self.num_nets):
+                    _next_fields(lines, "net %d" % (i + 1))
+                self.cell_weights = np.array(_hmetis_cell_weights(lines, self.num_cells), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.num_nets
+
+    def __iter__(self):
+        with open(self.path, "r") as f:
+            lines = _lines(f)
+            _hmetis_header(lines)
+            for i in range(self.num_nets):
+                cells, weight = _hmetis_net(lines, i, self.num_cells, self.weighted_nets)
+                yield list(dict.fromkeys(cells)), weight
+
+
+def _next_fields(lines, what: str) -> list:
+    for line in lines:
+        fields = line.split()
+        if len(fields) != 0:
+            return [int(x) for x in fields]
+    raise ValueError("unexpected end of file while reading %s" % what)
+
+
+def read_metis(source, chunk_size: int = 65536) -> Hypergraph:
+    """
+    read a graph in METIS format (.graph). The header is "|V| |E| [fmt [ncon]]" where the digits of fmt tell
+    whether cells have sizes (100), cells are weighted (10) and edges are weighted (1). Only ncon = 1 is supported,
+    cell sizes are read and ignored. Every edge becomes a net of two cells, its weight the edge weight.
+    Cells are numbered from 1 in the file and from 0 in the returned Hypergraph
+
+    :param source: path of the file or an open text file
+    :param chunk_size: number of nets gathered before they are flushed to arrays
+    """
+    f, close = _open(source)
+    try:
+        lines = _lines(f)
+        header = _header(lines, "METIS")
+        if len(header) not in (2, 3, 4):
+            raise ValueError("invalid METIS header: %s" % header)
+        num_cells, num_edges = header[0], header[1]
+        fmt = "%03d" % (header[2] if len(header) >= 3 else 0)
+        ncon = header[3] if len(header) == 4 else 1
+        if ncon != 1:
+            raise ValueError("only one cell weight per cell is supported, ncon: %d" % ncon)
+        has_sizes = fmt[0] == "1"
+        weighted_cells = fmt[1] == "1"
+        weighted_edges = fmt[2] == "1"
+        step = 2 if weighted_edges else 1
+
+        builder = HypergraphBuilder(num_cells, chunk_size)
+        weights = []
+        edges = 0
+        for u in range(num_cells):
+            # in METIS an empty line is a cell without neighbours, so empty lines are not skipped here
+            line = next(lines, None)
+            if line is None:
+                raise ValueError("unexpected end of file while reading cell %d" % (u + 1))
+            fields = [int(x) for x in line.split()]
+            if has_sizes:
+                fields = fields[1:]
+            if weighted_cells:
+                weights.append(fields[0])
+                fields = fields[1:]
+            if len(fields) % step != 0:
+                raise ValueError("invalid adjacency list of cell %d" % (u + 1))
+            for k in range(0, len(fields), step):
+                v = fields[k] - 1
+                if not 0 <= v < num_cells or v == u:
+                    raise ValueError("invalid neighbour %d of cell %d" % (v + 1, u + 1))
+                if u < v:  # every edge is listed by both of its cells, keep it once
+                    builder.add_net((u, v), fields[k + 1] if weighted_edges else 1)
+                    edges += 1
+        if edges != num_edges:
+            raise ValueError("header declares %d edges but %d were read" % (num_edges, edges))
+        if weighted_cells:
+            builder.set_cell_weights(weights)
+        return builder.build()
+    finally:
+        if close:
+            f.close()
+
+
+def write_partition(target, labels):
+    """
+    write a partition file (.part), one line per cell holding the number of the block the cell belongs to
+
+    :param target: path of the file or an open text file
+    :param labels: block number of every cell, in cell order
+    """
+    if hasattr(target, "write"):
+        f, close = target, False
+    else:
+        f, close = open(target, "w"), True
+    try:
+        for label in labels:
+            f.write("%d\n" % label)
+    finally:
+        if close:
+            f.close()
+
+
+def _binary_arrays(hypergraph: Hypergraph) -> list:
+    arrays = [hypergraph.net_ptr, hypergraph.pins]
+    if hypergraph.cell_weights is not None:
+        arrays.append(hypergraph.cell_weights)
+    if hypergraph.net_weights is not None:
+        arrays.append(hypergraph.net_weights)
+    return [np.ascontiguousarray(a, dtype="<i8") for a in arrays]
+
+
+def _crc(arrays, chunk: int = 1 << 22) -> int:
+    """
+    crc32 of the bytes of all arrays, read chunk elements at a time so that mapped arrays are not loaded at once
+    """
+    crc = 0
+    for a in arrays:
+        for i in range(0, len(a), chunk):
+            crc = zlib.crc32(np.ascontiguousarray(a[i:i + chunk]).tobytes(), crc)
+    return crc
+
+
+def write_binary(path: str, hypergraph: Hypergraph):
+    """
+    write a hypergraph in the binary format read_binary() maps: a header with the sizes and a checksum, then the
+    arrays of the hypergraph as they are in memory. The file is written to a temporary name and renamed into place
+    """
+    assert isinstance(hypergraph, Hypergraph)
+    arrays = _binary_arrays(hypergraph)
+    flags = (CELL_WEIGHTS if hypergraph.cell_weights is not None else 0) | \
+        (NET_WEIGHTS if hypergraph.net_weights is not None else 0)
+    header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, flags, hypergraph.num_cells, hypergraph.num_nets,
+                                hypergraph.num_pins, _crc(arrays), 0)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for a in arrays:
+            a.tofile(f)
+    os.replace(tmp, path)
+
+
+def read_binary(path: str, mmap: bool = True, verify: bool = False) -> Hypergraph:
+    """
+    open a hypergraph written by write_binary(). With mmap the arrays of the Hypergraph are read only np.memmap
+    views of the file: opening takes the same time whatever the size of the hypergraph, pages are read when first
+    used and processes that open the same file share them. Such a Hypergraph remembers path, and is pickled as the
+    path so that worker processes map the file themselves instead of receiving a copy
+
+    :param mmap: False reads the arrays into memory instead
+    :param verify: check the checksum, which reads the whole file. The size of the file is always checked
+    """
+    with open(path, "rb") as f:
+        raw = f.read(BINARY_HEADER.size)
+    if len(raw) != BINARY_HEADER.size:
+        raise ValueError("%s is not a binary hypergraph file" % path)
+    magic, version, flags, num_cells, num_nets, num_pins, crc, unused = BINARY_HEADER.unpack(raw)
+    if magic != BINARY_MAGIC:
+        raise ValueError("%s is not a binary hypergraph file" % path)
+    if version != BINARY_VERSION:
+        raise ValueError("unsupported binary hypergraph version: %d" % version)
+    lengths = [num_nets + 1, num_pins]
+    if flags & CELL_WEIGHTS:
+        lengths.append(num_cells)
+    if flags & NET_WEIGHTS:
+        lengths.append(num_nets)
+    if os.path.getsize(path) != BINARY_HEADER.size + 8 * sum(lengths):
+        raise ValueError("%s has the wrong size, it is truncated or corrupted" % path)
+
+    arrays = []
+    offset = BINARY_HEADER.size
+    for length in lengths:
+        if mmap:
+            arrays.append(np.memmap(path, dtype="<i8", mode="r", offset=offset, shape=(length,)))
+        else:
+            arrays.append(np.fromfile(path, dtype="<i8", count=length, offset=offset))
+        offset += 8 * length
+    if verify and _crc(arrays) != crc:
+        raise ValueError("checksum mismatch in %s" % path)
+    net_ptr, pins = arrays[0], arrays[1]
+    cell_weights = arrays[2] if flags & CELL_WEIGHTS else None
+    net_weights = arrays[-1] if flags & NET_WEIGHTS else None
+    if net_ptr[0] != 0 or net_ptr[-1] != num_pins:
+        raise ValueError("invalid net offsets in %s" % path)
+    hypergraph = Hypergraph(num_cells, net_ptr, pins, cell_weights, net_weights)
+    if mmap:
+        hypergraph.path = path
+    return hypergraph
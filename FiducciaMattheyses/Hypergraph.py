@@ -0,0 +1,239 @@
+import numpy as np
+
+__author__ = 'gm'
+
+
+class Hypergraph:
+    """
+    a hypergraph stored in compressed sparse row form. The pins (cells) of net i are
+    pins[net_ptr[i]:net_ptr[i + 1]], cells are numbered 0 .. num_cells - 1
+    """
+    def __init__(self, num_cells: int, net_ptr: np.ndarray, pins: np.ndarray, cell_weights=None, net_weights=None):
+        assert num_cells >= 0
+        assert net_ptr.ndim == 1 and len(net_ptr) >= 1
+        assert net_ptr[0] == 0 and net_ptr[-1] == len(pins)
+        self.num_cells = num_cells
+        self.net_ptr = net_ptr  # offsets of every net into pins, has num_nets + 1 entries
+        self.pins = pins  # the cells of every net, one net after the other
+        self.cell_weights = cell_weights  # weight of every cell or None if all cells weigh 1
+        """:type cell_weights np.ndarray"""
+        self.net_weights = net_weights  # weight of every net or None if all nets weigh 1
+        """:type net_weights np.ndarray"""
+        self.__incidence = None  # (cell_ptr, cell_nets), the nets of every cell, computed when first needed
+        self.path = None  # the binary file the arrays are mapped from, see Formats.read_binary()
+
+    def __reduce_ex__(self, protocol):
+        if self.path is not None:  # map the file again instead of copying the arrays
+            from . Formats import read_binary
+            return read_binary, (self.path,)
+        return super().__reduce_ex__(protocol)
+
+    @property
+    def num_nets(self) -> int:
+        return len(self.net_ptr) - 1
+
+    @property
+    def num_pins(self) -> int:
+        return len(self.pins)
+
+    def net(self, i: int) -> np.ndarray:
+        """
+        returns the cells of net i
+        """
+        return self.pins[self.net_ptr[i]:self.net_ptr[i + 1]]
+
+    def cells(self):
+        """
+        returns the numbers of the cells of this hypergraph
+        """
+        return range(self.num_cells)
+
+    def incidence(self):
+        """
+        returns (cell_ptr, cell_nets), the transpose of net_ptr / pins: the nets of cell i are
+        cell_nets[cell_ptr[i]:cell_ptr[i + 1]], in increasing order. It is computed once and kept
+        """
+        if self.__incidence is None:
+            order = np.argsort(self.pins, kind="stable")
+            cell_nets = np.repeat(np.arange(self.num_nets, dtype=np.int64), np.diff(self.net_ptr))[order]
+            cell_ptr = np.zeros(self.num_cells + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.pins, minlength=self.num_cells), out=cell_ptr[1:])
+            self.__incidence = cell_ptr, cell_nets
+        return self.__incidence
+
+    def induced(self, cells, min_pins: int = 2):
+        """
+        returns a HypergraphView of the given cells and of the nets that have at least min_pins of them, restricted
+        to those cells. Only index arrays are created, the pins of this hypergraph are shared with the view and the
+        work done is proportional to the pins of the given cells
+        """
+        return HypergraphView(self, cells, min_pins)
+
+    def cut(self, labels) -> int:
+        """
+        returns the weight of the nets whose cells are not all in the same block
+
+        :param labels: labels[i] is the block of cell i
+        """
+        labels = np.asarray(labels)
+        sizes = np.diff(self.net_ptr)
+        nonempty = sizes > 0
+        starts = self.net_ptr[:-1][nonempty]
+        if len(starts) == 0:
+            return 0
+        pin_labels = labels[self.pins]
+        cut = np.zeros(self.num_nets, dtype=bool)
+        cut[nonempty] = np.minimum.reduceat(pin_labels, starts) != np.maximum.reduceat(pin_labels, starts)
+        if self.net_weights is None:
+            return int(cut.sum())
+        return int(self.net_weights[cut].sum())
+
+    def cell_weight(self, i: int) -> int:
+        return 1 if self.cell_weights is None else int(self.cell_weights[i])
+
+    def net_weight(self, i: int) -> int:
+        return 1 if self.net_weights is None else int(self.net_weights[i])
+
+    def nets(self):
+        """
+        iterate over all nets, yields (net number, cells of net, net weight)
+        """
+        for i in range(self.num_nets):
+            yield i, self.net(i), self.net_weight(i)
+
+
+class HypergraphView:
+    """
+    the sub-hypergraph of a Hypergraph induced by a subset of its cells. Cells keep their numbers in the parent,
+    net i of the view is net net_ids[i] of the parent restricted to the cells of the view. Offers the same
+    interface as Hypergraph for reading, so it can be given to FiducciaMattheyses.input_hypergraph()
+    """
+    def __init__(self, parent: Hypergraph, cells, min_pins: int = 2):
+        assert isinstance(parent, Hypergraph)
+        assert min_pins >= 1
+        self.parent = parent
+        self.num_cells = parent.num_cells  # cell numbers are the ones of the parent
+        self.cell_ids = np.unique(np.asarray(cells, dtype=np.int64))  # the cells of the view, sorted
+        assert len(self.cell_ids) == 0 or 0 <= self.cell_ids[0] <= self.cell_ids[-1] < parent.num_cells
+        cell_ptr, cell_nets = parent.incidence()
+        starts = cell_ptr[self.cell_ids]
+        counts = cell_ptr[self.cell_ids + 1] - starts
+        # the nets of every selected cell, one after the other
+        touched = cell_nets[np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())]
+        nets, pins_in_view = np.unique(touched, return_counts=True)
+        kept = pins_in_view >= min_pins
+        self.net_ids = nets[kept]  # the nets of the parent that are part of the view
+        self.num_pins = int(pins_in_view[kept].sum())
+        self.cell_weights = parent.cell_weights  # shared with the parent, indexed by cell number
+        self.net_weights = None if parent.net_weights is None else parent.net_weights[self.net_ids]
+
+    @property
+    def num_nets(self) -> int:
+        return len(self.net_ids)
+
+    def cells(self):
+        return self.cell_ids
+
+    def net(self, i: int) -> np.ndarray:
+        """
+        returns the cells of net i of the view
+        """
+        pins = self.parent.net(self.net_ids[i])
+        positions = np.searchsorted(self.cell_ids, pins)
+        positions[positions == len(self.cell_ids)] = 0
+        return pins[self.cell_ids[positions] == pins]
+
+    def cell_weight(self, i: int) -> int:
+        return self.parent.cell_weight(i)
+
+    def net_weight(self, i: int) -> int:
+        return 1 if self.net_weights is None else int(self.net_weights[i])
+
+    def nets(self):
+        """
+        iterate over all nets of the view, yields (net number in the view, cells of net, net weight)
+        """
+        for i in range(self.num_nets):
+            yield i, self.net(i), self.net_weight(i)
+
+    def induced(self, cells, min_pins: int = 2):
+        """
+        returns the view of the parent induced by the cells that are both in this view and in cells
+        """
+        return HypergraphView(self.parent, np.intersect1d(self.cell_ids, np.asarray(cells, dtype=np.int64)),
+                              min_pins)
+
+
+class HypergraphBuilder:
+    """
+    builds a Hypergraph one net at a time. Pins are gathered in python lists and flushed to numpy arrays every
+    chunk_size nets, so that arbitrarily large inputs never hold more than one chunk as python objects
+    """
+    def __init__(self, num_cells: int = 0, chunk_size: int = 65536):
+        assert chunk_size > 0
+        self.num_cells = num_cells  # grows automatically if a net references a higher cell number
+        self.chunk_size = chunk_size
+        self.cell_weights = None  # set with set_cell_weights(), None means all cells weigh 1
+        self.__net_sizes = []  # sizes of the nets of the current chunk
+        self.__pins = []  # pins of the nets of the current chunk
+        self.__net_weights = []  # weights of the nets of the current chunk
+        self.__weighted_nets = False  # whether a net with weight other than 1 has been added
+        self.__chunks = []  # flushed chunks, each one is a tuple (net sizes, pins, net weights)
+
+    def add_net(self, cells, weight: int = 1):
+        """
+        add a net that contains the given cells. Duplicate cells in the same net are ignored
+        """
+        cells = list(dict.fromkeys(cells))
+        assert len(cells) > 0
+        assert min(cells) >= 0
+        self.__net_sizes.append(len(cells))
+        self.__pins.extend(cells)
+        self.__net_weights.append(weight)
+        if weight != 1:
+            self.__weighted_nets = True
+        top = max(cells) + 1
+        if top > self.num_cells:
+            self.num_cells = top
+        if len(self.__net_sizes) >= self.chunk_size:
+            self.__flush()
+
+    def set_cell_weights(self, weights):
+        """
+        set the weights of all cells, weights[i] is the weight of cell i
+        """
+        self.cell_weights = np.asarray(weights, dtype=np.int64)
+        if len(self.cell_weights) > self.num_cells:
+            self.num_cells = len(self.cell_weights)
+
+    def __flush(self):
+        if len(self.__net_sizes) == 0:
+            return
+        self.__chunks.append((np.array(self.__net_sizes, dtype=np.int64),
+                              np.array(self.__pins, dtype=np.int64),
+                              np.array(self.__net_weights, dtype=np.int64)))
+        self.__net_sizes = []
+        self.__pins = []
+        self.__net_weights = []
+
+    def build(self) -> Hypergraph:
+        """
+        returns the Hypergraph built from all nets added so far
+        """
+        self.__flush()
+        if len(self.__chunks) == 0:
+            sizes = np.zeros(0, dtype=np.int64)
+            pins = np.zeros(0, dtype=np.int64)
+            net_weights = np.zeros(0, dtype=np.int64)
+        else:
+            sizes = np.concatenate([c[0] for c in self.__chunks])
+            pins = np.concatenate([c[1] for c in self.__chunks])
+            net_weights = np.concatenate([c[2] for c in self.__chunks])
+        net_ptr = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=net_ptr[1:])
+        cell_weights = self.cell_weights
+        if cell_weights is not None and len(cell_weights) < self.num_cells:
+            padding = np.ones(self.num_cells - len(cell_weights), dtype=np.int64)
+            cell_weights = np.concatenate([cell_weights, padding])
+        return Hypergraph(self.num_cells, net_ptr, pins, cell_weights,
+                          net_weights if self.__weighted_nets else None)
@@ -0,0 +1,187 @@
+import itertools
+import multiprocessing
+from collections import namedtuple
+import numpy as np
+from . Evaluate import evaluate
+from . FiducciaMattheyses import FiducciaMattheyses
+from . Hypergraph import Hypergraph
+
+__author__ = 'gm'
+
+PASSES = 16  # most passes of FiducciaMattheyses on one pair of blocks
+
+KWayResult = namedtuple("KWayResult", ["labels", "connectivity", "rounds", "improved"])
+KWayResult.__doc__ = """
+the result of refine(). connectivity is the sum over all nets of weight * (blocks the net spans - 1), rounds the
+number of rounds of pairs refined and improved the number of pair refinements that lowered the connectivity
+"""
+
+_worker_hypergraph = None  # the hypergraph of a worker process, given once by _init_worker
+
+
+def _bisect(hypergraph: Hypergraph, cells: np.ndarray, r: float, settings: dict) -> np.ndarray:
+    """
+    bisect the cells with FiducciaMattheyses, returns the side of every cell, 0 for block A
+    """
+    fm = FiducciaMattheyses(r=r, **settings)
+    fm.input_hypergraph(hypergraph.induced(cells), keep_isolated=True)
+    return fm.find_mincut(as_labels=True)[cells]
+
+
+def _recursive_bisection(hypergraph: Hypergraph, k: int, bisect, settings: dict) -> np.ndarray:
+    """
+    recursive_bisection() with the bisections of every level given at once to bisect, a function that takes a list
+    of tasks (cells, r, settings) and returns the result of _bisect() for each
+    """
+    assert k >= 1
+    labels = np.zeros(hypergraph.num_cells, dtype=np.int64)
+    level = [(np.arange(hypergraph.num_cells, dtype=np.int64), 0, k)]  # cells, first block, number of blocks
+    while len(level) != 0:
+        split = []
+        for cells, first, blocks in level:
+            if blocks == 1 or len(cells) == 0:
+                labels[cells] = first
+            else:
+                split.append((cells, first, blocks))
+        sides = bisect([(cells, blocks // 2 / blocks, settings) for cells, first, blocks in split])
+        level = []
+        for (cells, first, blocks), side in zip(split, sides):
+            level.append((cells[side == 0], first, blocks // 2))
+            level.append((cells[side == 1], first + blocks // 2, blocks - blocks // 2))
+    return labels
+
+
+def recursive_bisection(hypergraph: Hypergraph, k: int, **kwargs) -> np.ndarray:
+    """
+    split a hypergraph into k blocks by bisecting it with FiducciaMattheyses, then every half again. Block A of
+    a bisection into b blocks targets b // 2 of them, so cells of blocks 0 .. k // 2 - 1 end up in block A of the
+    first bisection
+
+    :param kwargs: passed to FiducciaMattheyses
+
+    returns labels, labels[i] is the block of cell i
+    """
+    return _recursive_bisection(hypergraph, k, lambda tasks: [_bisect(hypergraph, *task) for task in tasks], kwargs)
+
+
+def quotient(hypergraph: Hypergraph, labels: np.ndarray, k: int) -> np.ndarray:
+    """
+    returns the block quotient graph as a k x k matrix, entry (a, b) is the weight of the nets with cells in both
+    block a and block b. Every net counts once for every pair of blocks it spans
+    """
+    num_nets = hypergraph.num_nets
+    slots = np.repeat(np.arange(num_nets, dtype=np.int64) * k, np.diff(hypergraph.net_ptr))
+    present = np.zeros(num_nets * k, dtype=bool)
+    present[slots + labels[hypergraph.pins]] = True
+    present = present.reshape(num_nets, k).astype(np.int64)
+    weights = np.ones(num_nets, dtype=np.int64) if hypergraph.net_weights is None else hypergraph.net_weights
+    matrix = present.T @ (present * weights[:, None])
+    np.fill_diagonal(matrix, 0)
+    return matrix
+
+
+def matching(matrix: np.ndarray, skip=()) -> list:
+    """
+    returns disjoint pairs of adjacent blocks, heaviest quotient edges first. Pairs in skip are left out
+    """
+    a, b = np.nonzero(np.triu(matrix, k=1))
+    order = np.argsort(-matrix[a, b], kind="stable")
+    matched = set()
+    pairs = []
+    for i in order.tolist():
+        pair = (int(a[i]), int(b[i]))
+        if pair in skip or pair[0] in matched or pair[1] in matched:
+            continue
+        matched.update(pair)
+        pairs.append(pair)
+    return pairs
+
+
+def _refine_pair(hypergraph: Hypergraph, cells: np.ndarray, side: np.ndarray, settings: dict):
+    """
+    refine the two blocks of cells with FiducciaMattheyses, side[i] is 0 if cells[i] is in the first one. Only nets
+    with two or more of the cells are seen: the cut of those nets is the part of the connectivity the two blocks
+    decide, so it is exactly what the pair changes
+
+    returns (new side of every cell, cut before, cut after)
+    """
+    weights = np.ones(len(cells), dtype=np.int64) if hypergraph.cell_weights is None else \
+        hypergraph.cell_weights[cells]
+    fm = FiducciaMattheyses(r=int(weights[side == 0].sum()) / int(weights.sum()), **settings)
+    fm.input_hypergraph(hypergraph.induced(cells), keep_isolated=True)
+    labels = np.full(hypergraph.num_cells, -1, dtype=np.int8)
+    labels[cells] = side
+    fm.apply_partition(labels)
+    before = fm.cutset
+    for result in itertools.islice(fm.iter_passes(initial=False), PASSES):
+        pass
+    return fm.labels()[cells], before, fm.cutset
+
+
+def _init_worker(hypergraph):
+    global _worker_hypergraph
+    _worker_hypergraph = hypergraph
+
+
+def _run_worker(task):
+    return _refine_pair(_worker_hypergraph, *task)
+
+
+def _refine(hypergraph: Hypergraph, labels, k: int, epsilon: float, max_rounds: int, run_pairs,
+            settings: dict) -> KWayResult:
+    """
+    refine() with the pairs of every round given at once to run_pairs, a function that takes a list of tasks
+    (cells, side, settings) and returns the result of _refine_pair() for each
+    """
+    labels = np.array(labels, dtype=np.int64)
+    if k is None:
+        k = int(labels.max()) + 1 if len(labels) != 0 else 1
+    weights = np.ones(hypergraph.num_cells, dtype=np.int64) if hypergraph.cell_weights is None else \
+        np.asarray(hypergraph.cell_weights, dtype=np.int64)
+    cap = (1 + epsilon) * weights.sum() / k
+    stale = set()  # pairs that did not improve since their blocks last changed
+    rounds = 0
+    improved = 0
+    while rounds < max_rounds:
+        pairs = matching(quotient(hypergraph, labels, k), stale)
+        if len(pairs) == 0:
+            break
+        rounds += 1
+        tasks = []
+        for a, b in pairs:
+            cells = np.flatnonzero((labels == a) | (labels == b))
+            tasks.append((cells, (labels[cells] == b).astype(np.int8), settings))
+        for (a, b), (cells, side, settings), (new_side, before, after) in zip(pairs, tasks, run_pairs(tasks)):
+            heavier = max(int(weights[cells][side == 0].sum()), int(weights[cells][side == 1].sum()))
+            limit = max(heavier, cap)
+            if after >= before or int(weights[cells][new_side == 0].sum()) > limit or \
+                    int(weights[cells][new_side == 1].sum()) > limit:
+                stale.add((a, b))
+                continue
+            labels[cells] = np.where(new_side == 0, a, b)
+            improved += 1
+            stale = set(pair for pair in stale if a not in pair and b not in pair)
+    return KWayResult(labels, evaluate(hypergraph, labels, k=k).connectivity, rounds, improved)
+
+
+def refine(hypergraph: Hypergraph, labels, k: int = None, processes: int = None, epsilon: float = 0.03,
+           max_rounds: int = 100, **kwargs) -> KWayResult:
+    """
+    improve a k-way partition by two-way FiducciaMattheyses on pairs of blocks. Every round builds the quotient
+    graph, picks a matching of adjacent blocks and refines all its pairs at the same time, in a pool of processes
+    that get the hypergraph once. Being disjoint, the pairs never touch the same cell and their results are merged
+    as they are. A pair keeps the weight of its two blocks together, the result of a pair is kept if it lowers the
+    connectivity and neither block gets heavier than the heavier of the two was, or than (1 + epsilon) W / k. Rounds
+    are repeated until no pair improves: pairs that did not improve are skipped until one of their blocks changes
+
+    :param labels: labels[i] is the block of cell i, 0 .. k - 1
+    :param k: number of blocks, defaults to the highest label + 1
+    :param processes: number of worker processes, pairs are refined in this process if None or 1
+    :param kwargs: passed to FiducciaMattheyses for the pairs
+    """
+    if processes is None or processes <= 1:
+        return _refine(hypergraph, labels, k, epsilon, max_rounds,
+                       lambda tasks: [_refine_pair(hypergraph, *task) for task in tasks], kwargs)
+    with multiprocessing.Pool(processes, _init_worker, (hypergraph,)) as pool:
+        return _refine(hypergraph, labels, k, epsilon, max_rounds, lambda tasks: pool.map(_run_worker, tasks),
+                       kwargs)
@@ -0,0 +1,456 @@
+"""
+flat array implementation of the passes of FiducciaMattheyses, compiled with numba when it is installed. Every step
+mirrors the object based engine (same bucket order, same tie breaking, same best prefix) so both engines give the
+same partition. Cells and nets are numbered by their position in cell_array and net_array, a bucket is a doubly
+linked list threaded through the nxt / prv arrays
+"""
+import sys
+from collections import namedtuple
+import numpy as np
+from . Hypergraph import HypergraphView
+from . import Reorder
+
+try:
+    import numba
+except ImportError:  # pragma: no cover - depends on the environment
+    numba = None
+
+__author__ = 'gm'
+
+AVAILABLE = numba is not None  # whether the kernel is compiled
+NONE = -1  # marks the end of a bucket list or a cell that is in no bucket
+MAXSIZE = sys.maxsize
+
+Arrays = namedtuple("Arrays", ["cells", "cell_ptr", "cell_nets", "net_ptr", "net_pins", "cell_w", "net_w", "large",
+                               "pmax", "smax"])
+Arrays.__doc__ = """
+the arrays find_mincut() runs on, built by arrays_from_hypergraph(). cells[i] is the number of the cell at position
+i, large marks the nets above the net threshold, pmax and smax are the ones FiducciaMattheyses computes
+"""
+
+
+def _jit(f):
+    if numba is None:
+        return f
+    return numba.njit(cache=True)(f)
+
+
+@_jit
+def _bucket_remove(c, side, head, tail, nxt, prv, bnum, max_gain, pmax):
+    """
+    remove cell c from its bucket, decrementing max gain if the max gain bucket became empty
+    """
+    s = side[c]
+    b = bnum[c]
+    p = prv[c]
+    q = nxt[c]
+    if p == NONE:
+        head[s, b] = q
+    else:
+        nxt[p] = q
+    if q == NONE:
+        tail[s, b] = p
+    else:
+        prv[q] = p
+    bnum[c] = NONE
+    if b == max_gain[s] + pmax and head[s, b] == NONE:
+        while max_gain[s] > -pmax:
+            max_gain[s] -= 1
+            if head[s, max_gain[s] + pmax] != NONE:
+                break
+
+
+@_jit
+def _bucket_add(c, side, gain, head, tail, nxt, prv, bnum, max_gain, pmax):
+    """
+    append cell c to the bucket of its gain, raising max gain if needed
+    """
+    s = side[c]
+    b = gain[c] + pmax
+    t = tail[s, b]
+    prv[c] = t
+    nxt[c] = NONE
+    if t == NONE:
+        head[s, b] = c
+    else:
+        nxt[t] = c
+    tail[s, b] = c
+    bnum[c] = b
+    if gain[c] > max_gain[s]:
+        max_gain[s] = gain[c]
+
+
+@_jit
+def _yank(c, side, gain, head, tail, nxt, prv, bnum, max_gain, pmax):
+    _bucket_remove(c, side, head, tail, nxt, prv, bnum, max_gain, pmax)
+    _bucket_add(c, side, gain, head, tail, nxt, prv, bnum, max_gain, pmax)
+
+
+@_jit
+def _balance_factor(c, side, cell_w, size, smax, r):
+    """
+    same as FiducciaMattheyses.get_balance_factor, returns -1.0 instead of None
+    """
+    if side[c] == 0:
+        a = size[0] - cell_w[c]
+        b = size[1] + cell_w[c]
+    else:
+        a = size[0] + cell_w[c]
+        b = size[1] - cell_w[c]
+    w = a + b
+    if r * w - smax <= a <= r * w + smax:
+        return abs(a - r * w)
+    return -1.0
+
+
+@_jit
+def _move(c, cell_ptr, cell_nets, net_ptr, net_pins, cell_w, net_w, large, side, locked, gain, cnt, lcnt, psum,
+          cut, head, tail, nxt, prv, bnum, max_gain, flist, flen, size, state, pmax):
+    """
+    same as Block.move_cell, state[0] holds the cutset. Large nets are left out of gain updates
+    """
+    f = side[c]
+    t = 1 - f
+    # lock cell
+    locked[c] = 1
+    for k in range(cell_ptr[c], cell_ptr[c + 1]):
+        lcnt[cell_nets[k], f] += 1
+    # adjust gains before the move
+    for k in range(cell_ptr[c], cell_ptr[c + 1]):
+        n = cell_nets[k]
+        if large[n]:
+            continue
+        if lcnt[n, t] == 0:
+            free = cnt[n, t] - lcnt[n, t]
+            if free == 0:
+                for j in range(net_ptr[n], net_ptr[n + 1]):
+                    d = net_pins[j]
+                    if locked[d] == 0:
+                        gain[d] += net_w[n]
+                        _yank(d, side, gain, head, tail, nxt, prv, bnum, max_gain, pmax)
+            elif free == 1:
+                d = psum[n, t]  # the only cell of the net in the T block
+                gain[d] -= net_w[n]
+                _yank(d, side, gain, head, tail, nxt, prv, bnum, max_gain, pmax)
+    # remove the cell from its block, add it to the free cell list of the complementary block
+    size[f] -= cell_w[c]
+    _bucket_remove(c, side, head, tail, nxt, prv, bnum, max_gain, pmax)
+    size[t] += cell_w[c]
+    flist[t, flen[t]] = c
+    flen[t] += 1
+    side[c] = t
+    # adjust the distribution of the nets of the cell
+    for k in range(cell_ptr[c], cell_ptr[c + 1]):
+        n = cell_nets[k]
+        cnt[n, f] -= 1
+        cnt[n, t] += 1
+        lcnt[n, f] -= 1
+        lcnt[n, t] += 1
+        psum[n, f] -= c
+        psum[n, t] += c
+        new_cut = cnt[n, 0] != 0 and cnt[n, 1] != 0
+        if new_cut != cut[n]:
+            if new_cut:
+                state[0] += net_w[n]
+            else:
+                state[0] -= net_w[n]
+            cut[n] = new_cut
+    # adjust gains after the move
+    for k in range(cell_ptr[c], cell_ptr[c + 1]):
+        n = cell_nets[k]
+        if large[n]:
+            continue
+        if lcnt[n, f] == 0:
+            free = cnt[n, f] - lcnt[n, f]
+            if free == 0:
+                for j in range(net_ptr[n], net_ptr[n + 1]):
+                    d = net_pins[j]
+                    if locked[d] == 0:
+                        gain[d] -= net_w[n]
+                        _yank(d, side, gain, head, tail, nxt, prv, bnum, max_gain, pmax)
+            elif free == 1:
+                d = psum[n, f]  # the only cell of the net left in the F block
+                gain[d] += net_w[n]
+                _yank(d, side, gain, head, tail, nxt, prv, bnum, max_gain, pmax)
+
+
+@_jit
+def _undo(c, cell_ptr, cell_nets, cell_w, net_w, side, cnt, psum, cut, size, state):
+    """
+    move cell c back to its complementary block, only the distribution of its nets and the cutset are maintained
+    """
+    f = side[c]
+    t = 1 - f
+    size[f] -= cell_w[c]
+    size[t] += cell_w[c]
+    side[c] = t
+    for k in range(cell_ptr[c], cell_ptr[c + 1]):
+        n = cell_nets[k]
+        cnt[n, f] -= 1
+        cnt[n, t] += 1
+        psum[n, f] -= c
+        psum[n, t] += c
+        new_cut = cnt[n, 0] != 0 and cnt[n, 1] != 0
+        if new_cut != cut[n]:
+            if new_cut:
+                state[0] += net_w[n]
+            else:
+                state[0] -= net_w[n]
+            cut[n] = new_cut
+
+
+@_jit
+def _start_pass(cell_ptr, cell_nets, net_w, large, side, locked, gain, cnt, lcnt, head, tail, nxt, prv, bnum,
+                max_gain, flist, flen, pmax):
+    """
+    same as compute_initial_gains() followed by initialize() of both blocks: free cells are put in the buckets in
+    cell order, then the cells of the free cell lists in the order they were locked
+    """
+    head[:, :] = NONE
+    tail[:, :] = NONE
+    bnum[:] = NONE
+    max_gain[:] = -pmax
+    for c in range(len(side)):
+        f = side[c]
+        t = 1 - f
+        g = 0
+        for k in range(cell_ptr[c], cell_ptr[c + 1]):
+            n = cell_nets[k]
+            if large[n]:
+                continue
+            if cnt[n, f] == 1:
+                g += net_w[n]
+            if cnt[n, t] == 0:
+                g -= net_w[n]
+        gain[c] = g
+        if locked[c] == 0:
+            _bucket_add(c, side, gain, head, tail, nxt, prv, bnum, max_gain, pmax)
+    for s in range(2):
+        for i in range(flen[s]):
+            c = flist[s, i]
+            locked[c] = 0
+            for k in range(cell_ptr[c], cell_ptr[c + 1]):
+                lcnt[cell_nets[k], s] -= 1
+            _bucket_add(c, side, gain, head, tail, nxt, prv, bnum, max_gain, pmax)
+        flen[s] = 0
+
+
+@_jit
+def find_mincut(cell_ptr, cell_nets, net_ptr, net_pins, cell_w, net_w, large, pmax, smax, r, lifo, initial):
+    """
+    run initial_pass() and then passes until the cutset stops changing, exactly like
+    FiducciaMattheyses.find_mincut(), starting with all cells in block A. Candidate base cells are taken from the
+    head of the max gain bucket (FIFO policy) or from its tail if lifo is True. If initial is not empty the initial
+    pass moves its cells in order instead of the best cells of block A. Nets marked in large count towards the cutset
+    but not towards gains.
+
+    returns (side of every cell, 0 for A and 1 for B, cutset, number of passes, number of moves of all passes,
+    cutset after every pass, moves made by every pass)
+    """
+    num_cells = len(cell_ptr) - 1
+    num_nets = len(net_ptr) - 1
+    side = np.zeros(num_cells, dtype=np.int64)
+    locked = np.zeros(num_cells, dtype=np.int64)
+    gain = np.zeros(num_cells, dtype=np.int64)
+    cnt = np.zeros((num_nets, 2), dtype=np.int64)
+    lcnt = np.zeros((num_nets, 2), dtype=np.int64)
+    psum = np.zeros((num_nets, 2), dtype=np.int64)  # sum of the cell numbers of every net per block
+    cut = np.zeros(num_nets, dtype=np.bool_)
+    head = np.full((2, 2 * pmax + 1), NONE, dtype=np.int64)
+    tail = np.full((2, 2 * pmax + 1), NONE, dtype=np.int64)
+    ends = tail if lifo else head  # where candidate base cells are taken from
+    nxt = np.full(num_cells, NONE, dtype=np.int64)
+    prv = np.full(num_cells, NONE, dtype=np.int64)
+    bnum = np.full(num_cells, NONE, dtype=np.int64)
+    max_gain = np.full(2, -pmax, dtype=np.int64)
+    flist = np.zeros((2, num_cells), dtype=np.int64)
+    flen = np.zeros(2, dtype=np.int64)
+    size = np.zeros(2, dtype=np.int64)
+    state = np.zeros(1, dtype=np.int64)
+    moves = np.zeros(num_cells, dtype=np.int64)
+    cutsets = np.zeros(16, dtype=np.int64)  # cutset after every pass, grown as needed
+    pass_moves = np.zeros(16, dtype=np.int64)  # moves made by every pass, rolled back ones included
+
+    size[0] = cell_w.sum()
+    for n in range(num_nets):
+        cnt[n, 0] = net_ptr[n + 1] - net_ptr[n]
+        for j in range(net_ptr[n], net_ptr[n + 1]):
+            psum[n, 0] += net_pins[j]
+
+    # initial pass, move the best cells of block A until the partition is balanced
+    _start_pass(cell_ptr, cell_nets, net_w, large, side, locked, gain, cnt, lcnt, head, tail, nxt, prv, bnum,
+                max_gain, flist, flen, pmax)
+    i = 0
+    while True:
+        w = size[0] + size[1]
+        if r * w - smax <= size[0] <= r * w + smax:
+            break
+        if len(initial) != 0:
+            if i == len(initial):
+                break
+            c = initial[i]
+            i += 1
+        else:
+            c = ends[0, max_gain[0] + pmax]
+        _move(c, cell_ptr, cell_nets, net_ptr, net_pins, cell_w, net_w, large, side, locked, gain, cnt, lcnt, psum,
+              cut, head, tail, nxt, prv, bnum, max_gain, flist, flen, size, state, pmax)
+
+    passes = 0
+    total = 0
+    prev_cutset = MAXSIZE
+    while passes == 0 or state[0] != prev_cutset:
+        if passes != 0:
+            prev_cutset = state[0]
+        passes += 1
+        _start_pass(cell_ptr, cell_nets, net_w, large, side, locked, gain, cnt, lcnt, head, tail, nxt, prv, bnum,
+                    max_gain, flist, flen, pmax)
+        start_cutset = state[0]
+        best_cutset = MAXSIZE
+        best = 0
+        count = 0
+        while True:
+            # get the base cell, see FiducciaMattheyses.get_base_cell()
+            a = ends[0, max_gain[0] + pmax]
+            bfactor_a = -1.0
+            if a != NONE:
+                bfactor_a = _balance_factor(a, side, cell_w, size, smax, r)
+            b = ends[1, max_gain[1] + pmax]
+            bfactor_b = -1.0
+            if b != NONE:
+                bfactor_b = _balance_factor(b, side, cell_w, size, smax, r)
+            if bfactor_a < 0 and bfactor_b < 0:
+                break
+            elif bfactor_a < 0:
+                c = b
+            elif bfactor_b < 0:
+                c = a
+            elif bfactor_a < bfactor_b:
+                c = a
+            else:
+                c = b
+            _move(c, cell_ptr, cell_nets, net_ptr, net_pins, cell_w, net_w, large, side, locked, gain, cnt, lcnt,
+                  psum, cut, head, tail, nxt, prv, bnum, max_gain, flist, flen, size, state, pmax)
+            moves[count] = c
+            count += 1
+            if state[0] < best_cutset:
+                best_cutset = state[0]
+                best = count
+        total += count
+        if passes > len(cutsets):
+            cutsets = np.concatenate((cutsets, np.zeros(len(cutsets), dtype=np.int64)))
+            pass_moves = np.concatenate((pass_moves, np.zeros(len(pass_moves), dtype=np.int64)))
+        pass_moves[passes - 1] = count
+        if count == 0:
+            cutsets[passes - 1] = state[0]
+            continue
+        if best_cutset > start_cutset:  # no prefix is better than none, see FiducciaMattheyses.perform_pass()
+            best = 0
+        # roll back to the best prefix of the pass, its cells stay locked until the next pass starts
+        for i in range(count - 1, best - 1, -1):
+            _undo(moves[i], cell_ptr, cell_nets, cell_w, net_w, side, cnt, psum, cut, size, state)
+        locked[:] = 0
+        lcnt[:, :] = 0
+        flen[:] = 0
+        for i in range(best):
+            c = moves[i]
+            s = side[c]
+            locked[c] = 1
+            for k in range(cell_ptr[c], cell_ptr[c + 1]):
+                lcnt[cell_nets[k], s] += 1
+            flist[s, flen[s]] = c
+            flen[s] += 1
+        cutsets[passes - 1] = state[0]
+
+    return side, state[0], passes, total, cutsets[:passes], pass_moves[:passes]
+
+
+def arrays_from_hypergraph(hypergraph, keep_isolated: bool = True, reorder: str = None,
+                           net_threshold: int = None) -> Arrays:
+    """
+    build the arrays of find_mincut() straight from a Hypergraph or HypergraphView, without Cell and Net objects.
+    Cells and nets are in the order FiducciaMattheyses.build_objects() gives cell_array and net_array with the same
+    settings, so the kernel finds the same partition either way
+    """
+    if isinstance(hypergraph, HypergraphView):
+        nets = [hypergraph.net(i) for i in range(hypergraph.num_nets)]
+        net_ptr = np.zeros(len(nets) + 1, dtype=np.int64)
+        np.cumsum([len(cells) for cells in nets], out=net_ptr[1:])
+        pins = np.concatenate(nets) if len(nets) != 0 else np.zeros(0, dtype=np.int64)
+    else:
+        net_ptr = np.asarray(hypergraph.net_ptr, dtype=np.int64)
+        pins = np.asarray(hypergraph.pins, dtype=np.int64)
+    sizes = np.diff(net_ptr)
+    net_w = (np.ones(len(sizes), dtype=np.int64) if hypergraph.net_weights is None
+             else np.asarray(hypergraph.net_weights, dtype=np.int64))
+
+    if reorder is not None:
+        cells = Reorder.cell_order(hypergraph, reorder)
+        order = Reorder.net_order(hypergraph, cells)
+        sizes = sizes[order]
+        starts = net_ptr[:-1][order]
+        net_ptr = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=net_ptr[1:])
+        pins = pins[np.repeat(starts - net_ptr[:-1], sizes) + np.arange(len(pins), dtype=np.int64)]
+        net_w = net_w[order]
+        if not keep_isolated:
+            cells = cells[np.isin(cells, pins)]
+    elif keep_isolated:
+        cells = np.asarray(hypergraph.cells(), dtype=np.int64)
+    else:  # cells in the order they first appear in a net
+        cells, first = np.unique(pins, return_index=True)
+        cells = cells[np.argsort(first, kind="stable")]
+
+    position = np.full(hypergraph.num_cells, NONE, dtype=np.int64)
+    position[cells] = np.arange(len(cells), dtype=np.int64)
+    net_pins = position[pins]
+    order = np.argsort(net_pins, kind="stable")
+    cell_nets = np.repeat(np.arange(len(sizes), dtype=np.int64), sizes)[order]
+    cell_ptr = np.zeros(len(cells) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(net_pins, minlength=len(cells)), out=cell_ptr[1:])
+    cell_w = (np.ones(len(cells), dtype=np.int64) if hypergraph.cell_weights is None
+              else np.asarray(hypergraph.cell_weights, dtype=np.int64)[cells])
+    large = sizes > net_threshold if net_threshold is not None else np.zeros(len(sizes), dtype=np.bool_)
+    degree = np.zeros(len(cells), dtype=np.int64)
+    np.add.at(degree, net_pins, np.repeat(np.where(large, 0, net_w), sizes))
+    pmax = int(degree.max()) if len(cells) != 0 else 0
+    smax = max(1, int(cell_w.max()) if len(cells) != 0 else 1)
+    return Arrays(cells, cell_ptr, cell_nets, net_ptr, net_pins, cell_w, net_w, large, pmax, smax)
+
+
+def cut_flags(net_ptr, net_pins, side) -> np.ndarray:
+    """
+    returns whether every net has cells on both sides
+    """
+    cut = np.zeros(len(net_ptr) - 1, dtype=np.bool_)
+    nonempty = np.diff(net_ptr) > 0
+    if nonempty.any():
+        pin_sides = side[net_pins]
+        starts = net_ptr[:-1][nonempty]
+        cut[nonempty] = np.minimum.reduceat(pin_sides, starts) != np.maximum.reduceat(pin_sides, starts)
+    return cut
+
+
+def arrays_from(fm):
+    """
+    flatten the cell_array and net_array of a FiducciaMattheyses instance into the arrays find_mincut() expects.
+    Cells and nets keep the order of cell_array and net_array, the nets of a cell and the cells of a net keep
+    their insertion order.
+
+    returns (cells in kernel order, cell_ptr, cell_nets, net_ptr, net_pins, cell weights, net weights)
+    """
+    cells = list(fm.cell_array.values())
+    nets = list(fm.net_array.values())
+    cell_index = {cell: i for i, cell in enumerate(cells)}
+    net_index = {net: i for i, net in enumerate(nets)}
+
+    cell_ptr = np.zeros(len(cells) + 1, dtype=np.int64)
+    np.cumsum([len(cell.nets) for cell in cells], out=cell_ptr[1:])
+    cell_nets = np.fromiter((net_index[net] for cell in cells for net in cell.nets), dtype=np.int64,
+                            count=cell_ptr[-1])
+    net_ptr = np.zeros(len(nets) + 1, dtype=np.int64)
+    np.cumsum([len(net.cells) for net in nets], out=net_ptr[1:])
+    net_pins = np.fromiter((cell_index[cell] for net in nets for cell in net.cells), dtype=np.int64,
+                           count=net_ptr[-1])
+    cell_w = np.fromiter((cell.weight for cell in cells), dtype=np.int64, count=len(cells))
+    net_w = np.fromiter((net.weight for net in nets), dtype=np.int64, count=len(nets))
+    return cells, cell_ptr, cell_nets, net_ptr, net_pins, cell_w, net_w
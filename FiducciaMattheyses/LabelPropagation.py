@@ -0,0 +1,183 @@
+import multiprocessing
+from collections import namedtuple
+import numpy as np
+from . FiducciaMattheyses import FiducciaMattheyses
+from . Hypergraph import Hypergraph
+
+__author__ = 'gm'
+
+MAX_ROUNDS = 64  # most rounds of refine(), every round moves cells in one direction
+CHUNKS = 4  # chunks of cells and of nets per worker process in every round
+
+LPResult = namedtuple("LPResult", ["labels", "cutset", "rounds", "moves"])
+LPResult.__doc__ = """
+the result of refine(). labels[i] is the block of cell i, 0 for A and 1 for B, rounds is the number of rounds that
+were run and moves the number of cells moved by label propagation, the moves of polish not included
+"""
+
+_worker_arrays = None  # the arrays of a worker process: incidence, hypergraph and shared ones, set by _init_worker
+
+
+def _count(net_ptr: np.ndarray, pins: np.ndarray, labels: np.ndarray, counts: np.ndarray, lo: int, hi: int):
+    """
+    count the pins of nets lo .. hi - 1 in each block into counts[net, block]
+    """
+    sizes = np.diff(net_ptr[lo:hi + 1])
+    nets = np.repeat(np.arange(hi - lo, dtype=np.int64), sizes)
+    inB = np.bincount(nets, labels[pins[net_ptr[lo]:net_ptr[hi]]] == 1, minlength=hi - lo).astype(np.int64)
+    counts[lo:hi, 0] = sizes - inB
+    counts[lo:hi, 1] = inB
+
+
+def _gain(cell_ptr: np.ndarray, cell_nets: np.ndarray, net_weights: np.ndarray, labels: np.ndarray,
+          counts: np.ndarray, gains: np.ndarray, lo: int, hi: int):
+    """
+    compute the gains of cells lo .. hi - 1 into gains: a net adds its weight if the cell is its only pin in the
+    block of the cell, and subtracts it if it has no pin in the other block
+    """
+    cells = np.repeat(np.arange(hi - lo, dtype=np.int64), np.diff(cell_ptr[lo:hi + 1]))
+    nets = cell_nets[cell_ptr[lo]:cell_ptr[hi]]
+    side = labels[lo:hi][cells].astype(np.int64)
+    terms = (counts[nets, side] == 1).astype(np.int64) - (counts[nets, 1 - side] == 0)
+    if net_weights is not None:
+        terms *= net_weights[nets]
+    gains[lo:hi] = np.bincount(cells, terms, minlength=hi - lo).astype(np.int64)
+
+
+def _init_worker(hypergraph: Hypergraph, labels, counts, gains):
+    global _worker_arrays
+    cell_ptr, cell_nets = hypergraph.incidence()
+    _worker_arrays = (hypergraph.net_ptr, hypergraph.pins, cell_ptr, cell_nets, hypergraph.net_weights,
+                      np.frombuffer(labels, dtype=np.int8), np.frombuffer(counts, dtype=np.int64).reshape(-1, 2),
+                      np.frombuffer(gains, dtype=np.int64))
+
+
+def _run_worker(task):
+    net_ptr, pins, cell_ptr, cell_nets, net_weights, labels, counts, gains = _worker_arrays
+    step, lo, hi = task
+    if step == "count":
+        _count(net_ptr, pins, labels, counts, lo, hi)
+    else:
+        _gain(cell_ptr, cell_nets, net_weights, labels, counts, gains, lo, hi)
+
+
+def _chunks(n: int, parts: int) -> list:
+    bounds = np.linspace(0, n, parts + 1).astype(np.int64).tolist()
+    return [(lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:]) if lo < hi]
+
+
+def _select(side: np.ndarray, gains: np.ndarray, weights: np.ndarray, A: int, direction: int, lo: float,
+            hi: float) -> np.ndarray:
+    """
+    returns the cells of block direction to move to the other block. If the weight A of block A is within lo .. hi
+    these are the cells with a positive gain, best first, as many as keep it there. Otherwise they are the cells of
+    the block with the highest gains, negative ones too, as few as bring A within lo .. hi
+    """
+    balanced = lo <= A <= hi
+    candidates = np.flatnonzero((side == direction) & (gains > 0)) if balanced else np.flatnonzero(side == direction)
+    order = candidates[np.argsort(-gains[candidates], kind="stable")]
+    moved = np.cumsum(weights[order])
+    after = A - moved if direction == 0 else A + moved  # weight of block A after every prefix of order
+    if balanced:  # the longest prefix that stays within
+        count = np.searchsorted(-after, -lo, side="right") if direction == 0 else np.searchsorted(after, hi, "right")
+    else:  # the shortest prefix that gets within
+        count = 1 + (np.searchsorted(-after, -hi, side="left") if direction == 0 else np.searchsorted(after, lo))
+    return order[:min(int(count), len(order))]
+
+
+def refine(hypergraph: Hypergraph, labels, r: float = FiducciaMattheyses.r, epsilon: float = 0.03,
+           processes: int = None, max_rounds: int = MAX_ROUNDS, polish: bool = False, **kwargs) -> LPResult:
+    """
+    improve a bipartition by size constrained label propagation. Every round counts the pins of every net in each
+    block and computes the gain of every cell, split in chunks of nets and of cells over a pool of processes that
+    share the labels, the counts and the gains. The cells of one block with a positive gain then move to the other
+    block, best gain first, as many as keep the weight of block A within epsilon W of rW. Rounds alternate the block
+    cells leave, so the cells of a round all move the same way and the cut goes down by at least the sum of their
+    gains. Between rounds a partition that is out of balance is balanced by moving the cells of the heavier block
+    with the highest gains, negative ones too. Rounds stop when neither block has a cell to move, then a last such
+    balancing brings A within smax of rW, the balance criterion of FiducciaMattheyses
+
+    :param labels: labels[i] is the block of cell i, 0 for A and 1 for B
+    :param epsilon: the share of the total weight block A may be off rW by during the rounds, at least smax
+    :param processes: number of worker processes, rounds run in this process if None or 1
+    :param polish: refine the result further with passes of FiducciaMattheyses, see FiducciaMattheyses.refine()
+    :param kwargs: passed to FiducciaMattheyses when polishing
+    """
+    n = hypergraph.num_cells
+    assert len(labels) == n
+    weights = np.ones(n, dtype=np.int64) if hypergraph.cell_weights is None else \
+        np.asarray(hypergraph.cell_weights, dtype=np.int64)
+    W = int(weights.sum())
+    smax = int(weights.max()) if n != 0 else 1
+    slack = max(smax, epsilon * W)
+    parallel = processes is not None and processes > 1
+    if parallel:
+        shared = (multiprocessing.RawArray("b", max(n, 1)),
+                  multiprocessing.RawArray("q", max(2 * hypergraph.num_nets, 1)),
+                  multiprocessing.RawArray("q", max(n, 1)))
+        side = np.frombuffer(shared[0], dtype=np.int8)[:n]
+        counts = np.frombuffer(shared[1], dtype=np.int64)[:2 * hypergraph.num_nets].reshape(-1, 2)
+        gains = np.frombuffer(shared[2], dtype=np.int64)[:n]
+        pool = multiprocessing.Pool(processes, _init_worker, (hypergraph,) + shared)
+        parts = processes * CHUNKS
+    else:
+        side = np.zeros(n, dtype=np.int8)
+        counts = np.zeros((hypergraph.num_nets, 2), dtype=np.int64)
+        gains = np.zeros(n, dtype=np.int64)
+        cell_ptr, cell_nets = hypergraph.incidence()
+        pool = None
+        parts = 1
+    side[:] = labels
+    assert np.all((side == 0) | (side == 1))
+    net_tasks = [("count", lo, hi) for lo, hi in _chunks(hypergraph.num_nets, parts)]
+    cell_tasks = [("gain", lo, hi) for lo, hi in _chunks(n, parts)]
+
+    def run(tasks):
+        if pool is not None:
+            pool.map(_run_worker, tasks)
+            return
+        for step, lo, hi in tasks:
+            if step == "count":
+                _count(hypergraph.net_ptr, hypergraph.pins, side, counts, lo, hi)
+            else:
+                _gain(cell_ptr, cell_nets, hypergraph.net_weights, side, counts, gains, lo, hi)
+
+    def step(direction: int, lo: float, hi: float) -> int:
+        run(net_tasks)
+        run(cell_tasks)
+        A = int(weights[side == 0].sum())
+        if not lo <= A <= hi:
+            direction = 0 if A > hi else 1
+        cells = _select(side, gains, weights, A, direction, lo, hi)
+        side[cells] = 1 - direction
+        return len(cells)
+
+    rounds = 0
+    moves = 0
+    idle = 0  # consecutive rounds that moved no cell
+    try:
+        while rounds < max_rounds and idle < 2:
+            count = step(rounds % 2, r * W - slack, r * W + slack)
+            rounds += 1
+            moves += count
+            idle = idle + 1 if count == 0 else 0
+        A = int(weights[side == 0].sum())
+        if not r * W - smax <= A <= r * W + smax:
+            moves += step(0, r * W - smax, r * W + smax)
+            rounds += 1
+        run(net_tasks)
+        cut = (counts[:, 0] > 0) & (counts[:, 1] > 0)
+        cutset = int(cut.sum()) if hypergraph.net_weights is None else int(hypergraph.net_weights[cut].sum())
+        labels = side.copy()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if polish:
+        fm = FiducciaMattheyses(r=r, **kwargs)
+        fm.input_hypergraph(hypergraph, keep_isolated=True)
+        fm.refine(labels)
+        labels = fm.labels()
+        cutset = fm.cutset
+    return LPResult(labels, cutset, rounds, moves)
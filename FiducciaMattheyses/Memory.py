@@ -0,0 +1,188 @@
+import functools
+import sys
+import tracemalloc
+from collections import namedtuple
+import numpy as np
+from . Util import Cell, Net
+from . Hypergraph import Hypergraph
+from . import Engines
+
+__author__ = 'gm'
+
+Footprint = namedtuple("Footprint", ["objects", "sets", "buckets", "snapshots", "arrays", "total"])
+Footprint.__doc__ = """
+bytes used by the parts of a FiducciaMattheyses instance. objects are the Cell, Net, Block and BucketArray objects
+themselves, sets the dicts and lists of nets, cells and cut nets they hold, buckets the bucket lists and free cell
+lists of both blocks, snapshots what take_snapshot() saved and arrays the numpy arrays of the hypergraph and of the
+kernel. Ints and the other immutable values shared between objects are not counted
+"""
+
+
+def _footprint(objects: int = 0, sets: int = 0, buckets: int = 0, snapshots: int = 0, arrays: int = 0) -> Footprint:
+    return Footprint(objects, sets, buckets, snapshots, arrays, objects + sets + buckets + snapshots + arrays)
+
+
+def _dict_bytes(n: int) -> int:
+    """
+    the size of a dict of n int keys built by insertion, as sys.getsizeof() gives it on CPython 3.6 and later
+    """
+    if n == 0:
+        return sys.getsizeof({})
+    size = 8
+    while 2 * size // 3 < n:
+        size *= 2
+    index = 1 if size <= 0xff else 2 if size <= 0xffff else 4 if size <= 0xffffffff else 8
+    return sys.getsizeof({0: None}) - 8 - 5 * 24 + size * index + 2 * size // 3 * 24
+
+
+def _list_bytes(n: float) -> float:
+    """
+    the size of a list of n items built by appending, the over-allocation averaged
+    """
+    return sys.getsizeof([]) + (8 * n * 9 / 8 + 24 if n > 0 else 0)
+
+
+@functools.lru_cache(maxsize=None)
+def _object_bytes(cls) -> int:
+    """
+    the size of an instance of Cell or Net with its attribute values, without the dicts and lists its constructor
+    creates, measured once with tracemalloc
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objects = [cls(n) if cls is Net else cls(n, None) for n in range(1000)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        if started:
+            tracemalloc.stop()
+    containers = sum(_sizeof(value) for value in vars(objects[0]).values() if isinstance(value, (dict, list)))
+    return round((after - before - sys.getsizeof(objects)) / len(objects)) - containers
+
+
+def _sizeof(value) -> int:
+    """
+    the size of a tuple, list or dict and of the tuples, lists and dicts it holds. Other objects it refers to are
+    not counted: they are cells, nets, blocks and small values counted elsewhere or shared
+    """
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_sizeof(v) for v in value.values())
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(_sizeof(v) for v in value if isinstance(v, (tuple, list, dict)))
+    return 0
+
+
+def _nbytes(*arrays) -> int:
+    return sum(a.nbytes for a in arrays if isinstance(a, np.ndarray))
+
+
+def footprint(fm) -> Footprint:
+    """
+    measure the memory of a FiducciaMattheyses instance by walking its objects. Attributes an engine deferred are
+    not built, they count as nothing. The arrays of a hypergraph mapped from a file count in full, though the
+    operating system only loads the pages that are read
+    """
+    attributes = vars(fm)
+    cells = attributes.get("cell_array", {})
+    nets = attributes.get("net_array", {})
+    blocks = [block for block in (attributes.get("blockA"), attributes.get("blockB")) if block is not None]
+    objects = len(cells) * _object_bytes(Cell) + len(nets) * _object_bytes(Net) + \
+        sum(sys.getsizeof(block) + sys.getsizeof(vars(block)) + sys.getsizeof(block.bucket_array) +
+            sys.getsizeof(vars(block.bucket_array)) for block in blocks)
+    sets = sum(sys.getsizeof(attributes[name]) for name in ("cell_array", "net_array", "cut_nets")
+               if name in attributes) + \
+        sum(sys.getsizeof(cell.nets) for cell in cells.values()) + \
+        sum(sys.getsizeof(net.cells) + sys.getsizeof(net.blockA_cells) + sys.getsizeof(net.blockB_cells)
+            for net in nets.values()) + \
+        sum(sys.getsizeof(block.cells) for block in blocks)
+    buckets = sum(_sizeof(block.bucket_array.array) + sys.getsizeof(block.bucket_array.free_cell_list)
+                  for block in blocks)
+    snapshots = _sizeof(fm.snapshot) + sum(_sizeof(cell.snapshot) for cell in cells.values()) + \
+        sum(_sizeof(net.snapshot) for net in nets.values()) + \
+        sum(_sizeof(block.snapshot) + _sizeof(block.bucket_array.snapshot) for block in blocks)
+    arrays = 0
+    hypergraph = fm.hypergraph
+    if isinstance(hypergraph, Hypergraph):  # a view shares the arrays of its parent
+        arrays += _nbytes(hypergraph.net_ptr, hypergraph.pins, hypergraph.cell_weights, hypergraph.net_weights)
+    if fm.arrays is not None:
+        arrays += _nbytes(*fm.arrays)
+    return _footprint(objects, sets, buckets, snapshots, arrays)
+
+
+def estimate(num_cells: int, num_nets: int, num_pins: int, engine: str = Engines.PYTHON, pmax: int = None,
+             snapshots: bool = False) -> Footprint:
+    """
+    predict the footprint of a FiducciaMattheyses instance before building it, from the size of the hypergraph,
+    assuming every cell has the mean number of nets and every net the mean number of cells. The arrays of the
+    hypergraph the instance is built from are included. The kernel engine builds no objects: its arrays are counted
+    instead, with the ones find_mincut() allocates
+
+    :param engine: Engines.PYTHON or Engines.KERNEL, the other engines of the registry build the same objects as the
+                   python engine
+    :param pmax: the highest number of nets of a cell, defaults to four times the mean
+    :param snapshots: include a take_snapshot() of the whole instance
+    """
+    if num_cells == 0:
+        return _footprint()
+    degree = num_pins / num_cells
+    size = num_pins / num_nets if num_nets != 0 else 0
+    if pmax is None:
+        pmax = int(4 * degree) + 1
+    arrays = 8 * (num_nets + 1 + num_pins)  # net_ptr and pins of the hypergraph
+    if engine == Engines.KERNEL:
+        # cells, cell_ptr, cell_nets, net_ptr, net_pins, cell_w, net_w, large, then the arrays of a run: 9 int64 per
+        # cell, 6 int64 and a flag per net and the heads and tails of both bucket arrays
+        arrays += 8 * (3 * num_cells + 2 * num_pins + 2 * num_nets) + num_nets
+        arrays += 72 * num_cells + 49 * num_nets + 32 * (2 * pmax + 1)
+        return _footprint(arrays=arrays)
+
+    objects = num_cells * _object_bytes(Cell) + num_nets * _object_bytes(Net)
+    sets = _dict_bytes(num_cells) + _dict_bytes(num_nets) + num_cells * _dict_bytes(round(degree)) + \
+        num_nets * (_dict_bytes(round(size)) + 2 * _list_bytes(size / 2)) + 2 * _list_bytes(num_cells / 2)
+    buckets = 2 * _list_bytes(2 * pmax + 1) + 2 * (2 * pmax + 1) * sys.getsizeof([]) + 8 * num_cells * 9 / 8
+    saved = 0
+    if snapshots:
+        saved = num_cells * sys.getsizeof((0, 0, 0, 0)) + \
+            num_nets * (sys.getsizeof((0,) * 9) + 2 * sys.getsizeof([None] * round(size / 2))) + buckets
+    return _footprint(int(objects), int(sets), int(buckets), int(saved), arrays)
+
+
+class PeakMemory:
+    """
+    a context manager that measures with tracemalloc the highest memory allocated within it, above what was
+    allocated when it was entered, in bytes. tracemalloc is started if it is not tracing already, and stopped on
+    exit in that case. Entering resets the peak tracemalloc reports, so PeakMemory cannot be nested. Arrays that
+    the numba kernel allocates are not seen by tracemalloc, the ones numpy allocates are
+    """
+    def __init__(self):
+        self.bytes = 0  # the peak, set on exit
+        self.__started = False  # whether tracemalloc was started on entering
+        self.__base = 0  # memory allocated when entered
+
+    def __enter__(self):
+        self.__started = not tracemalloc.is_tracing()
+        if self.__started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self.__base = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.bytes = tracemalloc.get_traced_memory()[1] - self.__base
+        if self.__started:
+            tracemalloc.stop()
+        return False
+
+
+def report(fm) -> str:
+    """
+    the footprint of a FiducciaMattheyses instance as text, one line per part, and its peak_memory if it was
+    measured
+    """
+    parts = footprint(fm)
+    lines = ["%-10s %14d" % (name, value) for name, value in zip(Footprint._fields, parts)]
+    if fm.peak_memory is not None:
+        lines.append("%-10s %14d" % ("peak", fm.peak_memory))
+    return "\n".join(lines)
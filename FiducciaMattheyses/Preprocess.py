@@ -0,0 +1,215 @@
+import numpy as np
+from collections import namedtuple
+from . FiducciaMattheyses import FiducciaMattheyses
+from . Hypergraph import Hypergraph
+
+__author__ = 'gm'
+
+Reduction = namedtuple("Reduction", ["hypergraph", "cell_map", "merged_nets", "contracted_cells"])
+Reduction.__doc__ = """
+the result of reduce(). cell_map[i] is the cell of the reduced hypergraph that cell i of the original one is part of,
+merged_nets the number of nets removed by merging or because they had a single cell, contracted_cells the number
+of cells contracted into others
+"""
+
+PreprocessResult = namedtuple("PreprocessResult", ["labels", "cutset", "components", "split", "merged_nets",
+                                                   "contracted_cells"])
+PreprocessResult.__doc__ = """
+the result of partition(). labels[i] is the block of cell i of the original hypergraph, components the number of
+connected components of the reduced hypergraph and split the number of them that were partitioned by
+FiducciaMattheyses, all others were put in one block as a whole
+"""
+
+
+def _cell_weights(hypergraph: Hypergraph) -> np.ndarray:
+    if hypergraph.cell_weights is None:
+        return np.ones(hypergraph.num_cells, dtype=np.int64)
+    return np.asarray(hypergraph.cell_weights, dtype=np.int64)
+
+
+def _from_nets(num_cells: int, sizes, pins, net_weights, cell_weights) -> Hypergraph:
+    net_ptr = np.zeros(len(sizes) + 1, dtype=np.int64)
+    np.cumsum(np.asarray(sizes, dtype=np.int64), out=net_ptr[1:])
+    net_weights = np.asarray(net_weights, dtype=np.int64)
+    return Hypergraph(num_cells, net_ptr, np.asarray(pins, dtype=np.int64), cell_weights,
+                      None if np.all(net_weights == 1) else net_weights)
+
+
+def merge_duplicate_nets(hypergraph: Hypergraph) -> Hypergraph:
+    """
+    returns a hypergraph where nets with the same cells are a single net that weighs as much as all of them, which
+    costs one gain update per move instead of one per copy. Nets of a single cell can never be cut and are dropped.
+    Nets keep the order of their first occurrence
+    """
+    index = {}  # sorted cells of a net -> number of the net in the result
+    sizes = []
+    pins = []
+    weights = []
+    for n, cells, weight in hypergraph.nets():
+        if len(cells) < 2:
+            continue
+        cells = cells.tolist()
+        key = tuple(sorted(cells))
+        i = index.get(key)
+        if i is None:
+            index[key] = len(weights)
+            sizes.append(len(cells))
+            pins.extend(cells)
+            weights.append(weight)
+        else:
+            weights[i] += weight
+    return _from_nets(hypergraph.num_cells, sizes, pins, weights, hypergraph.cell_weights)
+
+
+def contract_pendants(hypergraph: Hypergraph, max_cell_weight: int = None):
+    """
+    contract every pendant cell, a cell whose only net connects it to one other cell, into that other cell. This is
+    repeated as long as new pendant cells appear, so chains hanging off the graph are contracted entirely. Putting a
+    pendant cell in the block of its neighbour never cuts its net, a partition of the contracted hypergraph has the
+    same cutset once expanded
+
+    :param max_cell_weight: cells are not contracted into cells that would become heavier than this, None means
+                            no limit
+
+    returns (contracted hypergraph, cell_map), cell_map[i] is the cell of the contracted hypergraph cell i is part of
+    """
+    n = hypergraph.num_cells
+    weights = _cell_weights(hypergraph).copy()
+    into = np.arange(n, dtype=np.int64)  # the cell every cell was contracted into, itself if it was not
+    net_ptr = hypergraph.net_ptr
+    pins = hypergraph.pins
+    net_weights = hypergraph.net_weights
+    while True:
+        degree = np.bincount(pins, minlength=n)
+        sizes = np.diff(net_ptr)
+        candidates = np.flatnonzero(sizes == 2)
+        first = pins[net_ptr[candidates]]
+        second = pins[net_ptr[candidates] + 1]
+        pendant = (degree[first] == 1) | (degree[second] == 1)
+        removed = np.zeros(len(sizes), dtype=bool)
+        for net, a, b in zip(candidates[pendant].tolist(), first[pendant].tolist(), second[pendant].tolist()):
+            if degree[a] == 1 and degree[b] == 1:  # a component of two cells, keep the lower one
+                c, u = max(a, b), min(a, b)
+            elif degree[a] == 1:
+                c, u = a, b
+            else:
+                c, u = b, a
+            if max_cell_weight is not None and weights[u] + weights[c] > max_cell_weight:
+                continue
+            weights[u] += weights[c]
+            into[c] = u
+            removed[net] = True
+        if not removed.any():
+            break
+        kept = ~removed
+        net_ptr = np.zeros(int(kept.sum()) + 1, dtype=np.int64)
+        np.cumsum(sizes[kept], out=net_ptr[1:])
+        pins = pins[np.repeat(kept, sizes)]
+        if net_weights is not None:
+            net_weights = net_weights[kept]
+
+    while True:  # a cell may have been contracted into a cell that was contracted later
+        resolved = into[into]
+        if np.array_equal(resolved, into):
+            break
+        into = resolved
+    alive = into == np.arange(n)
+    number = np.cumsum(alive) - 1  # number of every remaining cell in the contracted hypergraph
+    cell_map = number[into]
+    weighted = hypergraph.cell_weights is not None or not alive.all()
+    contracted = Hypergraph(int(alive.sum()), net_ptr, number[pins], weights[alive] if weighted else None,
+                            net_weights)
+    return contracted, cell_map
+
+
+def connected_components(hypergraph: Hypergraph) -> np.ndarray:
+    """
+    returns the component of every cell, components are numbered 0, 1, ... in the order of their lowest cell. A
+    cell that belongs to no net is a component of its own
+    """
+    parent = list(range(hypergraph.num_cells))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for n, cells, weight in hypergraph.nets():
+        cells = cells.tolist()
+        if len(cells) < 2:
+            continue
+        root = find(cells[0])
+        for cell in cells[1:]:
+            other = find(cell)
+            if other != root:
+                parent[other] = root
+    numbers = {}
+    components = np.empty(hypergraph.num_cells, dtype=np.int64)
+    for i in range(hypergraph.num_cells):
+        components[i] = numbers.setdefault(find(i), len(numbers))
+    return components
+
+
+def reduce(hypergraph: Hypergraph, max_cell_weight: int = None) -> Reduction:
+    """
+    merge duplicate nets, then contract pendant cells
+    """
+    merged = merge_duplicate_nets(hypergraph)
+    contracted, cell_map = contract_pendants(merged, max_cell_weight)
+    return Reduction(contracted, cell_map, hypergraph.num_nets - merged.num_nets,
+                     hypergraph.num_cells - contracted.num_cells)
+
+
+def partition(hypergraph: Hypergraph, r: float = FiducciaMattheyses.r, max_cell_weight: int = None,
+              **kwargs) -> PreprocessResult:
+    """
+    bipartition a hypergraph after reducing it. The connected components of the reduced hypergraph are visited from
+    the heaviest to the lightest: a component that fits in the block with the most room left goes there as a whole,
+    one that does not is partitioned on its own by FiducciaMattheyses with the ratio that fills block A. Cells
+    without nets are components of their own, they come last and even out the balance. Isolated cells are kept,
+    unlike input_routine() does
+
+    :param r: balance ratio of the whole partition
+    :param max_cell_weight: limit of the weight of contracted cells, defaults to 1% of the total weight (or the
+                            weight of the heaviest cell if more) so that contraction keeps the balance fine grained
+    :param kwargs: passed to FiducciaMattheyses for the components that are partitioned
+    """
+    weights = _cell_weights(hypergraph)
+    W = int(weights.sum())
+    if max_cell_weight is None:
+        max_cell_weight = max(int(weights.max()) if len(weights) else 1, W // 100)
+    reduction = reduce(hypergraph, max_cell_weight)
+    hg = reduction.hypergraph
+    weights = _cell_weights(hg)
+
+    components = connected_components(hg)
+    num_components = int(components.max()) + 1 if len(components) else 0
+    component_weights = np.bincount(components, weights, minlength=num_components).astype(np.int64)
+    order = np.argsort(components, kind="stable")
+    bounds = np.zeros(num_components + 1, dtype=np.int64)
+    np.cumsum(np.bincount(components, minlength=num_components), out=bounds[1:])
+
+    labels = np.zeros(hg.num_cells, dtype=np.int8)
+    room = [r * W, (1 - r) * W]  # weight that can still go to block A and block B
+    cutset = 0
+    split = 0
+    for c in np.argsort(-component_weights, kind="stable").tolist():
+        cells = order[bounds[c]:bounds[c + 1]]
+        w = int(component_weights[c])
+        side = 0 if room[0] >= room[1] else 1
+        if w <= room[side] or len(cells) == 1 or min(room) <= 0:
+            labels[cells] = side
+            room[side] -= w
+            continue
+        fm = FiducciaMattheyses(r=room[0] / w, **kwargs)
+        fm.input_hypergraph(hg.induced(cells), keep_isolated=True)
+        blockA, blockB = fm.find_mincut()
+        labels[blockB] = 1
+        room[0] -= fm.blockA.size
+        room[1] -= fm.blockB.size
+        cutset += fm.cutset
+        split += 1
+
+    return PreprocessResult(labels[reduction.cell_map], cutset, num_components, split, reduction.merged_nets,
+                            reduction.contracted_cells)
@@ -0,0 +1,108 @@
+from collections import deque
+import numpy as np
+from . Hypergraph import HypergraphView
+
+__author__ = 'gm'
+
+BFS = "bfs"  # breadth first search from a cell of lowest degree in every connected component
+RCM = "rcm"  # reverse Cuthill-McKee: breadth first, neighbours by increasing degree, the whole order reversed
+ORDERS = (BFS, RCM)
+
+
+def _arrays(hypergraph):
+    """
+    returns (cell ids, net_ptr, pins) of a Hypergraph or HypergraphView, with pins numbered by position in cell ids
+    """
+    cell_ids = np.asarray(hypergraph.cells(), dtype=np.int64)
+    if isinstance(hypergraph, HypergraphView):
+        nets = [hypergraph.net(i) for i in range(hypergraph.num_nets)]
+        net_ptr = np.zeros(len(nets) + 1, dtype=np.int64)
+        np.cumsum([len(cells) for cells in nets], out=net_ptr[1:])
+        pins = np.concatenate(nets) if len(nets) != 0 else np.zeros(0, dtype=np.int64)
+        return cell_ids, net_ptr, np.searchsorted(cell_ids, pins)
+    return cell_ids, hypergraph.net_ptr, hypergraph.pins
+
+
+def cell_order(hypergraph, method: str = RCM) -> np.ndarray:
+    """
+    returns the cells of the hypergraph in an order that keeps the cells of every net close together. The search
+    moves from a cell to the cells that share a net with it, every net is expanded once so the work is linear in
+    the number of pins. Every connected component is started from one of its cells of lowest degree, cells that
+    belong to no net come last
+
+    :param method: one of ORDERS
+    """
+    assert method in ORDERS
+    cell_ids, net_ptr, pins = _arrays(hypergraph)
+    n = len(cell_ids)
+    num_nets = len(net_ptr) - 1
+    order = np.argsort(pins, kind="stable")
+    cell_nets = np.repeat(np.arange(num_nets, dtype=np.int64), np.diff(net_ptr))[order]
+    cell_ptr = np.zeros(n + 1, dtype=np.int64)
+    degree = np.bincount(pins, minlength=n)
+    np.cumsum(degree, out=cell_ptr[1:])
+
+    net_ptr = net_ptr.tolist()
+    pins = pins.tolist()
+    cell_ptr = cell_ptr.tolist()
+    cell_nets = cell_nets.tolist()
+    visited = [False] * n
+    expanded = [False] * num_nets
+    result = []
+    for start in np.argsort(degree, kind="stable").tolist():
+        if visited[start] or degree[start] == 0:
+            continue
+        visited[start] = True
+        queue = deque([start])
+        while len(queue) != 0:
+            cell = queue.popleft()
+            result.append(cell)
+            neighbours = []
+            for net in cell_nets[cell_ptr[cell]:cell_ptr[cell + 1]]:
+                if expanded[net]:
+                    continue
+                expanded[net] = True
+                for other in pins[net_ptr[net]:net_ptr[net + 1]]:
+                    if not visited[other]:
+                        visited[other] = True
+                        neighbours.append(other)
+            if method == RCM:
+                neighbours.sort(key=lambda c: degree[c])
+            queue.extend(neighbours)
+    if method == RCM:
+        result.reverse()
+    result.extend(np.flatnonzero(degree == 0).tolist())
+    return cell_ids[np.asarray(result, dtype=np.int64)]
+
+
+def net_order(hypergraph, cells: np.ndarray) -> np.ndarray:
+    """
+    returns the nets of the hypergraph ordered by the position of their first cell in cells, nets that start at the
+    same position keep their order
+    """
+    cell_ids, net_ptr, pins = _arrays(hypergraph)
+    rank = np.empty(len(cell_ids), dtype=np.int64)
+    rank[np.searchsorted(cell_ids, cells)] = np.arange(len(cells))
+    sizes = np.diff(net_ptr)
+    first = np.full(len(sizes), len(cells), dtype=np.int64)
+    nonempty = sizes > 0
+    if nonempty.any():
+        first[nonempty] = np.minimum.reduceat(rank[pins], net_ptr[:-1][nonempty])
+    return np.argsort(first, kind="stable")
+
+
+def span(hypergraph, cells: np.ndarray) -> float:
+    """
+    the mean distance between the first and the last cell of a net when cells are stored in the order given,
+    smaller is better for locality
+    """
+    cell_ids, net_ptr, pins = _arrays(hypergraph)
+    sizes = np.diff(net_ptr)
+    nonempty = sizes > 0
+    if not nonempty.any():
+        return 0.0
+    rank = np.empty(len(cell_ids), dtype=np.int64)
+    rank[np.searchsorted(cell_ids, cells)] = np.arange(len(cells))
+    starts = net_ptr[:-1][nonempty]
+    spans = np.maximum.reduceat(rank[pins], starts) - np.minimum.reduceat(rank[pins], starts)
+    return float(spans.mean())
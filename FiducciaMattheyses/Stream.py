@@ -0,0 +1,188 @@
+from array import array
+from collections import namedtuple
+import itertools
+import numpy as np
+from . FiducciaMattheyses import FiducciaMattheyses
+from . Hypergraph import Hypergraph
+
+__author__ = 'gm'
+
+LDG = "ldg"  # linear deterministic greedy: pins already in a block, scaled by the room the block has left
+FENNEL = "fennel"  # pins already in a block minus a penalty that grows with the weight of the block
+METHODS = (LDG, FENNEL)
+GAMMA = 1.5  # exponent of the Fennel penalty
+WINDOW = 65536  # pins of the nets loaded at a time by the refinement
+PASSES = 8  # most passes of FiducciaMattheyses on one window
+
+StreamResult = namedtuple("StreamResult", ["labels", "cutset", "sizeA", "sizeB", "windows", "refined"])
+StreamResult.__doc__ = """
+the result of partition(). labels[i] is the block of cell i, windows the number of windows the nets were split
+into and refined the number of windows whose partition FiducciaMattheyses improved
+"""
+
+
+def _weights(num_cells: int, cell_weights) -> np.ndarray:
+    if cell_weights is None:
+        return np.ones(num_cells, dtype=np.int64)
+    return np.asarray(cell_weights, dtype=np.int64)
+
+
+def assign(nets, num_cells: int, r: float = FiducciaMattheyses.r, method: str = FENNEL, cell_weights=None,
+           slack: float = 0.05):
+    """
+    assign every cell to a block in one pass over the nets. Cells are assigned when the first net that has them
+    arrives, to the block that already has the heaviest pins of that net, corrected by how full the block is. A
+    block is only chosen while it stays below its target weight times 1 + slack, plus one cell. Cells that belong to
+    no net are given to the block furthest below its target at the end. The state is one byte per cell for the
+    block and four for the degree, the nets are never stored
+
+    :param nets: an iterable of (cells, weight), such as Formats.HmetisStream. Its length is needed by Fennel
+    :param method: one of METHODS
+
+    returns (labels, degree) as numpy arrays, degree[i] is the number of nets cell i belongs to
+    """
+    assert method in METHODS
+    weights = _weights(num_cells, cell_weights)
+    W = int(weights.sum())
+    smax = int(weights.max()) if num_cells != 0 else 1
+    ratios = (r, 1 - r)
+    targets = (r * W, (1 - r) * W)
+    capacity = [t * (1 + slack) + smax for t in targets]
+    alpha = len(nets) * 2 ** (GAMMA - 1) / W ** GAMMA if method == FENNEL and W != 0 else 0.0
+    labels = array("b", [-1]) * num_cells
+    degree = array("i", [0]) * num_cells
+    sizes = [0, 0]
+    cell_weight = weights.tolist()
+
+    def score(b: int, pins: int, w: int) -> float:
+        if method == LDG:
+            return pins * (1 - sizes[b] / capacity[b])
+        return pins - alpha * GAMMA * (sizes[b] / (2 * ratios[b])) ** (GAMMA - 1) * w if ratios[b] > 0 else pins
+
+    def fullness(b: int) -> float:
+        return sizes[b] / targets[b] if targets[b] > 0 else float("inf")
+
+    for cells, weight in nets:
+        pins = [0, 0]  # weight of the pins of the net in each block
+        new = []
+        for c in cells:
+            degree[c] += 1
+            label = labels[c]
+            if label < 0:
+                new.append(c)
+            else:
+                pins[label] += weight
+        for c in new:
+            w = cell_weight[c]
+            fits = [b for b in (0, 1) if sizes[b] + w <= capacity[b]]
+            if len(fits) == 0:
+                b = min((0, 1), key=fullness)
+            else:
+                b = max(fits, key=lambda b: (score(b, pins[b], w), -fullness(b)))
+            labels[c] = b
+            sizes[b] += w
+            pins[b] += weight
+
+    labels = np.frombuffer(labels, dtype=np.int8).copy()
+    for c in np.flatnonzero(labels < 0).tolist():
+        b = 0 if targets[0] - sizes[0] >= targets[1] - sizes[1] else 1
+        labels[c] = b
+        sizes[b] += cell_weight[c]
+    return labels, np.frombuffer(degree, dtype=np.int32).copy()
+
+
+def _window(batch: list, labels: np.ndarray, degree: np.ndarray, weights: np.ndarray, A: int, target: float,
+            tolerance: float, refine: bool, kwargs: dict):
+    """
+    build the hypergraph of the nets of one window, with cells numbered locally, and if refine is set improve the
+    partition of its interior cells, the cells whose nets are all in the window. Moving them changes the cut of
+    window nets only, so the change of the cutset is known exactly. FiducciaMattheyses balances the interior cells
+    around the weight that brings block A to target, and runs at most PASSES passes. The new labels are written to
+    labels if they lower the cut of the window and keep the weight of block A within tolerance of target
+
+    :param A: the weight of block A before the window
+
+    returns (cut of the window nets, weight of block A after the window, whether the partition was improved)
+    """
+    sizes = np.array([len(cells) for cells, weight in batch], dtype=np.int64)
+    net_ptr = np.zeros(len(batch) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=net_ptr[1:])
+    pins = np.fromiter((c for cells, weight in batch for c in cells), dtype=np.int64, count=int(net_ptr[-1]))
+    net_weights = np.array([weight for cells, weight in batch], dtype=np.int64)
+    cell_ids, local = np.unique(pins, return_inverse=True)
+    local_weights = weights[cell_ids]
+    hg = Hypergraph(len(cell_ids), net_ptr, local.astype(np.int64),
+                    None if np.all(local_weights == 1) else local_weights,
+                    None if np.all(net_weights == 1) else net_weights)
+    current = labels[cell_ids]
+    cut = hg.cut(current)
+    if not refine:
+        return cut, A, False
+
+    interior = np.flatnonzero(np.bincount(local, minlength=len(cell_ids)) == degree[cell_ids])
+    view = hg.induced(interior)
+    if view.num_nets == 0:
+        return cut, A, False
+    inside = int(local_weights[interior].sum())
+    outside = A - int(local_weights[interior][current[interior] == 0].sum())  # block A without the interior cells
+    fm = FiducciaMattheyses(r=min(max((target - outside) / inside, 0.0), 1.0), **kwargs)
+    fm.input_hypergraph(view)
+    fm.apply_partition(current)
+    for result in itertools.islice(fm.iter_passes(initial=False), PASSES):
+        pass
+    refined = current.copy()
+    refined[interior] = fm.labels()[interior]
+    new_cut = hg.cut(refined)
+    new_A = A + int(local_weights[(refined == 0) & (current == 1)].sum()) - \
+        int(local_weights[(refined == 1) & (current == 0)].sum())
+    if new_cut >= cut or abs(new_A - target) > tolerance:
+        return cut, A, False
+    labels[cell_ids] = refined
+    return new_cut, new_A, True
+
+
+def partition(nets, num_cells: int, r: float = FiducciaMattheyses.r, method: str = FENNEL, cell_weights=None,
+              window: int = WINDOW, refine: bool = True, **kwargs) -> StreamResult:
+    """
+    bipartition a hypergraph given as a stream of nets without building it: a greedy pass assigns the cells, see
+    assign(), then a second pass loads consecutive nets until they hold window pins and refines that window with
+    FiducciaMattheyses, see _window(). Memory is proportional to the number of cells (five bytes each) plus one
+    window, not to the number of pins. Windows improve the cut only through the cells whose nets are all in the
+    window, so streams that list the nets of a region together refine best. The balance is never made worse than
+    the greedy pass left it, or than one cell off the target
+
+    :param nets: an iterable of (cells, weight) that can be iterated twice, such as Formats.HmetisStream
+    :param window: number of pins loaded at a time by the second pass
+    :param refine: False only computes the cutset of the greedy assignment in the second pass
+    :param kwargs: passed to FiducciaMattheyses for the windows
+    """
+    assert iter(nets) is not nets, "the nets are read twice, an iterator cannot be used"
+    assert window > 0
+    weights = _weights(num_cells, cell_weights)
+    labels, degree = assign(nets, num_cells, r, method, cell_weights)
+    W = int(weights.sum())
+    A = int(weights[labels == 0].sum())
+    smax = int(weights.max()) if num_cells != 0 else 1
+    tolerance = max(abs(A - r * W), smax)
+
+    cutset = 0
+    windows = 0
+    refined = 0
+    batch = []
+    pins = 0
+    for cells, weight in nets:
+        batch.append((cells, weight))
+        pins += len(cells)
+        if pins >= window:
+            cut, A, improved = _window(batch, labels, degree, weights, A, r * W, tolerance, refine, kwargs)
+            cutset += cut
+            windows += 1
+            refined += improved
+            batch = []
+            pins = 0
+    if len(batch) != 0:
+        cut, A, improved = _window(batch, labels, degree, weights, A, r * W, tolerance, refine, kwargs)
+        cutset += cut
+        windows += 1
+        refined += improved
+    return StreamResult(labels, cutset, A, W - A, windows, refined)
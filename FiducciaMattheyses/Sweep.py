@@ -0,0 +1,78 @@
+import itertools
+import multiprocessing
+import time
+from collections import namedtuple
+from . FiducciaMattheyses import FiducciaMattheyses
+
+__author__ = 'gm'
+
+SweepResult = namedtuple("SweepResult", ["r", "seed", "cutset", "sizeA", "sizeB", "balance", "imbalance",
+                                         "passes", "seconds"])
+SweepResult.__doc__ = """
+one find_mincut() of a sweep. balance is sizeA / (sizeA + sizeB), imbalance is |sizeA - r * (sizeA + sizeB)|
+"""
+
+_worker_fm = None  # the FiducciaMattheyses instance of a worker process, built once by _init_worker
+
+
+def _run(fm: FiducciaMattheyses, r: float, seed) -> SweepResult:
+    fm.seed = seed  # set directly, reset() would keep the current seed when given None
+    fm.reset(r=r)
+    start = time.perf_counter()
+    fm.find_mincut()
+    seconds = time.perf_counter() - start
+    W = fm.blockA.size + fm.blockB.size
+    return SweepResult(r, seed, fm.cutset, fm.blockA.size, fm.blockB.size, fm.blockA.size / W if W else 0.0,
+                       abs(fm.blockA.size - r * W), fm.passes, seconds)
+
+
+def _init_worker(hypergraph, keep_isolated: bool, settings: dict):
+    global _worker_fm
+    _worker_fm = FiducciaMattheyses(**settings)
+    _worker_fm.input_hypergraph(hypergraph, keep_isolated)
+
+
+def _run_worker(task) -> SweepResult:
+    return _run(_worker_fm, *task)
+
+
+def sweep(fm: FiducciaMattheyses, ratios=None, seeds=None, processes: int = None) -> list:
+    """
+    run find_mincut() for every combination of ratio and seed on the graph fm was built from. The graph is built
+    once: in this process fm itself is reset() between runs, with processes > 1 every worker process builds its own
+    instance from fm.hypergraph once and resets it between the runs it gets. fm keeps the partition of the last run
+    when no worker processes are used.
+
+    :param fm: a FiducciaMattheyses instance input_routine(), input_hypergraph() or partition() has been called on
+    :param ratios: balance ratios to try, defaults to the ratio of fm
+    :param seeds: seeds to try, None is a valid seed (initial pass by gain), defaults to the seed of fm
+    :param processes: number of worker processes, the runs happen in this process if None or 1
+
+    returns a list of SweepResult in the order of the grid (ratios major, seeds minor)
+    """
+    assert fm.hypergraph is not None
+    if ratios is None:
+        ratios = [fm.r]
+    if seeds is None:
+        seeds = [fm.seed]
+    tasks = list(itertools.product(ratios, seeds))
+    if processes is None or processes <= 1:
+        return [_run(fm, r, seed) for r, seed in tasks]
+
+    assert fm.hypergraph is not None
+    settings = {"engine": fm.engine, "policy": fm.policy, "lookahead": fm.lookahead, "net_threshold": fm.net_threshold,
+                "boundary": fm.boundary, "reorder": fm.reorder}
+    with multiprocessing.Pool(processes, _init_worker, (fm.hypergraph, fm.keep_isolated, settings)) as pool:
+        return pool.map(_run_worker, tasks)
+
+
+def format_table(results: list) -> str:
+    """
+    a text table of cutset versus balance, one line per SweepResult
+    """
+    lines = ["%8s %8s %8s %8s %8s %8s %9s %7s" % ("r", "seed", "cutset", "sizeA", "sizeB", "balance", "imbalance",
+                                                  "passes")]
+    for res in results:
+        lines.append("%8.3f %8s %8d %8d %8d %8.3f %9.1f %7d" % (res.r, res.seed, res.cutset, res.sizeA, res.sizeB,
+                                                             res.balance, res.imbalance, res.passes))
+    return "\n".join(lines)
@@ -0,0 +1,83 @@
+import struct
+import numpy as np
+
+__author__ = 'gm'
+
+MAGIC = b"FMTRACE1"  # first bytes of a trace file, followed by the number of records and the records
+# one move: pass 0 is the initial pass, side is the block the cell left (0 for A), gain is the gain of the cell
+# when it was chosen and cutset the cutset right after the move
+RECORD = np.dtype([("pass", "<u4"), ("cell", "<i4"), ("side", "u1"), ("gain", "<i4"), ("cutset", "<i8")])
+
+
+class Trace:
+    """
+    the sequence of moves of a find_mincut() run, including the moves a pass rolls back. Give one to
+    FiducciaMattheyses(trace=...) to record it, and to FiducciaMattheyses(replay=...) to perform the exact same moves
+    again without selecting base cells. Moves are kept as python tuples while recording and as one numpy array of
+    RECORD once read
+    """
+    def __init__(self, records: np.ndarray = None):
+        self.__records = np.zeros(0, dtype=RECORD) if records is None else records
+        self.__pending = []  # moves recorded since records was last read
+
+    def record(self, n: int, cell: int, side: int, gain: int, cutset: int):
+        """
+        append a move made during pass n
+        """
+        self.__pending.append((n, cell, side, gain, cutset))
+
+    @property
+    def records(self) -> np.ndarray:
+        if len(self.__pending) != 0:
+            self.__records = np.concatenate([self.__records, np.array(self.__pending, dtype=RECORD)])
+            self.__pending = []
+        return self.__records
+
+    def __len__(self) -> int:
+        return len(self.__records) + len(self.__pending)
+
+    def clear(self):
+        self.__records = np.zeros(0, dtype=RECORD)
+        self.__pending = []
+
+    def by_pass(self) -> list:
+        """
+        returns a list with the moves of every pass as (pass, cell, side, gain, cutset) tuples, passes without moves
+        give an empty list
+        """
+        records = self.records
+        passes = [[] for i in range(int(records["pass"].max()) + 1 if len(records) != 0 else 0)]
+        for move in records.tolist():
+            passes[move[0]].append(move)
+        return passes
+
+    def save(self, path: str):
+        records = self.records
+        with open(path, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<q", len(records)))
+            f.write(records.tobytes())
+
+    @staticmethod
+    def load(path: str):
+        """
+        read a trace written by save(), raises ValueError if the file is not one or is truncated, or if a record
+        has a side other than 0 or 1
+        """
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError("%s is not a trace file" % path)
+            header = f.read(8)
+            if len(header) != 8:
+                raise ValueError("%s: truncated trace file, the number of records is missing" % path)
+            count, = struct.unpack("<q", header)
+            if count < 0:
+                raise ValueError("%s: invalid number of records %d" % (path, count))
+            records = np.fromfile(f, dtype=RECORD, count=count)
+        if len(records) != count:
+            raise ValueError("%s: truncated trace file, %d of %d records" % (path, len(records), count))
+        bad = np.flatnonzero(records["side"] > 1)
+        if len(bad) != 0:
+            raise ValueError("%s: record %d has side %d" % (path, bad[0], records["side"][bad[0]]))
+        return Trace(records)
+
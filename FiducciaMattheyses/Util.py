@@ -2,13 +2,21 @@ import copy
 
 __author__ = 'gm'
 
+FIFO = "fifo"  # take the cell that entered the max gain bucket first
+LIFO = "lifo"  # take the cell that entered the max gain bucket last
+RANDOM = "random"  # take a random cell of the max gain bucket
+POLICIES = (FIFO, LIFO, RANDOM)
+LOOKAHEAD_WINDOW = 16  # number of cells of the max gain bucket whose lookahead gains are compared
+
 
 class Cell:
     def __init__(self, n: int, block):
         assert n >= 0
         self.n = n  # the cell number
         self.pins = 0  # number of nets
-        self.nets = set()  # nets that this cell is part of
+        self.weight = 1  # the size of this cell, counts towards the size of the block it belongs to
+        self.nets = {}  # nets that this cell is part of, a dict used as an insertion ordered set
+        self.live = self.nets  # nets that moves of this cell update, nets without the pruned ones, see Net.prune()
         self.gain = 0  # the gain of this cell
         self.block = block  # the block this cell belongs to, "A" or "B"
         """:type block Block"""
@@ -40,15 +48,15 @@ class Cell:
 
     def add_net(self, net):
         if net not in self.nets:
-            self.nets.add(net)
+            self.nets[net] = None
             self.pins += 1
 
     def adjust_net_distribution(self):
         """
         call this after the cell moved to its complementary block, to adjust each net's distribution (each net that
-        contains this cell)
+        contains this cell). Pruned nets are not adjusted
         """
-        for net in self.nets:
+        for net in self.live:
             if self.block.name == "A":  # "A" after move, so the cell moved to "A"
                 net.cell_to_blockA(self)
             else:
@@ -59,7 +67,7 @@ class Cell:
         if self.locked is True:
             return
         self.locked = True
-        for net in self.nets:
+        for net in self.live:
             if self.block.name == "A":
                 net.blockA_locked += 1
                 net.blockA_free -= 1
@@ -81,19 +89,72 @@ class Cell:
                 net.blockB_locked -= 1
                 net.blockB_free += 1
 
+    def compute_gain(self):
+        """
+        compute the gain of this cell from the distribution of its nets over the blocks
+        """
+        self.gain = 0
+        for net in self.nets:
+            if net.large:
+                continue
+            if self.block.name == "A":
+                if net.blockA == 1:
+                    self.gain += net.weight
+                if net.blockB == 0:
+                    self.gain -= net.weight
+            else:
+                assert self.block.name == "B"
+                if net.blockB == 1:
+                    self.gain += net.weight
+                if net.blockA == 0:
+                    self.gain -= net.weight
+
+    def lookahead_gains(self, levels: int) -> tuple:
+        """
+        Krishnamurthy's higher level gains (gain 2, ..., gain levels) of this cell, gain 1 being the usual gain.
+        The binding number of a net on a side is the number of its free cells on that side, or infinite if it has
+        a locked cell there. A net adds its weight to gain k if its binding number on the side of this cell is k and
+        subtracts it if its binding number on the complementary side is k - 1
+        """
+        gains = [0] * (levels - 1)
+        for net in self.nets:
+            if net.large:
+                continue
+            if self.block.name == "A":
+                F_free, F_locked, T_free, T_locked = net.blockA_free, net.blockA_locked, net.blockB_free, \
+                                                     net.blockB_locked
+            else:
+                assert self.block.name == "B"
+                F_free, F_locked, T_free, T_locked = net.blockB_free, net.blockB_locked, net.blockA_free, \
+                                                     net.blockA_locked
+            if F_locked == 0 and 2 <= F_free <= levels:
+                gains[F_free - 2] += net.weight
+            if T_locked == 0 and 1 <= T_free <= levels - 1:
+                gains[T_free - 1] -= net.weight
+        return tuple(gains)
+
     def yank(self):
         """
         move this cell from its bucket to a new bucket according to its gain. If its gain has not changed then it is
-        removed and placed again to the same bucket
+        removed and placed again to the same bucket. During Block.move_cell() the yank is deferred to the end of the
+        move, so that a cell whose gain several nets change is yanked once
         """
-        self.block.bucket_array.yank_cell(self)
+        bucket_array = self.block.bucket_array
+        if bucket_array.pending is None:
+            bucket_array.yank_cell(self)
+        else:
+            # keep the order of the last yank of every cell, the order plain yanks would leave the buckets in
+            bucket_array.pending.pop(self, None)
+            bucket_array.pending[self] = None
 
 
 class Net:
     def __init__(self, n: int):
         assert n >= 0
         self.n = n  # the net number
-        self.cells = set()  # the cells that this net contains
+        self.cells = {}  # the cells that this net contains, a dict used as an insertion ordered set
+        self.weight = 1  # the cost of this net when it is cut
+        self.large = False  # large nets count towards the cutset but are left out of gain computations
         self.blockA_ref = None  # a reference to the block A object
         """:type blockA_ref Block"""
         self.blockB_ref = None  # a reference to the block B object
@@ -109,6 +170,28 @@ class Net:
         self.cut = False  # whether this net is cut. This means that it has cells both in block A and B
         self.snapshot = None  # this will hold the state of this net at the time a snapshot is taken
 
+    def prune(self):
+        """
+        leave this net out of the moves of its free cells until restore(). Call this once the net has locked cells
+        in both blocks: no move of the pass can change its cut state any more, and it adds nothing to the gain of any
+        of its free cells, so the moves do not need to visit it. Its counts are not kept up to date meanwhile, but
+        they still show a locked cell in each block, so compute_gain() and lookahead_gains() get the same nothing
+        from it. The other nets of a cell keep their order
+        """
+        for cell in self.cells:
+            if not cell.locked:
+                if cell.live is cell.nets:
+                    cell.live = dict(cell.nets)
+                del cell.live[self]
+
+    def restore(self):
+        """
+        undo prune() at the end of the pass: give the net back to its cells and recount its cells per block
+        """
+        for cell in self.cells:
+            cell.live = cell.nets
+        self.distribute()
+
     def take_snapshot(self):
         """
         take a snapshot of the current state of this net
@@ -136,7 +219,7 @@ class Net:
         add a cell to this net, increment blockA or blockB numbers depending on what block the added cell belongs to
         """
         if cell not in self.cells:
-            self.cells.add(cell)
+            self.cells[cell] = None
             if cell.block == "A":
                 self.blockA += 1
                 self.blockA_free += 1
@@ -147,13 +230,30 @@ class Net:
                 self.blockB_free += 1
                 self.blockB_cells.append(cell)
 
+    def distribute(self):
+        """
+        recount the cells of this net per block and lock state from the blocks its cells currently belong to
+        """
+        self.blockA_cells = [cell for cell in self.cells if cell.block.name == "A"]
+        self.blockB_cells = [cell for cell in self.cells if cell.block.name == "B"]
+        self.blockA = len(self.blockA_cells)
+        self.blockB = len(self.blockB_cells)
+        self.blockA_locked = sum(1 for cell in self.blockA_cells if cell.locked)
+        self.blockB_locked = sum(1 for cell in self.blockB_cells if cell.locked)
+        self.blockA_free = self.blockA - self.blockA_locked
+        self.blockB_free = self.blockB - self.blockB_locked
+        self.cut = self.blockA != 0 and self.blockB != 0
+
     def __update_cut_state(self):
         new_cutstate = self.blockA != 0 and self.blockB != 0
         if self.cut != new_cutstate:
+            fm = self.blockA_ref.fm
             if new_cutstate is True:
-                self.blockA_ref.fm.cutset += 1
+                fm.cutset += self.weight
+                fm.cut_nets[self] = None
             else:
-                self.blockA_ref.fm.cutset -= 1
+                fm.cutset -= self.weight
+                del fm.cut_nets[self]
             self.cut = new_cutstate
 
     def cell_to_blockA(self, cell):
@@ -203,11 +303,15 @@ class Net:
 
     def inc_gains_of_free_cells(self):
         """
-        increments gains of all free cells in this net that are not locked. This should be called before the move
+        increments gains of all free cells in this net that are not locked. This should be called before the move.
+        The net is about to become cut: cells that boundary refinement left out of the buckets enter them now
         """
         for cell in self.cells:
             if not cell.locked:
-                cell.gain += 1
+                if cell.bucket_num is None:
+                    cell.compute_gain()
+                    cell.block.bucket_array.add_cell(cell)
+                cell.gain += self.weight
                 cell.yank()
 
     def dec_gain_Tcell(self, to_side: str):
@@ -221,14 +325,14 @@ class Net:
             assert self.blockA_free == 1
             assert len(self.blockA_cells) == 1
             cell = self.blockA_cells[0]
-            cell.gain -= 1
+            cell.gain -= self.weight
             cell.yank()
         else:
             assert to_side == "B"
             assert self.blockB_free == 1
             assert len(self.blockB_cells) == 1
             cell = self.blockB_cells[0]
-            cell.gain -= 1
+            cell.gain -= self.weight
             cell.yank()
 
     def dec_gains_of_free_cells(self):
@@ -237,7 +341,7 @@ class Net:
         """
         for cell in self.cells:
             if not cell.locked:
-                cell.gain -= 1
+                cell.gain -= self.weight
                 cell.yank()
 
     def inc_gain_Fcell(self, from_side: str):
@@ -250,23 +354,23 @@ class Net:
         if from_side == "A":
             assert self.blockA_free == 1
             assert len(self.blockA_cells) == 1
-            cell = self.blockA_ref.cells[0]
-            cell.gain += 1
+            cell = self.blockA_cells[0]
+            cell.gain += self.weight
             cell.yank()
         else:
             assert from_side == "B"
             assert self.blockB_free == 1
             assert len(self.blockB_cells) == 1
-            cell = self.blockB_ref.cells[0]
-            cell.gain += 1
+            cell = self.blockB_cells[0]
+            cell.gain += self.weight
             cell.yank()
 
 
 class Block:
     def __init__(self, name: str, pmax: int, fm):
         self.name = name
-        self.size = 0
-        self.bucket_array = BucketArray(pmax)
+        self.size = 0  # total weight of the cells in this block
+        self.bucket_array = BucketArray(pmax, fm.policy, fm.random, fm.lookahead)
         self.cells = []  # cells that belong to this block
         """:type cells list of Cell """
         self.fm = fm  # top level object FiducciaMattheyses that contains this block
@@ -304,40 +408,70 @@ class Block:
         self.bucket_array.add_to_free_cell_list(cell)
         self.cells.append(cell)
         cell.block = self
-        self.size += 1
+        self.size += cell.weight
 
-    def remove_cell(self, cell: Cell):
+    def remove_cell(self, cell: Cell) -> int:
         """
-        remove a cell from this block's bucket list
+        remove a cell from this block's bucket list, returns the position it had in the cells of this block
         """
         assert isinstance(cell, Cell)
-        self.size -= 1
+        self.size -= cell.weight
         assert self.size >= 0
-        self.cells.remove(cell)
+        index = self.cells.index(cell)
+        del self.cells[index]
         self.bucket_array.remove_cell(cell)
+        return index
 
-    def move_cell(self, cell: Cell):
+    def move_cell(self, cell: Cell) -> int:
         """
-        move the given cell to its complementary block
+        move the given cell to its complementary block, returns the position it had in the cells of this block
         """
         assert isinstance(cell, Cell)
         comp_block = cell.block.fm.blockA if cell.block.name == "B" else cell.block.fm.blockB
+        # Collect the cells to yank instead of yanking them at every gain change
+        self.bucket_array.pending = {}
+        comp_block.bucket_array.pending = {}
         # lock cell
         cell.lock()
-        # Adjust gains and yank cells before the move
+        # Adjust gains before the move
         self.__adjust_gains_before_move(cell)
         # Remove cell from this block
-        self.remove_cell(cell)
+        index = self.remove_cell(cell)
         # Add cell to complementary block
         comp_block.add_cell(cell)
         # Adjust the distribution of this cell's nets to reflect the move
         cell.adjust_net_distribution()
-        # Adjust gains and yank cells after the move
+        # Adjust gains after the move
         self.__adjust_gains_after_move(cell)
+        # Yank every cell whose gain was changed once
+        self.bucket_array.yank_pending()
+        comp_block.bucket_array.yank_pending()
+        return index
+
+    def undo_move(self, cell: Cell, index: int):
+        """
+        undo the move of cell to this block, which must be the last move to this block that has not been undone.
+        The cell goes back to position index of the cells of the complementary block, unlocked and in no bucket.
+        Net distributions and the cutset are restored, gains are not updated
+        """
+        assert cell.block is self and cell.locked
+        assert self.cells[-1] is cell and self.bucket_array.free_cell_list[-1] is cell
+        comp_block = self.fm.blockA if self.name == "B" else self.fm.blockB
+        self.cells.pop()
+        self.bucket_array.free_cell_list.pop()
+        self.size -= cell.weight
+        comp_block.cells.insert(index, cell)
+        comp_block.size += cell.weight
+        cell.block = comp_block
+        cell.bucket_num = None
+        cell.adjust_net_distribution()
+        cell.unlock()
 
     def __adjust_gains_before_move(self, cell: Cell):
         assert isinstance(cell, Cell)
-        for net in cell.nets:
+        for net in cell.live:
+            if net.large:
+                continue
             if cell.block.name == "A":
                 LT = net.blockB_locked
                 FT = net.blockB_free
@@ -352,8 +486,15 @@ class Block:
                     net.dec_gain_Tcell("A" if cell.block.name == "B" else "B")
 
     def __adjust_gains_after_move(self, cell: Cell):
+        """
+        also prunes the nets that the move left with locked cells in both blocks, when a pass is collecting them in
+        fm.pruned_nets
+        """
         assert isinstance(cell, Cell)
-        for net in cell.nets:
+        pruned = self.fm.pruned_nets
+        for net in cell.live:
+            if net.large:
+                continue
             if cell.block.name == "A":
                 LF = net.blockB_locked
                 FF = net.blockB_free
@@ -366,6 +507,9 @@ class Block:
                     net.dec_gains_of_free_cells()
                 elif FF == 1:
                     net.inc_gain_Fcell("A" if cell.block.name == "B" else "B")
+            elif pruned is not None:  # the net had a locked cell in the block the cell left, now in both
+                net.prune()  # leaves the live nets of the cell as they are, it is locked
+                pruned.append(net)
 
     def initialize(self):
         """
@@ -375,11 +519,18 @@ class Block:
 
 
 class BucketArray:
-    def __init__(self, pmax):
+    def __init__(self, pmax, policy: str = FIFO, rng=None, lookahead: int = 1):
+        assert policy in POLICIES
+        assert lookahead >= 1
+        assert rng is not None or policy != RANDOM
         self.max_gain = -pmax
         self.pmax = pmax
+        self.policy = policy  # which cell of the max gain bucket is chosen as candidate base cell
+        self.rng = rng  # random.Random used by the RANDOM policy
+        self.lookahead = lookahead  # number of gain levels compared between the cells of the max gain bucket
         self.array = [[] for x in range(pmax * 2 + 1)]
         self.free_cell_list = []
+        self.pending = None  # cells to yank at the end of the move being made, a dict used as an insertion ordered set
         self.snapshot = None  # this will hold the state of this bucket array at the time a snapshot is taken
 
     def take_snapshot(self):
@@ -430,6 +581,16 @@ class BucketArray:
         self.remove_cell(cell)
         self.add_cell(cell)
 
+    def yank_pending(self):
+        """
+        yank the cells whose yank was deferred, in the order of their last yank, and stop deferring. Every yank
+        appends the cell to the end of its bucket and max gain always ends at the highest bucket that is not empty,
+        so the buckets end up as they would with every yank made when asked for
+        """
+        pending, self.pending = self.pending, None
+        for cell in pending:
+            self.yank_cell(cell)
+
     def decrement_max_gain(self):
         """
         decrements max gain by 1. If the bucket array in that index is empty max gain is decremented by 1 again,
@@ -452,6 +613,27 @@ class BucketArray:
         if cell.gain > self.max_gain:
             self.max_gain = cell.gain
 
+    def clear_buckets(self):
+        """
+        empty the buckets, the cells they held are left in no bucket until they are added again
+        """
+        for bucket in self.array:
+            for cell in bucket:
+                cell.bucket_num = None
+            bucket.clear()
+        self.max_gain = -self.pmax
+
+    def clear(self):
+        """
+        empty the buckets and the free cell list, unlocking the cells of the free cell list. The cells are left in
+        no bucket, until they are added again
+        """
+        self.clear_buckets()
+        for cell in self.free_cell_list:
+            cell.unlock()
+            cell.bucket_num = None
+        self.free_cell_list.clear()
+
     def add_to_free_cell_list(self, cell: Cell):
         """
         puts the cell to the free cell list of this BucketArray, keep locked cells here until reinitialization
@@ -461,13 +643,28 @@ class BucketArray:
 
     def get_candidate_base_cell(self):
         """
-        get the first cell of the list that max gain points to. If there is no such cell None is returned
+        get a cell of the list that max gain points to, chosen according to the policy. If lookahead is more than 1,
+        up to LOOKAHEAD_WINDOW cells (in policy order) are compared by their higher level gains and the best one is
+        chosen. If there is no such cell None is returned
         """
         l = self[self.max_gain]
         if len(l) == 0:
             return None
-        else:
+        if self.lookahead > 1 and len(l) > 1:
+            if self.policy == FIFO:
+                candidates = l[:LOOKAHEAD_WINDOW]
+            elif self.policy == LIFO:
+                candidates = l[:-LOOKAHEAD_WINDOW - 1:-1]
+            else:
+                candidates = self.rng.sample(l, min(LOOKAHEAD_WINDOW, len(l)))
+            # max() keeps the first of equal cells, so ties fall back to the policy
+            return max(candidates, key=lambda cell: cell.lookahead_gains(self.lookahead))
+        if self.policy == FIFO:
             return l[0]
+        elif self.policy == LIFO:
+            return l[-1]
+        else:
+            return self.rng.choice(l)
 
     def initialize(self):
         """
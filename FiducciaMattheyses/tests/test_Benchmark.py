@@ -0,0 +1,29 @@
+from .. Benchmark import random_hypergraph, run, format_results, CONFIGURATIONS
+
+__author__ = 'gm'
+
+
+def test_random_hypergraph():
+    hg = random_hypergraph(100, 150, max_net_size=4, spread=5, seed=3)
+    assert hg.num_cells == 100
+    assert hg.num_nets == 150
+    assert all(2 <= len(hg.net(i)) <= 4 for i in range(hg.num_nets))
+    assert hg.pins.tolist() == random_hypergraph(100, 150, max_net_size=4, spread=5, seed=3).pins.tolist()
+
+
+def test_run():
+    hg = random_hypergraph(200, 300, seed=1)
+    results = run(hg)
+
+    assert [r.name for r in results] == [name for name, kwargs in CONFIGURATIONS]
+    best = min(r.cutset for r in results)
+    for r in results:
+        assert r.passes >= 1
+        assert r.moves >= r.passes
+        if r.cutset == best:
+            assert 1 <= r.passes_to_target <= r.passes
+            assert r.seconds_to_target <= r.seconds
+    assert len(format_results(results).splitlines()) == len(results) + 1
+
+    results = run(hg, configurations=[("fifo", {})], target=-1)
+    assert results[0].passes_to_target is None
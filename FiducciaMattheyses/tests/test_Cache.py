@@ -0,0 +1,121 @@
+import os
+import numpy as np
+from .. Cache import PartitionCache, cache_key, hypergraph_digest
+from .. FiducciaMattheyses import FiducciaMattheyses
+from .. Benchmark import random_hypergraph
+from .. Hypergraph import Hypergraph
+
+__author__ = 'gm'
+
+
+def test_digest():
+    hg = random_hypergraph(200, 300, seed=1)
+    same = Hypergraph(hg.num_cells, hg.net_ptr.astype(np.int32), hg.pins.astype(np.int32))
+    assert hypergraph_digest(hg) == hypergraph_digest(same)
+    weighted = Hypergraph(hg.num_cells, hg.net_ptr, hg.pins, net_weights=np.full(hg.num_nets, 2))
+    assert hypergraph_digest(hg) != hypergraph_digest(weighted)
+    assert hypergraph_digest(hg) != hypergraph_digest(random_hypergraph(200, 300, seed=2))
+    assert hypergraph_digest(hg.induced(range(100))) == hypergraph_digest(hg.induced(range(100)))
+    assert hypergraph_digest(hg.induced(range(100))) != hypergraph_digest(hg.induced(range(1, 100)))
+
+    key = cache_key(hg, True, 0.5, "fifo", 1, None, None)
+    assert key == cache_key(same, True, 0.5, "fifo", 1, None, None)
+    assert key != cache_key(hg, True, 0.4, "fifo", 1, None, None)
+    assert key != cache_key(hg, True, 0.5, "fifo", 1, 0, None)
+    assert key != cache_key(hg, False, 0.5, "fifo", 1, None, None)
+    assert key != cache_key(hg, True, 0.5, "fifo", 1, None, None, boundary=True)
+
+
+def test_partition(tmp_path):
+    hg = random_hypergraph(300, 450, seed=3)
+    cache = PartitionCache(str(tmp_path))
+
+    fm = FiducciaMattheyses(cache=cache)
+    blockA, blockB = fm.partition(hg)
+    assert not fm.cache_hit
+    assert cache.misses == 1 and cache.hits == 0
+    cutset = fm.cutset
+    assert sorted(blockA) == blockA
+    assert sorted(c.n for c in fm.blockA.cells) == blockA
+
+    fm = FiducciaMattheyses(cache=cache)
+    assert fm.partition(hg) == (blockA, blockB)
+    assert fm.cache_hit
+    assert fm.cutset == cutset
+    assert len(fm.cell_array) == 0  # nothing was built
+    assert cache.hits == 1
+
+    fm = FiducciaMattheyses(cache=cache, r=0.4)
+    fm.partition(hg)
+    assert not fm.cache_hit
+
+    fm = FiducciaMattheyses(cache=cache, boundary=True)  # boundary passes may end in another partition
+    fm.partition(hg)
+    assert not fm.cache_hit
+
+
+def test_eviction(tmp_path):
+    cache = PartitionCache(str(tmp_path))
+    labels = np.zeros(1000, dtype=np.int8)
+    labels[::3] = 1
+    for i in range(3):
+        cache.put("k%d" % i, labels, i)
+        os.utime(cache.path("k%d" % i), (i, i))
+    sizes = [os.path.getsize(cache.path("k%d" % i)) for i in range(3)]
+    assert cache.size() == sum(sizes)
+
+    labels_read, cutset = cache.get("k0")  # k0 becomes the most recently used
+    assert cutset == 0
+    assert np.array_equal(labels_read, labels)
+
+    cache.max_bytes = sum(sizes) + 1  # room for three results, not four
+    cache.put("k3", labels, 3)
+    assert cache.get("k1") is None
+    assert cache.get("k0") is not None
+    assert cache.get("k2") is not None
+    assert cache.get("k3") is not None
+    assert [name for name in os.listdir(str(tmp_path)) if not name.endswith(".npz")] == []
+
+    with open(cache.path("k2"), "wb") as f:
+        f.write(b"garbage")
+    assert cache.get("k2") is None
+    assert not os.path.exists(cache.path("k2"))
+
+    cache.clear()
+    assert cache.size() == 0
+
+
+def test_engines_share_results(tmp_path):
+    from .. import Engines
+    # seed 16 is a graph whose first pass does not change the cutset
+    graphs = [random_hypergraph(80, 120, seed=seed) for seed in (16, 38, 1, 2)]
+    rng = np.random.RandomState(0)
+    graphs.append(Hypergraph(graphs[0].num_cells, graphs[0].net_ptr, graphs[0].pins,
+                             cell_weights=rng.randint(1, 4, graphs[0].num_cells),
+                             net_weights=rng.randint(1, 5, graphs[0].num_nets)))
+    for engine in Engines.available():
+        cache = PartitionCache(str(tmp_path / engine))
+        for hg in graphs:
+            cached = FiducciaMattheyses(cache=cache, engine=engine).partition(hg)
+            for other in Engines.available():
+                fm = FiducciaMattheyses(cache=cache, engine=other)
+                assert fm.partition(hg) == cached and fm.cache_hit
+                fresh = FiducciaMattheyses(engine=other)
+                assert fresh.partition(hg) == cached and fresh.cutset == fm.cutset
+
+    class Reversed(Engines.PythonEngine):
+        name = "reversed"
+        exact = False
+
+    Engines.register(Reversed())
+    try:
+        hg = graphs[0]
+        assert cache_key(hg, True, 0.5, "fifo", 1, None, None, engine="reversed") != \
+            cache_key(hg, True, 0.5, "fifo", 1, None, None)
+        cache = PartitionCache(str(tmp_path / "inexact"))
+        FiducciaMattheyses(cache=cache).partition(hg)
+        fm = FiducciaMattheyses(cache=cache, engine="reversed")
+        fm.partition(hg)
+        assert not fm.cache_hit
+    finally:
+        del Engines.ENGINES["reversed"]
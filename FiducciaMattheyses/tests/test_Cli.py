@@ -0,0 +1,107 @@
+from .. Cli import main, guess_format
+
+__author__ = 'gm'
+
+
+def test_guess_format():
+    assert guess_format("ibm01.hgr") == "hmetis"
+    assert guess_format("4elt.graph") == "metis"
+    assert guess_format("unknown.txt") == "hmetis"
+
+
+def test_main(tmp_path):
+    hgr = tmp_path / "small.hgr"
+    hgr.write_text("5 8\n"
+                   "1 2 3\n"
+                   "2 3 4\n"
+                   "5 6 7\n"
+                   "6 7 8\n"
+                   "4 5\n")
+    assert main([str(hgr)]) == 0
+
+    labels = [int(x) for x in (tmp_path / "small.hgr.part.2").read_text().split()]
+    assert len(labels) == 8
+    assert set(labels) == {0, 1}
+    assert labels.count(0) == 4
+
+    out = tmp_path / "out.part"
+    assert main([str(hgr), "-o", str(out), "-f", "hmetis", "-r", "0.25", "-t", "2"]) == 0
+    labels = [int(x) for x in out.read_text().split()]
+    assert len(labels) == 8
+
+
+def test_main_cache(tmp_path, capsys):
+    hgr = tmp_path / "small.hgr"
+    hgr.write_text("3 6\n"
+                   "1 2 3\n"
+                   "4 5 6\n"
+                   "3 4\n")
+    cache = tmp_path / "cache"
+    assert main([str(hgr), "-c", str(cache)]) == 0
+    first = (tmp_path / "small.hgr.part.2").read_text()
+    assert "from the cache" not in capsys.readouterr().out
+    assert main([str(hgr), "-c", str(cache)]) == 0
+    assert "from the cache" in capsys.readouterr().out
+    assert (tmp_path / "small.hgr.part.2").read_text() == first
+
+
+def test_main_preprocess(tmp_path, capsys):
+    hgr = tmp_path / "small.hgr"
+    hgr.write_text("4 8\n"
+                   "1 2 3\n"
+                   "1 2 3\n"
+                   "5 6\n"
+                   "6 7\n")
+    assert main([str(hgr), "-p", "--reorder", "rcm"]) == 0
+    assert "cutset: 0" in capsys.readouterr().out
+    labels = [int(x) for x in (tmp_path / "small.hgr.part.2").read_text().split()]
+    assert labels.count(0) == 4
+    assert labels[0] == labels[1] == labels[2]
+
+
+def test_main_stream(tmp_path, capsys):
+    hgr = tmp_path / "small.hgr"
+    hgr.write_text("5 8\n"
+                   "1 2 3\n"
+                   "2 3 4\n"
+                   "5 6 7\n"
+                   "6 7 8\n"
+                   "4 5\n")
+    assert main([str(hgr), "-s", "--window", "6"]) == 0
+    out = capsys.readouterr().out
+    assert "windows: 3" in out
+    labels = [int(x) for x in (tmp_path / "small.hgr.part.2").read_text().split()]
+    assert len(labels) == 8
+    assert "cutset: %d" % sum(len(set(labels[c - 1] for c in net)) > 1
+                              for net in ([1, 2, 3], [2, 3, 4], [5, 6, 7], [6, 7, 8], [4, 5])) in out
+
+    graph = tmp_path / "small.graph"
+    graph.write_text("2 1\n2\n1\n")
+    assert main([str(graph), "-s"]) == 2
+
+
+def test_main_binary(tmp_path, capsys):
+    hgr = tmp_path / "small.hgr"
+    hgr.write_text("5 8\n"
+                   "1 2 3\n"
+                   "2 3 4\n"
+                   "5 6 7\n"
+                   "6 7 8\n"
+                   "4 5\n")
+    binary = tmp_path / "small.fmhg"
+    assert main([str(hgr), "-b", str(binary)]) == 0
+    parsed = capsys.readouterr().out
+    assert main([str(binary)]) == 0
+    assert capsys.readouterr().out == parsed
+    assert (tmp_path / "small.fmhg.part.2").read_text() == (tmp_path / "small.hgr.part.2").read_text()
+
+
+def test_main_memory_limit(tmp_path, capsys):
+    hgr = tmp_path / "small.hgr"
+    hgr.write_text("2 4\n"
+                   "1 2\n"
+                   "3 4\n")
+    assert main([str(hgr), "-m", "0.001"]) == 3
+    assert "above the limit" in capsys.readouterr().err
+    assert not (tmp_path / "small.hgr.part.2").exists()
+    assert main([str(hgr), "-m", "100"]) == 0
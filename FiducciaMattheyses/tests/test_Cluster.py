@@ -0,0 +1,92 @@
+import os
+import socket
+import threading
+import numpy as np
+import pytest
+from .. Benchmark import random_hypergraph
+from .. Cluster import Coordinator, Worker, start_local_workers, send, receive, GRAPH
+from .. FiducciaMattheyses import FiducciaMattheyses
+from .. import KWay
+
+__author__ = 'gm'
+
+
+def test_coordinator():
+    hg = random_hypergraph(400, 600, seed=4)
+    workers = start_local_workers(3)
+    addresses = [address for process, address in workers]
+    try:
+        with Coordinator(hg, addresses, timeout=60) as coordinator:
+            starts = coordinator.multistart([1, 2, 3, 4, 5])
+            for start in starts:
+                fm = FiducciaMattheyses(seed=start.seed)
+                fm.input_hypergraph(hg, keep_isolated=True)
+                assert np.array_equal(start.labels, fm.find_mincut(as_labels=True))
+                assert start.cutset == fm.cutset
+            assert sum(coordinator.tasks.values()) == 5
+
+            labels = coordinator.recursive_bisection(4, seed=1)
+            assert np.array_equal(labels, KWay.recursive_bisection(hg, 4, seed=1))
+            result = coordinator.refine(labels, 4, seed=1)
+            expected = KWay.refine(hg, labels, 4, seed=1)
+            assert np.array_equal(result.labels, expected.labels)
+            assert result.connectivity == expected.connectivity
+
+            workers[0][0].terminate()  # lost while connected
+            workers[0][0].join()
+            again = coordinator.multistart([1, 2, 3, 4, 5])
+            assert [start.cutset for start in again] == [start.cutset for start in starts]
+            assert coordinator.lost == [addresses[0]]
+
+            with pytest.raises(RuntimeError):
+                coordinator.multistart([1], policy="no such policy")
+    finally:
+        for process, address in workers:
+            process.terminate()
+
+
+def test_lost_workers():
+    hg = random_hypergraph(100, 150, seed=4)
+    closed = socket.create_server(("127.0.0.1", 0))
+    address = closed.getsockname()[:2]
+    closed.close()  # nothing listens there any more
+    with Coordinator(hg, [address]) as coordinator:
+        with pytest.raises(ConnectionError):
+            coordinator.multistart([1, 2])
+        assert coordinator.lost == [address]
+
+
+def test_worker(tmp_path):
+    hg = random_hypergraph(200, 300, seed=4)
+    worker = Worker(directory=str(tmp_path))
+    threading.Thread(target=worker.serve_forever, daemon=True).start()
+    for i in range(2):
+        with Coordinator(hg, [worker.address]) as coordinator:
+            coordinator.multistart([None, 1])
+    assert len(worker.graphs) == 1  # shipped to the worker once
+    assert len(os.listdir(str(tmp_path))) == 1
+
+    with socket.create_connection(worker.address) as conn:
+        data = np.arange(100, dtype=np.uint8)
+        send(conn, {"op": GRAPH, "graph": "0" * 40}, [data])
+        header, arrays = receive(conn)
+        assert "ValueError: the hypergraph was corrupted in transit" in header["error"]
+        send(conn, {"op": "unpickle"})
+        assert "ValueError: unknown operation 'unpickle'" in receive(conn)[0]["error"]
+    assert len(worker.graphs) == 1 and len(os.listdir(str(tmp_path))) == 1
+    worker.close()
+    assert os.listdir(str(tmp_path)) == []  # the files it wrote are removed, a given directory is kept
+    with pytest.raises(OSError):
+        socket.create_connection(worker.address, timeout=1)
+
+    # a temporary directory is removed with the files, serve_forever() returns
+    with Worker() as worker:
+        thread = threading.Thread(target=worker.serve_forever, daemon=True)
+        thread.start()
+        with Coordinator(hg, [worker.address]) as coordinator:
+            coordinator.multistart([1])
+        directory = worker.directory
+        assert len(os.listdir(directory)) == 1
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert not os.path.exists(directory)
@@ -0,0 +1,98 @@
+import logging
+import numpy as np
+import pytest
+from .. import Engines
+from .. Benchmark import random_hypergraph, conformance, compare_engines
+from .. FiducciaMattheyses import FiducciaMattheyses
+from .. Hypergraph import Hypergraph
+from .. Util import LIFO
+
+__author__ = 'gm'
+
+
+def weighted(hg: Hypergraph, seed: int) -> Hypergraph:
+    rng = np.random.RandomState(seed)
+    return Hypergraph(hg.num_cells, hg.net_ptr, hg.pins, cell_weights=rng.randint(1, 4, hg.num_cells),
+                      net_weights=rng.randint(1, 5, hg.num_nets))
+
+
+@pytest.mark.parametrize("engine", Engines.available())
+def test_conformance(engine):
+    for seed in range(30):
+        num_cells = (45, 80, 160, 300)[seed % 4]
+        hg = random_hypergraph(num_cells, num_cells * 3 // 2, seed=seed)
+        conformance(hg, engine)
+        conformance(weighted(hg, seed), engine)
+        conformance(hg, engine, policy=LIFO, seed=seed, r=0.4)
+        conformance(weighted(hg, seed), engine, net_threshold=3)
+
+
+def test_registry():
+    assert Engines.PYTHON in Engines.available()
+    fm = FiducciaMattheyses()
+    assert fm.engine == Engines.PYTHON and not fm.jit
+    fm = FiducciaMattheyses(jit=True)
+    assert fm.engine == Engines.KERNEL and fm.jit
+
+    class Reversed(Engines.PythonEngine):
+        """
+        the python engine with the blocks swapped at the end, to check that a registered engine is used
+        """
+        name = "reversed"
+        exact = False
+
+        def run(self, fm):
+            super().run(fm)
+            fm.apply_partition({n: 0 if cell.block is fm.blockB else 1 for n, cell in fm.cell_array.items()})
+
+    Engines.register(Reversed())
+    try:
+        hg = random_hypergraph(200, 300, seed=4)
+        blockA, blockB = FiducciaMattheyses().partition(hg)
+        fm = conformance(hg, "reversed", r=0.5)
+        assert sorted(c.n for c in fm.blockA.cells) == sorted(blockB)
+        assert "reversed" in [r.name for r in compare_engines(hg, ["python", "reversed"])]
+    finally:
+        del Engines.ENGINES["reversed"]
+
+
+def test_compare_engines():
+    results = compare_engines(random_hypergraph(500, 750, seed=6))
+    assert len(set(r.cutset for r in results)) == 1  # all engines available here are exact
+    for r in results:
+        assert r.passes_to_target is not None and r.seconds_to_target is not None
+        assert r.passes_to_target <= r.passes
+        assert r.seconds_to_target <= r.seconds
+
+
+def test_resolve(monkeypatch, caplog):
+    hg = random_hypergraph(200, 300, seed=5)
+    fm = FiducciaMattheyses(engine=Engines.AUTO)
+    fm.input_hypergraph(hg)
+    assert Engines.resolve(fm).name == Engines.PYTHON  # small graph
+    monkeypatch.setattr(Engines, "AUTO_KERNEL_PINS", 0)
+    expected = Engines.KERNEL if Engines.ENGINES[Engines.KERNEL].available() else Engines.PYTHON
+    assert Engines.resolve(fm).name == expected
+    fm.boundary = True
+    assert Engines.resolve(fm).name == Engines.PYTHON
+
+    fm = FiducciaMattheyses(engine=Engines.KERNEL, lookahead=2)
+    fm.input_hypergraph(hg)
+    with caplog.at_level(logging.INFO, logger="FiducciaMattheyses"):
+        assert Engines.resolve(fm).name == Engines.PYTHON
+    assert "using the python engine" in caplog.text
+
+
+def test_engine_errors():
+    hg = random_hypergraph(200, 300, seed=5)
+    fm = FiducciaMattheyses(engine="nonexistent")
+    with pytest.raises(ValueError, match="unknown engine nonexistent"):
+        fm.input_hypergraph(hg)
+    if Engines.ENGINES[Engines.KERNEL].available():
+        fm = FiducciaMattheyses(engine=Engines.KERNEL)
+        fm.input_hypergraph(hg)
+        fm.apply_partition({n: n % 2 for n in fm.cell_array})
+        with pytest.raises(ValueError, match="all cells in block A"):
+            fm.find_mincut()
+        fm.reset()
+        assert fm.find_mincut() == FiducciaMattheyses(engine=Engines.KERNEL).partition(hg)
@@ -0,0 +1,65 @@
+import numpy as np
+from .. Benchmark import random_hypergraph
+from .. Evaluate import evaluate
+from .. FiducciaMattheyses import FiducciaMattheyses
+from .. Hypergraph import HypergraphBuilder
+
+__author__ = 'gm'
+
+
+def test_evaluate():
+    builder = HypergraphBuilder(num_cells=5)
+    builder.add_net([0, 1, 2])
+    builder.add_net([2, 3], weight=2)
+    builder.add_net([3, 4])
+    builder.set_cell_weights([1, 1, 2, 1, 1])
+    hg = builder.build()
+
+    score = evaluate(hg, [0, 0, 0, 1, 1])
+    assert score.cut_nets == 1
+    assert score.cut == 2
+    assert score.connectivity == 2
+    assert score.block_weights.tolist() == [4, 2]
+    assert abs(score.imbalance - 1 / 3) < 1e-9
+    assert evaluate(hg, [0, 0, 0, 1, 1], r=2 / 3).imbalance == 0.0
+
+    three = evaluate(hg, [0, 1, 2, 2, 1])
+    assert three.cut_nets == 2
+    assert three.cut == 2
+    assert three.connectivity == 3  # net 0 spans three blocks
+    assert three.block_weights.tolist() == [1, 2, 3]
+
+    unlabelled = evaluate(hg, [0, 0, 1, -1, -1])  # only net 0 has pins in two blocks
+    assert unlabelled.cut == 1
+    assert unlabelled.block_weights.tolist() == [2, 2]
+
+    view = hg.induced([2, 3, 4])
+    assert evaluate(view, [-1, -1, 0, 1, 1]).cut == 2
+
+
+def test_evaluate_batch():
+    hg = random_hypergraph(300, 450, seed=4)
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 2, size=(6, hg.num_cells)).astype(np.int8)
+    batch = evaluate(hg, labels)
+    assert batch.cut.shape == (6,)
+    for i in range(6):
+        single = evaluate(hg, labels[i])
+        assert batch.cut[i] == single.cut == single.connectivity == hg.cut(labels[i])
+        assert batch.cut_nets[i] == single.cut_nets
+        assert batch.imbalance[i] == single.imbalance
+        assert batch.block_weights[i].tolist() == single.block_weights.tolist()
+
+
+def test_find_mincut_labels():
+    hg = random_hypergraph(200, 300, seed=5)
+    fm = FiducciaMattheyses()
+    fm.input_hypergraph(hg)
+    labels = fm.find_mincut(as_labels=True)
+    assert labels.dtype == np.int8
+    assert sorted(np.flatnonzero(labels == 0).tolist()) == sorted(c.n for c in fm.blockA.cells)
+    score = evaluate(hg, labels)
+    assert score.cut == fm.cutset
+    assert score.block_weights.tolist() == [fm.blockA.size, fm.blockB.size]
+
+    assert FiducciaMattheyses().partition(hg, as_labels=True).tolist() == labels.tolist()
@@ -1,7 +1,10 @@
 import numpy as np
 from ..FiducciaMattheyses import FiducciaMattheyses
+from ..Hypergraph import HypergraphBuilder
 from ..Util import *
+import itertools
 import random
+import pytest
 
 __author__ = 'gm'
 
@@ -365,3 +368,501 @@ def test_selection_on_input_routine():
     assert 8 in blockB_cell_nums
 
     assert True  # this is here for PyCharm to recognize this as a test
+
+
+def assert_gains(fm: FiducciaMattheyses):
+    for cell in fm.cell_array.values():
+        if cell.locked or cell.bucket_num is None:  # locked, or left out of the buckets by a boundary pass
+            continue
+        gain = 0
+        for net in cell.nets:
+            if net.large:
+                continue
+            F = net.blockA if cell.block.name == "A" else net.blockB
+            T = net.blockB if cell.block.name == "A" else net.blockA
+            if F == 1:
+                gain += net.weight
+            if T == 0:
+                gain -= net.weight
+        assert cell.gain == gain
+
+
+def test_gains_during_pass():
+    random.seed(5)
+    size = 200
+
+    PM = np.zeros((size, size), dtype="b1", order='C')
+    for i in range(size - 1):
+        for k in range(3):
+            PM[i, random.randint(i + 1, size - 1)] = 1
+
+    fm = FiducciaMattheyses()
+    fm.input_routine(PM)
+    fm.initial_pass()
+    fm.compute_initial_gains()
+    fm.blockA.initialize()
+    fm.blockB.initialize()
+    bcell = fm.get_base_cell()
+    while bcell is not None:
+        bcell.block.move_cell(bcell)
+        assert_gains(fm)
+        bcell = fm.get_base_cell()
+
+
+def test_input_hypergraph():
+    builder = HypergraphBuilder(num_cells=7)
+    builder.add_net([0, 1, 2], weight=3)
+    builder.add_net([1, 2])
+    builder.add_net([3, 4, 5], weight=3)
+    builder.add_net([2, 3])
+    builder.set_cell_weights([1, 1, 1, 1, 1, 2, 1])
+
+    fm = FiducciaMattheyses()
+    fm.input_hypergraph(builder.build())
+
+    assert len(fm.cell_array) == 7  # cell 6 belongs to no net but is kept
+    assert len(fm.net_array) == 4
+    assert fm.cell_array[6].pins == 0
+    assert fm.cell_array[5].weight == 2
+    assert fm.net_array[0].weight == 3
+    assert fm.pmax == 5  # cell 2: 3 + 1 + 1
+    assert fm.smax == 2
+    assert fm.blockA.size == 8
+    assert fm.cell_array[0].gain == -3
+    assert fm.cell_array[6].gain == 0
+
+    blockA, blockB = fm.find_mincut()
+    assert_block(fm.blockA, fm)
+    assert_block(fm.blockB, fm)
+    assert sorted(blockA + blockB) == list(range(7))
+    assert fm.is_partition_balanced()
+    assert fm.cutset == sum(net.weight for net in fm.net_array.values() if net.cut)
+    assert fm.cutset == 1
+
+
+def test_policies():
+    builder = HypergraphBuilder(num_cells=300)
+    rnd = random.Random(2)
+    for i in range(450):
+        builder.add_net(rnd.sample(range(300), rnd.randint(2, 4)))
+    hg = builder.build()
+
+    for kwargs in ({"policy": "lifo"}, {"policy": "random", "seed": 4}, {"lookahead": 3},
+                   {"policy": "lifo", "lookahead": 2}):
+        fm = FiducciaMattheyses(**kwargs)
+        fm.input_hypergraph(hg)
+        blockA, blockB = fm.find_mincut()
+        assert_block(fm.blockA, fm)
+        assert_block(fm.blockB, fm)
+        assert sorted(blockA + blockB) == list(range(300))
+        assert fm.passes == len(fm.history)
+        assert fm.history[-1][0] == fm.cutset
+
+    results = []
+    for i in range(2):
+        fm = FiducciaMattheyses(policy="random", seed=11)
+        fm.input_hypergraph(hg)
+        results.append(fm.find_mincut())
+    assert results[0] == results[1]
+
+
+def test_induced():
+    PM = [[1, 1, 0, 0, 1, 0, 0, 0],
+          [1, 1, 0, 0, 0, 1, 0, 0],
+          [0, 0, 1, 1, 0, 0, 1, 0],
+          [0, 0, 1, 1, 0, 0, 0, 1],
+          [1, 0, 0, 0, 1, 1, 0, 0],
+          [0, 1, 0, 0, 1, 1, 1, 0],
+          [0, 0, 1, 0, 0, 1, 1, 1],
+          [0, 0, 0, 1, 0, 0, 1, 1]]
+
+    PM = np.array(PM, dtype="b1", order='C')
+    selection = [1, 2, 4, 5, 6, 7]
+
+    fm = FiducciaMattheyses()
+    fm.input_routine(PM)
+    sub = fm.induced(selection)
+
+    expected = FiducciaMattheyses()
+    expected.input_routine(PM, selection=selection)
+
+    assert sub.hypergraph.parent is fm.hypergraph
+    assert sub.cell_array.keys() == expected.cell_array.keys()
+    assert sorted(sorted(c.n for c in net.cells) for net in sub.net_array.values()) == \
+        sorted(sorted(c.n for c in net.cells) for net in expected.net_array.values())
+    assert sub.pmax == expected.pmax
+
+    blockA, blockB = sub.find_mincut()
+    assert_block(sub.blockA, sub)
+    assert_block(sub.blockB, sub)
+    assert {2, 5, 6} == set(x + 1 for x in blockA)
+    assert {3, 7, 8} == set(x + 1 for x in blockB)
+
+    # the parent is untouched
+    assert fm.blockB.size == 0
+    assert len(fm.cell_array) == 8
+
+
+def test_net_threshold():
+    builder = HypergraphBuilder(num_cells=60)
+    rnd = random.Random(8)
+    for i in range(90):
+        builder.add_net(rnd.sample(range(60), rnd.randint(2, 3)))
+    builder.add_net(range(40))  # a large net
+    builder.add_net(range(20, 60), weight=2)  # another one
+    hg = builder.build()
+
+    fm = FiducciaMattheyses(net_threshold=10)
+    fm.input_hypergraph(hg)
+    assert fm.large_nets == 2
+    assert fm.net_array[90].large and fm.net_array[91].large
+    assert not any(net.large for net in list(fm.net_array.values())[:90])
+    assert fm.pmax == max(sum(net.weight for net in cell.nets if not net.large) for cell in fm.cell_array.values())
+    assert fm.pmax < max(sum(net.weight for net in cell.nets) for cell in fm.cell_array.values())
+    assert_gains(fm)
+
+    fm.initial_pass()
+    fm.compute_initial_gains()
+    fm.blockA.initialize()
+    fm.blockB.initialize()
+    bcell = fm.get_base_cell()
+    while bcell is not None:
+        bcell.block.move_cell(bcell)
+        assert_gains(fm)
+        assert fm.cutset == sum(net.weight for net in fm.net_array.values() if net.cut)
+        bcell = fm.get_base_cell()
+
+    fm.reset()
+    fm.find_mincut()
+    assert_block(fm.blockA, fm)
+    assert_block(fm.blockB, fm)
+    assert fm.large_cut == sum(net.weight for net in fm.net_array.values() if net.large and net.cut)
+    assert fm.large_cut <= fm.cutset
+
+
+def test_find_mincut_async():
+    import asyncio
+    from ..Benchmark import random_hypergraph
+    hg = random_hypergraph(400, 600, seed=4)
+
+    fm = FiducciaMattheyses()
+    fm.input_hypergraph(hg)
+    expected = fm.find_mincut()
+
+    async def jobs():
+        fms = [FiducciaMattheyses() for i in range(8)]
+        for fm in fms:
+            fm.input_hypergraph(hg)
+        return fms, await asyncio.gather(*(fm.find_mincut_async() for fm in fms))
+
+    fms, results = asyncio.run(jobs())
+    for fm, result in zip(fms, results):
+        assert result == expected
+        assert not fm.stopped
+        assert fm.passes == len(fm.history)
+
+    # a timeout of zero stops right after the initial pass, with a balanced partition
+    fm = FiducciaMattheyses()
+    fm.input_hypergraph(hg)
+    asyncio.run(fm.find_mincut_async(timeout=0))
+    assert fm.stopped
+    assert fm.passes == 0
+    assert fm.is_partition_balanced()
+    assert_block(fm.blockA, fm)
+    assert_block(fm.blockB, fm)
+
+
+def test_find_mincut_async_cancel():
+    import asyncio
+    import threading
+    from ..Benchmark import random_hypergraph
+    hg = random_hypergraph(400, 600, seed=5)
+    fm = FiducciaMattheyses()
+    fm.input_hypergraph(hg)
+    first_pass = threading.Event()
+    perform_pass = fm.perform_pass
+
+    def slow_pass():
+        perform_pass()
+        first_pass.set()
+
+    fm.perform_pass = slow_pass
+
+    async def job():
+        task = asyncio.ensure_future(fm.find_mincut_async())
+        while not first_pass.is_set():
+            await asyncio.sleep(0.001)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    assert asyncio.run(job())
+    assert fm.passes >= 1
+    assert fm.cutset == min(cutset for cutset, seconds in fm.history)
+    assert fm.cutset == sum(net.weight for net in fm.net_array.values() if net.cut)
+    assert_block(fm.blockA, fm)
+    assert_block(fm.blockB, fm)
+    assert_gains(fm)
+
+
+def test_iter_passes():
+    from ..Benchmark import random_hypergraph
+    hg = random_hypergraph(400, 600, seed=6)
+    fm = FiducciaMattheyses()
+    fm.input_hypergraph(hg)
+    blockA, blockB = fm.find_mincut()
+    cutsets = [cutset for cutset, seconds in fm.history]
+    assert len(cutsets) >= 2
+
+    fm = FiducciaMattheyses()
+    fm.input_hypergraph(hg)
+    results = []
+    for result in fm.iter_passes():
+        assert result.cutset == fm.cutset
+        assert result.sizeA == fm.blockA.size and result.sizeB == fm.blockB.size
+        assert result.assignment.labels() == {c.n: 0 for c in fm.blockA.cells} | {c.n: 1 for c in fm.blockB.cells}
+        results.append(result)
+    assert [r.cutset for r in results] == cutsets
+    assert [r.n for r in results] == list(range(1, len(cutsets) + 1))
+    assert all(r.assignment is results[0].assignment for r in results)  # one view, never copied
+    view = results[-1].assignment
+    assert view.block(0) == blockA and view.block(1) == blockB
+    assert len(view) == len(fm.cell_array)
+    assert all(view[n] == (1 if n in blockB else 0) for n in view)
+
+    # stop after the first pass
+    fm = FiducciaMattheyses()
+    fm.input_hypergraph(hg)
+    first = next(fm.iter_passes())
+    assert first.cutset == cutsets[0]
+    assert fm.passes == 1
+    assert fm.cutset == sum(net.weight for net in fm.net_array.values() if net.cut)
+    assert_block(fm.blockA, fm)
+    assert_block(fm.blockB, fm)
+
+
+def test_first_pass_unchanged():
+    # the first pass of this graph keeps the cutset of the initial pass, the passes after it still improve it
+    import asyncio
+    from .. import Engines
+    from ..Benchmark import random_hypergraph
+    hg = random_hypergraph(80, 120, seed=16)
+    fm = FiducciaMattheyses()
+    fm.input_hypergraph(hg)
+    fm.initial_pass()
+    initial = fm.cutset
+    fm = FiducciaMattheyses()
+    fm.input_hypergraph(hg)
+    blockA, blockB = fm.find_mincut()
+    assert fm.history[0][0] == initial
+    assert fm.passes == 5 and fm.cutset == 39 < initial
+
+    other = FiducciaMattheyses()
+    other.input_hypergraph(hg)
+    assert asyncio.run(other.find_mincut_async()) == (blockA, blockB)
+    assert other.passes == fm.passes
+    if Engines.KERNEL in Engines.available():
+        kernel = FiducciaMattheyses(engine=Engines.KERNEL)
+        kernel.input_hypergraph(hg)
+        assert [sorted(block) for block in kernel.find_mincut()] == [sorted(blockA), sorted(blockB)]
+        assert kernel.passes == fm.passes and kernel.cutset == fm.cutset
+
+
+def test_boundary():
+    from ..Benchmark import random_hypergraph
+    hg = random_hypergraph(500, 700, seed=11)
+    fm = FiducciaMattheyses(boundary=True)
+    fm.input_hypergraph(hg)
+    fm.initial_pass()
+    cutset = fm.cutset
+    assert set(fm.cut_nets) == set(net for net in fm.net_array.values() if net.cut)
+
+    # a boundary pass starts with the cells of cut nets in the buckets and no other
+    fm.perform_pass()
+    assert fm.cutset <= cutset
+    assert fm.cutset == sum(net.weight for net in fm.net_array.values() if net.cut)
+    assert set(fm.cut_nets) == set(net for net in fm.net_array.values() if net.cut)
+    fm.blockA.bucket_array.clear()
+    fm.blockB.bucket_array.clear()
+    fm._FiducciaMattheyses__fill_boundary()
+    bucketed = set(c for c in fm.cell_array.values() if c.bucket_num is not None)
+    assert bucketed == set(c for net in fm.cut_nets for c in net.cells)
+    assert len(bucketed) < len(fm.cell_array)
+    assert_gains(fm)
+
+    # gains stay exact while cells join the buckets during the pass
+    bcell = fm.get_base_cell()
+    while bcell is not None:
+        bcell.block.move_cell(bcell)
+        assert_gains(fm)
+        bcell = fm.get_base_cell()
+
+    fm = FiducciaMattheyses(boundary=True)
+    fm.input_hypergraph(hg)
+    fm.find_mincut()
+    assert_block(fm.blockA, fm)
+    assert_block(fm.blockB, fm)
+    assert abs(fm.blockA.size - fm.r * len(fm.cell_array)) <= fm.pmax  # the balance criterion of moves
+
+
+def test_refine():
+    from ..Benchmark import random_hypergraph
+    hg = random_hypergraph(500, 700, seed=12)
+    fm = FiducciaMattheyses()
+    fm.input_hypergraph(hg)
+    fm.find_mincut()
+    labels = {c.n: 0 for c in fm.blockA.cells}
+    labels.update({c.n: 1 for c in fm.blockB.cells})
+    # disturb the partition by swapping a few cells
+    for a, b in zip([c.n for c in fm.blockA.cells][:10], [c.n for c in fm.blockB.cells][:10]):
+        labels[a], labels[b] = 1, 0
+
+    for boundary in (False, True):
+        refined = FiducciaMattheyses(boundary=boundary)
+        refined.input_hypergraph(hg)
+        refined.apply_partition(labels)
+        disturbed = refined.cutset
+        refined.refine()
+        assert refined.cutset < disturbed
+        assert refined.cutset == sum(net.weight for net in refined.net_array.values() if net.cut)
+        assert abs(refined.blockA.size - refined.r * len(refined.cell_array)) <= refined.pmax
+        assert_block(refined.blockA, refined)
+        assert_block(refined.blockB, refined)
+
+
+def test_refine_terminates():
+    # every prefix of the first pass cuts the net, keeping one of them used to alternate with the next pass forever
+    builder = HypergraphBuilder(num_cells=5)
+    builder.add_net([1, 3, 4, 2])
+    fm = FiducciaMattheyses(r=0.3)
+    fm.input_hypergraph(builder.build())
+    fm.apply_partition([1, 1, 0, 1, 0])
+    start = fm.cutset
+    cutsets = [result.cutset for result in itertools.islice(fm.iter_passes(initial=False), 10)]
+    assert len(cutsets) < 10
+    assert all(cutset <= start for cutset in cutsets)
+    assert cutsets == sorted(cutsets, reverse=True)
+
+
+def test_gains_carried_across_passes():
+    from ..Benchmark import random_hypergraph
+    hg = random_hypergraph(400, 600, seed=13)
+    fm = FiducciaMattheyses()
+    fm.input_hypergraph(hg)
+    fm.initial_pass()
+    prev_cutset = None
+    while fm.cutset != prev_cutset:
+        # after a pass, rolled back or not, every cell has the gain computed from scratch, locked ones included
+        for cell in fm.cell_array.values():
+            gain = cell.gain
+            cell.compute_gain()
+            assert cell.gain == gain
+        assert all(cell.bucket_num is not None for cell in fm.cell_array.values() if not cell.locked)
+        assert fm.cutset == sum(net.weight for net in fm.net_array.values() if net.cut)
+        assert set(fm.cut_nets) == set(net for net in fm.net_array.values() if net.cut)
+        assert_block(fm.blockA, fm)
+        assert_block(fm.blockB, fm)
+        assert fm.blockA.size == sum(c.weight for c in fm.blockA.cells)
+        prev_cutset = fm.cutset
+        fm.perform_pass()
+
+
+def test_pruned_nets(monkeypatch):
+    from ..Benchmark import random_hypergraph
+    hg = random_hypergraph(300, 450, seed=3)
+    fm = FiducciaMattheyses()
+    fm.input_hypergraph(hg)
+    move_cell = Block.move_cell
+    pruned = []
+
+    def checked_move(block, cell):
+        index = move_cell(block, cell)
+        assert_gains(fm)  # the stale counts of pruned nets give the same gains
+        for net in fm.pruned_nets:
+            assert any(c.locked for c in net.cells if c.block is fm.blockA)
+            assert any(c.locked for c in net.cells if c.block is fm.blockB)
+            assert all(net not in c.live for c in net.cells if not c.locked)
+        pruned.append(len(fm.pruned_nets))
+        return index
+
+    monkeypatch.setattr(Block, "move_cell", checked_move)
+    fm.find_mincut()
+    assert max(pruned) > 0
+    assert fm.pruned_nets is None
+    assert all(cell.live is cell.nets for cell in fm.cell_array.values())
+    for net in fm.net_array.values():
+        counts = net.blockA, net.blockB, net.blockA_locked, net.blockB_locked
+        net.distribute()
+        assert (net.blockA, net.blockB, net.blockA_locked, net.blockB_locked) == counts
+
+
+def test_evaluate_moves():
+    from ..Benchmark import random_hypergraph
+    from ..Hypergraph import Hypergraph
+    base = random_hypergraph(200, 300, seed=5)
+    rng = np.random.RandomState(5)
+    hg = Hypergraph(base.num_cells, base.net_ptr, base.pins, cell_weights=rng.randint(1, 4, base.num_cells),
+                    net_weights=rng.randint(1, 5, base.num_nets))
+    fm = FiducciaMattheyses(net_threshold=6)
+    fm.input_hypergraph(hg)
+    fm.find_mincut()
+    labels = fm.labels()
+    cutset = fm.cutset
+    proposals = [rng.choice(hg.num_cells, size, replace=False).tolist() for size in (0, 1, 5, 50, 50)]
+    proposals.append([3, 3, 7])  # a cell listed twice moves once
+    batch = fm.evaluate_batch(proposals)
+    for i, cells in enumerate(proposals):
+        delta = fm.evaluate_moves(cells)
+        assert (fm.labels() == labels).all() and fm.cutset == cutset
+        assert delta == tuple(field[i] for field in batch)
+        moved = labels.copy()
+        moved[cells] = 1 - moved[cells]
+        other = FiducciaMattheyses(net_threshold=6)
+        other.input_hypergraph(hg)
+        other.apply_partition(moved)
+        assert delta.cut == other.cutset - cutset
+        assert (delta.sizeA, delta.sizeB) == (other.blockA.size, other.blockB.size)
+        assert delta.balanced == other.is_partition_balanced()
+    assert fm.evaluate_moves([]) == (0, fm.blockA.size, fm.blockB.size, True)
+    assert len(fm.evaluate_batch([]).cut) == 0
+    for cells in ([-1], [hg.num_cells], [2, hg.num_cells + 5]):
+        with pytest.raises(ValueError, match="not part of the partition"):
+            fm.evaluate_moves(cells)
+        with pytest.raises(ValueError, match="not part of the partition"):
+            fm.evaluate_batch([[0], cells])
+    induced = fm.induced(range(50, 150))
+    with pytest.raises(ValueError, match="cell 10 "):
+        induced.evaluate_batch([[60, 10]])
+    with pytest.raises(ValueError, match="cell 10 "):
+        induced.evaluate_moves([60, 10])
+
+
+def test_balance_tolerance():
+    # pmax, the gain range, is far above smax here: both checks must use the weight of the heaviest cell
+    from ..Benchmark import random_hypergraph
+    from ..Hypergraph import Hypergraph
+    base = random_hypergraph(120, 180, seed=2)
+    rng = np.random.RandomState(2)
+    hg = Hypergraph(base.num_cells, base.net_ptr, base.pins, cell_weights=rng.randint(1, 4, base.num_cells),
+                    net_weights=rng.randint(1, 5, base.num_nets))
+    fm = FiducciaMattheyses()
+    fm.input_hypergraph(hg)
+    assert fm.pmax > fm.smax == 3
+    checked = set()
+    labels = np.zeros(hg.num_cells, dtype=np.int8)
+    for n in rng.permutation(hg.num_cells).tolist():
+        labels[n] = 1
+        fm.apply_partition(labels)
+        for cell in fm.cell_array.values():
+            balanced = fm.evaluate_moves([cell.n]).balanced
+            assert (fm.get_balance_factor(cell) is not None) == balanced
+            checked.add(balanced)
+        if fm.blockB.size > fm.blockA.size + 2 * fm.pmax:
+            break
+    assert checked == {True, False}
+    fm.reset()
+    fm.find_mincut()
+    assert fm.is_partition_balanced()
@@ -0,0 +1,130 @@
+import io
+import pickle
+import numpy as np
+import pytest
+from .. Formats import read_hmetis, read_metis, write_partition, HmetisStream, read_binary, write_binary
+
+__author__ = 'gm'
+
+
+def test_read_hmetis():
+    hgr = io.StringIO("% a comment\n"
+                      "4 7\n"
+                      "1 2\n"
+                      "1 7 5 6\n"
+                      "5 6 4\n"
+                      "2 3 4\n")
+    hg = read_hmetis(hgr)
+    assert hg.num_cells == 7
+    assert hg.num_nets == 4
+    assert hg.net(1).tolist() == [0, 6, 4, 5]
+    assert hg.net_weights is None
+    assert hg.cell_weights is None
+
+
+def test_read_hmetis_weights():
+    hgr = io.StringIO("2 3 11\n"
+                      "5 1 2\n"
+                      "1 2 3\n"
+                      "4\n"
+                      "1\n"
+                      "2\n")
+    hg = read_hmetis(hgr, chunk_size=1)
+    assert hg.net_weights.tolist() == [5, 1]
+    assert hg.cell_weights.tolist() == [4, 1, 2]
+    assert hg.net(1).tolist() == [1, 2]
+
+    with pytest.raises(ValueError):
+        read_hmetis(io.StringIO("2 3\n1 2\n"))
+    with pytest.raises(ValueError):
+        read_hmetis(io.StringIO("1 3\n1 4\n"))
+
+
+def test_read_metis():
+    graph = io.StringIO("% a comment\n"
+                        "4 2 11\n"
+                        "2 2 5 3 1\n"
+                        "1 1 5\n"
+                        "3 1 1\n"
+                        "1\n")
+    hg = read_metis(graph)
+    assert hg.num_cells == 4
+    assert hg.num_nets == 2
+    assert hg.net(0).tolist() == [0, 1]
+    assert hg.net(1).tolist() == [0, 2]
+    assert hg.net_weights.tolist() == [5, 1]
+    assert hg.cell_weights.tolist() == [2, 1, 3, 1]
+
+    with pytest.raises(ValueError):  # the header declares a wrong number of edges
+        read_metis(io.StringIO("4 3 11\n2 2 5 3 1\n1 1 5\n3 1 1\n1\n"))
+
+
+def test_write_partition():
+    out = io.StringIO()
+    write_partition(out, [0, 1, 1, 0])
+    assert out.getvalue() == "0\n1\n1\n0\n"
+
+
+def test_hmetis_stream(tmp_path):
+    path = tmp_path / "weighted.hgr"
+    path.write_text("% nets, then cell weights\n"
+                    "3 4 11\n"
+                    "5 1 2\n"
+                    "1 2 3 3\n"
+                    "2 4 1\n"
+                    "4\n"
+                    "1\n"
+                    "2\n"
+                    "3\n")
+    nets = HmetisStream(str(path))
+    assert len(nets) == 3
+    assert nets.num_cells == 4
+    assert nets.cell_weights.tolist() == [4, 1, 2, 3]
+    assert list(nets) == [([0, 1], 5), ([1, 2], 1), ([3, 0], 2)]
+    assert list(nets) == list(nets)  # the file is read again every time
+
+    hg = read_hmetis(str(path))
+    assert [(cells.tolist(), weight) for n, cells, weight in hg.nets()] == list(nets)
+
+
+def test_binary(tmp_path):
+    hg = read_hmetis(io.StringIO("2 3 11\n"
+                                 "5 1 2\n"
+                                 "1 2 3\n"
+                                 "4\n"
+                                 "1\n"
+                                 "2\n"))
+    path = str(tmp_path / "small.fmhg")
+    write_binary(path, hg)
+    for mmap in (True, False):
+        loaded = read_binary(path, mmap=mmap, verify=True)
+        assert isinstance(loaded.pins, np.memmap) == mmap
+        assert loaded.num_cells == 3
+        assert loaded.net_ptr.tolist() == hg.net_ptr.tolist()
+        assert loaded.pins.tolist() == hg.pins.tolist()
+        assert loaded.cell_weights.tolist() == [4, 1, 2]
+        assert loaded.net_weights.tolist() == [5, 1]
+
+    mapped = read_binary(path)
+    assert mapped.path == path
+    copied = pickle.loads(pickle.dumps(mapped))  # pickled as the path, the copy maps the file again
+    assert isinstance(copied.pins, np.memmap) and copied.pins.tolist() == hg.pins.tolist()
+    assert len(pickle.dumps(mapped)) < len(pickle.dumps(hg))
+
+    unweighted = str(tmp_path / "unweighted.fmhg")
+    write_binary(unweighted, read_hmetis(io.StringIO("1 2\n1 2\n")))
+    assert read_binary(unweighted).cell_weights is None and read_binary(unweighted).net_weights is None
+
+    data = bytearray(open(path, "rb").read())
+    data[-8] ^= 1  # flip the lowest bit of the last net weight
+    corrupted = tmp_path / "corrupted.fmhg"
+    corrupted.write_bytes(bytes(data))
+    assert read_binary(str(corrupted)).net_weights[-1] == 0
+    with pytest.raises(ValueError):
+        read_binary(str(corrupted), verify=True)
+    truncated = tmp_path / "truncated.fmhg"
+    truncated.write_bytes(bytes(data[:-8]))
+    with pytest.raises(ValueError):
+        read_binary(str(truncated))
+    with pytest.raises(ValueError):
+        read_binary(__file__)
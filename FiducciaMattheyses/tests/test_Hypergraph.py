@@ -0,0 +1,97 @@
+import numpy as np
+from .. Hypergraph import Hypergraph, HypergraphView, HypergraphBuilder
+
+__author__ = 'gm'
+
+
+def test_builder():
+    builder = HypergraphBuilder(chunk_size=2)
+    builder.add_net([0, 1, 2])
+    builder.add_net([2, 3])
+    builder.add_net([3, 3, 4], weight=2)  # duplicate cells are ignored
+    builder.add_net([1, 4])
+    hg = builder.build()
+
+    assert isinstance(hg, Hypergraph)
+    assert hg.num_cells == 5
+    assert hg.num_nets == 4
+    assert hg.num_pins == 9
+    assert hg.net_ptr.tolist() == [0, 3, 5, 7, 9]
+    assert hg.net(0).tolist() == [0, 1, 2]
+    assert hg.net(2).tolist() == [3, 4]
+    assert hg.net_weights.tolist() == [1, 1, 2, 1]
+    assert hg.cell_weights is None
+    assert [w for n, cells, w in hg.nets()] == [1, 1, 2, 1]
+
+
+def test_builder_weights():
+    builder = HypergraphBuilder(num_cells=4)
+    builder.add_net([0, 1])
+    builder.set_cell_weights([3, 1])
+    hg = builder.build()
+
+    assert hg.num_cells == 4
+    assert hg.net_weights is None
+    assert hg.net_weight(0) == 1
+    assert hg.cell_weights.tolist() == [3, 1, 1, 1]
+    assert hg.cell_weight(0) == 3
+
+    empty = HypergraphBuilder(num_cells=3).build()
+    assert empty.num_nets == 0
+    assert empty.num_pins == 0
+    assert isinstance(empty.pins, np.ndarray)
+
+
+def test_incidence():
+    builder = HypergraphBuilder(num_cells=5)
+    builder.add_net([0, 1, 2])
+    builder.add_net([2, 3])
+    builder.add_net([3, 0])
+    hg = builder.build()
+
+    cell_ptr, cell_nets = hg.incidence()
+    assert cell_ptr.tolist() == [0, 2, 3, 5, 7, 7]
+    assert cell_nets.tolist() == [0, 2, 0, 0, 1, 1, 2]
+    assert hg.incidence()[0] is cell_ptr  # computed once
+
+
+def test_induced():
+    builder = HypergraphBuilder(num_cells=6)
+    builder.add_net([0, 1, 2], weight=2)
+    builder.add_net([2, 3])
+    builder.add_net([3, 4, 5], weight=3)
+    builder.add_net([1, 5])
+    builder.set_cell_weights([1, 2, 3, 4, 5, 6])
+    hg = builder.build()
+
+    view = hg.induced([5, 1, 2, 3])
+    assert isinstance(view, HypergraphView)
+    assert view.cells().tolist() == [1, 2, 3, 5]
+    assert view.net_ids.tolist() == [0, 1, 2, 3]
+    assert view.num_nets == 4
+    assert view.num_pins == 8
+    assert view.net(0).tolist() == [1, 2]
+    assert view.net(2).tolist() == [3, 5]
+    assert view.net_weights.tolist() == [2, 1, 3, 1]
+    assert view.cell_weight(5) == 6
+
+    view = view.induced([1, 2, 4])
+    assert view.cells().tolist() == [1, 2]
+    assert view.net_ids.tolist() == [0]
+    assert [(n, cells.tolist(), w) for n, cells, w in view.nets()] == [(0, [1, 2], 2)]
+
+    assert hg.induced([0, 4]).num_nets == 0
+    assert hg.induced([0, 4], min_pins=1).num_nets == 2
+
+
+def test_cut():
+    builder = HypergraphBuilder(num_cells=6)
+    builder.add_net([0, 1, 2])
+    builder.add_net([2, 3], weight=3)
+    builder.add_net([4, 5])
+    hg = builder.build()
+    assert hg.cut([0, 0, 0, 0, 1, 1]) == 0
+    assert hg.cut([0, 0, 1, 1, 1, 1]) == 1
+    assert hg.cut([0, 0, 0, 1, 1, 0]) == 4
+    assert builder.build().cut(np.zeros(6, dtype=np.int8)) == 0
+    assert HypergraphBuilder(num_cells=2).build().cut([0, 1]) == 0
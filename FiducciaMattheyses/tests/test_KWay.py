@@ -0,0 +1,45 @@
+import numpy as np
+from .. Benchmark import random_hypergraph
+from .. Evaluate import evaluate
+from .. Hypergraph import HypergraphBuilder
+from .. KWay import recursive_bisection, quotient, matching, refine
+
+__author__ = 'gm'
+
+
+def test_quotient():
+    builder = HypergraphBuilder(num_cells=6)
+    for net in ([0, 1], [1, 2], [2, 3, 4], [4, 5], [0, 5]):
+        builder.add_net(net)
+    hg = builder.build()
+    labels = np.array([0, 0, 1, 1, 2, 3])
+    matrix = quotient(hg, labels, 4)
+    assert matrix.tolist() == [[0, 1, 0, 1], [1, 0, 1, 0], [0, 1, 0, 1], [1, 0, 1, 0]]
+    assert matching(matrix) == [(0, 1), (2, 3)]
+    assert matching(matrix, {(0, 1)}) == [(0, 3), (1, 2)]
+
+
+def test_recursive_bisection():
+    hg = random_hypergraph(400, 600, seed=3)
+    labels = recursive_bisection(hg, 5, seed=1)
+    sizes = np.bincount(labels, minlength=5)
+    assert len(sizes) == 5
+    assert all(abs(int(size) - 80) <= 4 for size in sizes)
+
+
+def test_refine():
+    hg = random_hypergraph(600, 900, seed=5)
+    rng = np.random.default_rng(2)
+    labels = rng.permutation(np.arange(600) % 4)
+    given = labels.copy()
+    before = evaluate(hg, labels, k=4).connectivity
+    serial = refine(hg, labels, k=4, seed=1)
+    assert serial.connectivity == evaluate(hg, serial.labels, k=4).connectivity
+    assert serial.connectivity < before
+    assert serial.improved > 0
+    assert np.bincount(serial.labels, minlength=4).max() <= 155  # 3% over 150
+    assert np.array_equal(labels, given)  # the labels given are not changed
+
+    pooled = refine(hg, labels, k=4, processes=2, seed=1)
+    assert np.array_equal(pooled.labels, serial.labels)
+    assert pooled.rounds == serial.rounds
@@ -0,0 +1,169 @@
+import random
+import numpy as np
+from .. FiducciaMattheyses import FiducciaMattheyses
+from .. Hypergraph import HypergraphBuilder
+from .. import Kernel
+from . test_FiducciaMattheyses import assert_block, assert_gains
+
+__author__ = 'gm'
+
+
+def random_hypergraph(seed: int, size: int = 300):
+    rnd = random.Random(seed)
+    builder = HypergraphBuilder(num_cells=size)
+    for i in range(size):
+        builder.add_net(rnd.sample(range(size), rnd.randint(2, 5)), weight=rnd.randint(1, 3))
+    builder.set_cell_weights([rnd.randint(1, 2) for i in range(size)])
+    return builder.build()
+
+
+def test_kernel_matches_python():
+    for seed in range(3):
+        hg = random_hypergraph(seed)
+
+        fm = FiducciaMattheyses()
+        fm.input_hypergraph(hg)
+        blockA, blockB = fm.find_mincut()
+
+        fm_jit = FiducciaMattheyses(jit=True)
+        fm_jit.input_hypergraph(hg)
+        blockA_jit, blockB_jit = fm_jit.find_mincut()
+
+        assert sorted(blockA) == sorted(blockA_jit)
+        assert sorted(blockB) == sorted(blockB_jit)
+        assert fm.cutset == fm_jit.cutset
+        assert_block(fm_jit.blockA, fm_jit)
+        assert_block(fm_jit.blockB, fm_jit)
+        assert_gains(fm_jit)
+
+        # the kernel also runs uncompiled, check it directly in case numba is not installed
+        fm_arrays = FiducciaMattheyses()
+        fm_arrays.input_hypergraph(hg)
+        cells, cell_ptr, cell_nets, net_ptr, net_pins, cell_w, net_w = Kernel.arrays_from(fm_arrays)
+        large = np.zeros(len(net_w), dtype=np.bool_)
+        side, cutset, passes, moves, cutsets, pass_moves = Kernel.find_mincut(
+            cell_ptr, cell_nets, net_ptr, net_pins, cell_w, net_w, large, fm_arrays.pmax, fm_arrays.smax, 0.5, False,
+            np.zeros(0, dtype=np.int64))
+        assert cutset == fm.cutset
+        assert cutsets.tolist() == [c for c, seconds in fm.history] == [c for c, seconds in fm_jit.history]
+        assert pass_moves.sum() == moves
+        assert passes == fm.passes == fm_jit.passes
+        assert moves == fm.moves == fm_jit.moves
+        assert sorted(cells[i].n for i in np.flatnonzero(side == 1)) == sorted(blockB)
+
+
+def test_kernel_matches_python_wide():
+    from .. Benchmark import random_hypergraph as local_hypergraph
+    graphs = []
+    for seed in range(40):
+        graphs.append(random_hypergraph(seed, size=20 + seed % 5 * 30))
+        graphs.append(local_hypergraph(45 + seed % 4 * 80, 60 + seed % 4 * 120, seed=seed))
+    for hg in graphs:
+        fm = FiducciaMattheyses()
+        fm.input_hypergraph(hg)
+        blockA, blockB = fm.find_mincut()
+        fm_jit = FiducciaMattheyses(jit=True)
+        fm_jit.input_hypergraph(hg)
+        blockA_jit, blockB_jit = fm_jit.find_mincut()
+        assert sorted(blockA) == sorted(blockA_jit) and sorted(blockB) == sorted(blockB_jit)
+        assert fm.cutset == fm_jit.cutset
+        assert fm.passes == fm_jit.passes
+
+
+def test_kernel_lifo():
+    hg = random_hypergraph(3)
+
+    fm = FiducciaMattheyses(policy="lifo")
+    fm.input_hypergraph(hg)
+    blockA, blockB = fm.find_mincut()
+
+    fm_jit = FiducciaMattheyses(jit=True, policy="lifo")
+    fm_jit.input_hypergraph(hg)
+    blockA_jit, blockB_jit = fm_jit.find_mincut()
+
+    assert sorted(blockB) == sorted(blockB_jit)
+    assert fm.cutset == fm_jit.cutset
+
+
+def test_kernel_seed():
+    hg = random_hypergraph(4)
+    results = []
+    for jit in (False, True):
+        fm = FiducciaMattheyses(jit=jit, seed=9, r=0.4)
+        fm.input_hypergraph(hg)
+        blockA, blockB = fm.find_mincut()
+        results.append((sorted(blockB), fm.cutset, fm.passes, fm.moves))
+        fm.reset()
+        assert sorted(fm.find_mincut()[1]) == sorted(blockB)
+    assert results[0] == results[1]
+
+
+def test_kernel_net_threshold():
+    hg = random_hypergraph(5)
+    results = []
+    for jit in (False, True):
+        fm = FiducciaMattheyses(jit=jit, net_threshold=3)
+        fm.input_hypergraph(hg)
+        blockA, blockB = fm.find_mincut()
+        results.append((sorted(blockB), fm.cutset, fm.large_cut))
+    assert results[0] == results[1]
+
+
+def test_fallback(monkeypatch):
+    monkeypatch.setattr(Kernel, "AVAILABLE", False)
+    hg = random_hypergraph(7, size=100)
+
+    fm = FiducciaMattheyses(jit=True)
+    fm.input_hypergraph(hg)
+    blockA, blockB = fm.find_mincut()
+
+    assert len(fm.history) == fm.passes  # the python engine ran, the kernel keeps no history
+    assert sorted(blockA + blockB) == list(range(100))
+
+
+def test_arrays_from_hypergraph():
+    hg = random_hypergraph(5, size=200)
+    builder = HypergraphBuilder(num_cells=hg.num_cells + 3)  # three cells without nets
+    for n, cells, weight in hg.nets():
+        builder.add_net(cells.tolist(), weight)
+    hg = builder.build()
+    for hypergraph in (hg, hg.induced(range(0, 200, 2))):
+        for keep_isolated in (True, False):
+            for reorder in (None, "rcm"):
+                fm = FiducciaMattheyses(reorder=reorder, net_threshold=4)
+                fm.input_hypergraph(hypergraph, keep_isolated)
+                cells, cell_ptr, cell_nets, net_ptr, net_pins, cell_w, net_w = Kernel.arrays_from(fm)
+                arrays = Kernel.arrays_from_hypergraph(hypergraph, keep_isolated, reorder, 4)
+                assert arrays.cells.tolist() == [cell.n for cell in cells]
+                for built, direct in ((cell_ptr, arrays.cell_ptr), (cell_nets, arrays.cell_nets),
+                                      (net_ptr, arrays.net_ptr), (net_pins, arrays.net_pins),
+                                      (cell_w, arrays.cell_w), (net_w, arrays.net_w)):
+                    assert built.tolist() == direct.tolist()
+                assert arrays.large.tolist() == [net.large for net in fm.net_array.values()]
+                assert (arrays.pmax, arrays.smax) == (fm.pmax, fm.smax)
+
+
+def test_deferred_objects():
+    hg = random_hypergraph(6)
+    fm = FiducciaMattheyses(jit=True, net_threshold=4)
+    fm.input_hypergraph(hg)
+    assert fm.deferred == Kernel.AVAILABLE
+    labels = fm.find_mincut(as_labels=True)
+    assert fm.deferred == Kernel.AVAILABLE  # the partition is kept as labels until the objects are used
+    cutset = fm.cutset
+    assert len(fm.history) == fm.passes
+    assert fm.history[-1][0] == cutset
+
+    reference = FiducciaMattheyses(net_threshold=4)
+    reference.input_hypergraph(hg)
+    reference.find_mincut()
+    assert reference.labels().tolist() == labels.tolist()
+    assert reference.large_cut == fm.large_cut
+
+    assert len(fm.cell_array) == hg.num_cells  # built on first use, with the partition found applied
+    assert not fm.deferred
+    assert fm.cutset == cutset
+    assert fm.labels().tolist() == labels.tolist()
+    assert_block(fm.blockA, fm)
+    assert_block(fm.blockB, fm)
+    assert_gains(fm)
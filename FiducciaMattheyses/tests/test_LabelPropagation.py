@@ -0,0 +1,42 @@
+import numpy as np
+from .. Benchmark import random_hypergraph
+from .. Hypergraph import HypergraphBuilder
+from .. LabelPropagation import refine
+
+__author__ = 'gm'
+
+
+def test_refine():
+    hg = random_hypergraph(2000, 3000, seed=6)
+    labels = np.random.default_rng(3).permutation(np.arange(2000) % 2).astype(np.int8)
+    start = hg.cut(labels)
+    serial = refine(hg, labels)
+    assert serial.cutset == hg.cut(serial.labels)
+    assert serial.cutset < start / 2
+    assert serial.moves > 0
+    assert abs(int((serial.labels == 0).sum()) - 1000) <= 1  # the balance criterion of FiducciaMattheyses
+    assert np.array_equal(labels, np.random.default_rng(3).permutation(np.arange(2000) % 2))  # not changed
+
+    pooled = refine(hg, labels, processes=2)
+    assert np.array_equal(pooled.labels, serial.labels)
+    assert (pooled.cutset, pooled.rounds, pooled.moves) == (serial.cutset, serial.rounds, serial.moves)
+
+    polished = refine(hg, labels, polish=True)
+    assert polished.cutset == hg.cut(polished.labels)
+    assert polished.cutset <= serial.cutset
+    assert abs(int((polished.labels == 0).sum()) - 1000) <= 1
+
+
+def test_refine_balance():
+    builder = HypergraphBuilder(num_cells=8)
+    for net in ([0, 1], [1, 2], [2, 3], [4, 5], [5, 6], [6, 7], [3, 4]):
+        builder.add_net(net, weight=2)
+    builder.set_cell_weights([1, 1, 1, 1, 1, 1, 1, 3])
+    hg = builder.build()
+    result = refine(hg, [0] * 7 + [1], r=0.5)  # block A far too heavy
+    assert abs(int(np.array([1, 1, 1, 1, 1, 1, 1, 3])[result.labels == 0].sum()) - 5) <= 3
+    assert result.cutset == hg.cut(result.labels) == 2
+
+    unchanged = refine(hg, [0, 0, 0, 0, 1, 1, 1, 1], r=0.5)
+    assert unchanged.moves == 0
+    assert unchanged.cutset == 2
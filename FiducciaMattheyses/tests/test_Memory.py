@@ -0,0 +1,56 @@
+import tracemalloc
+from .. Benchmark import random_hypergraph
+from .. Engines import KERNEL
+from .. FiducciaMattheyses import FiducciaMattheyses
+from .. Memory import footprint, estimate, report, PeakMemory
+
+__author__ = 'gm'
+
+
+def test_footprint():
+    hg = random_hypergraph(2000, 3000, seed=1)
+    fm = FiducciaMattheyses()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    fm.input_hypergraph(hg)
+    built = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    measured = footprint(fm)
+    assert measured.total == sum(measured[:5])
+    assert measured.snapshots == 0
+    assert abs(measured.total - measured.arrays - built) < 0.1 * built  # the hypergraph was built before
+
+    predicted = estimate(hg.num_cells, hg.num_nets, hg.num_pins)
+    for name in ("objects", "sets", "buckets", "arrays", "total"):
+        assert abs(getattr(predicted, name) - getattr(measured, name)) <= 0.15 * getattr(measured, name)
+
+    fm.take_snapshot()
+    snapshots = footprint(fm).snapshots
+    assert abs(estimate(hg.num_cells, hg.num_nets, hg.num_pins, snapshots=True).snapshots - snapshots) <= \
+        0.15 * snapshots
+
+    kernel = FiducciaMattheyses(engine=KERNEL)
+    kernel.input_hypergraph(hg)
+    assert kernel.deferred
+    assert footprint(kernel).objects == footprint(kernel).sets == 0
+    assert kernel.deferred  # measuring does not build the objects
+    assert estimate(hg.num_cells, hg.num_nets, hg.num_pins, engine=KERNEL).total > footprint(kernel).arrays
+    assert estimate(0, 0, 0).total == 0
+
+
+def test_peak_memory():
+    with PeakMemory() as peak:
+        data = [list(range(100)) for i in range(100)]
+        del data
+    assert peak.bytes > 100 * 100 * 8
+    assert not tracemalloc.is_tracing()
+
+    hg = random_hypergraph(500, 750, seed=2)
+    fm = FiducciaMattheyses(track_memory=True)
+    fm.input_hypergraph(hg)
+    assert fm.peak_memory is None
+    fm.find_mincut()
+    assert fm.peak_memory > 0
+    assert "peak" in report(fm)
+    fm.reset()
+    assert fm.peak_memory is None
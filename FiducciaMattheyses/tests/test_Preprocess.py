@@ -0,0 +1,107 @@
+import random
+import numpy as np
+from .. Benchmark import random_hypergraph
+from .. FiducciaMattheyses import FiducciaMattheyses
+from .. Hypergraph import HypergraphBuilder
+from .. Preprocess import merge_duplicate_nets, contract_pendants, connected_components, reduce, partition
+
+__author__ = 'gm'
+
+
+def test_merge_duplicate_nets():
+    builder = HypergraphBuilder(num_cells=5)
+    builder.add_net([0, 1, 2])
+    builder.add_net([3])
+    builder.add_net([2, 1, 0], weight=2)
+    builder.add_net([3, 4])
+    builder.add_net([0, 1, 2])
+    hg = merge_duplicate_nets(builder.build())
+    assert hg.num_nets == 2
+    assert hg.net(0).tolist() == [0, 1, 2]
+    assert hg.net(1).tolist() == [3, 4]
+    assert hg.net_weights.tolist() == [4, 1]
+
+    builder = HypergraphBuilder(num_cells=3)
+    builder.add_net([0, 1])
+    builder.add_net([1, 2])
+    assert merge_duplicate_nets(builder.build()).net_weights is None
+
+
+def test_contract_pendants():
+    builder = HypergraphBuilder(num_cells=8)
+    builder.add_net([0, 1, 2])
+    builder.add_net([2, 3])  # 3 - 4 - 5 is a chain hanging off 2
+    builder.add_net([3, 4])
+    builder.add_net([4, 5])
+    builder.add_net([6, 7])  # a component of two cells
+    hg, cell_map = contract_pendants(builder.build())
+    assert hg.num_cells == 4
+    assert hg.num_nets == 1
+    assert cell_map[3] == cell_map[4] == cell_map[5] == cell_map[2]
+    assert cell_map[6] == cell_map[7]
+    assert hg.cell_weights[cell_map[2]] == 4
+    assert hg.cell_weights[cell_map[6]] == 2
+    assert hg.cell_weights.sum() == 8
+
+    hg, cell_map = contract_pendants(builder.build(), max_cell_weight=2)
+    assert hg.cell_weights.max() <= 2
+    assert hg.cell_weights.sum() == 8
+
+
+def test_connected_components():
+    builder = HypergraphBuilder(num_cells=7)
+    builder.add_net([5, 1])
+    builder.add_net([1, 3, 4])
+    builder.add_net([2, 6])
+    components = connected_components(builder.build())
+    assert components.tolist() == [0, 1, 2, 1, 1, 1, 2]
+
+
+def fragmented_hypergraph(seed: int):
+    rnd = random.Random(seed)
+    builder = HypergraphBuilder()
+    offset = 0
+    for k in range(20):
+        n = rnd.randint(5, 120)
+        for i in range(int(n * 1.5)):
+            builder.add_net([offset + x for x in rnd.sample(range(n), rnd.randint(2, 3))])
+        for i in range(n // 5):
+            builder.add_net([offset + rnd.randrange(n), offset + n + i])  # pendant cells
+        offset += n + n // 5
+    builder.add_net([0, 1])  # a duplicate, possibly
+    builder.num_cells = offset + 50  # isolated cells
+    return builder.build()
+
+
+def test_reduce():
+    hg = fragmented_hypergraph(1)
+    reduction = reduce(hg)
+    assert reduction.contracted_cells > 0
+    assert reduction.hypergraph.num_cells == hg.num_cells - reduction.contracted_cells
+    assert reduction.hypergraph.cell_weights.sum() == hg.num_cells
+    # any partition of the reduced hypergraph has the same cutset once expanded
+    rnd = np.random.default_rng(0)
+    for i in range(5):
+        labels = rnd.integers(0, 2, reduction.hypergraph.num_cells)
+        assert reduction.hypergraph.cut(labels) == hg.cut(labels[reduction.cell_map])
+
+
+def test_partition():
+    for hg in (fragmented_hypergraph(2), random_hypergraph(600, 700, seed=3)):
+        result = partition(hg)
+        assert len(result.labels) == hg.num_cells
+        assert result.cutset == hg.cut(result.labels)
+        A = int((result.labels == 0).sum())
+        assert abs(A - 0.5 * hg.num_cells) <= hg.num_cells // 100 + 1
+
+    # the components of a fragmented hypergraph are packed without cutting any
+    hg = fragmented_hypergraph(2)
+    result = partition(hg)
+    assert result.split == 0 and result.cutset == 0
+    fm = FiducciaMattheyses()
+    fm.input_hypergraph(hg)
+    fm.find_mincut()
+    assert fm.cutset > 0
+
+    result = partition(fragmented_hypergraph(4), r=0.3, policy="lifo")
+    assert abs(int((result.labels == 0).sum()) - 0.3 * len(result.labels)) <= len(result.labels) // 100 + 1
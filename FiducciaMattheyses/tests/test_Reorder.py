@@ -0,0 +1,64 @@
+import numpy as np
+from .. Benchmark import random_hypergraph, conformance
+from .. FiducciaMattheyses import FiducciaMattheyses
+from .. Hypergraph import Hypergraph, HypergraphBuilder
+from .. Reorder import cell_order, net_order, span, BFS, RCM
+from .. import Engines
+
+__author__ = 'gm'
+
+
+def scrambled(hypergraph: Hypergraph, seed: int) -> Hypergraph:
+    """
+    the same hypergraph with cells renumbered at random
+    """
+    permutation = np.random.default_rng(seed).permutation(hypergraph.num_cells)
+    return Hypergraph(hypergraph.num_cells, hypergraph.net_ptr, permutation[hypergraph.pins])
+
+
+def test_cell_order():
+    builder = HypergraphBuilder(num_cells=7)
+    builder.add_net([0, 4])
+    builder.add_net([4, 2, 6])
+    builder.add_net([6, 1])
+    hg = builder.build()
+    assert cell_order(hg, BFS).tolist() == [0, 4, 2, 6, 1, 3, 5]
+    assert cell_order(hg, RCM).tolist() == [1, 6, 2, 4, 0, 3, 5]
+    assert net_order(hg, np.array([1, 6, 2, 4, 0, 3, 5])).tolist() == [2, 1, 0]
+
+    view = hg.induced([4, 2, 6, 1])
+    assert cell_order(view, BFS).tolist() == [1, 6, 4, 2]
+
+
+def test_span():
+    hg = scrambled(random_hypergraph(2000, 3000, seed=1), 1)
+    natural = span(hg, np.arange(hg.num_cells))
+    for method in (BFS, RCM):
+        order = cell_order(hg, method)
+        assert sorted(order.tolist()) == list(range(hg.num_cells))
+        assert span(hg, order) < natural / 4
+
+
+def test_reorder():
+    hg = scrambled(random_hypergraph(400, 600, seed=2), 2)
+    fm = FiducciaMattheyses(reorder=RCM)
+    fm.input_hypergraph(hg)
+    assert list(fm.cell_array) == cell_order(hg, RCM).tolist()
+    assert list(fm.net_array) == net_order(hg, cell_order(hg, RCM)).tolist()
+    blockA, blockB = fm.find_mincut()
+    # the output uses the numbers of the input
+    labels = np.zeros(hg.num_cells, dtype=np.int8)
+    labels[blockB] = 1
+    assert hg.cut(labels) == fm.cutset
+    assert sorted(blockA + blockB) == list(range(hg.num_cells))
+
+    for engine in Engines.available():
+        conformance(hg, engine, reorder=BFS)
+
+    # cells without nets are dropped unless kept, as without reordering
+    builder = HypergraphBuilder(num_cells=5)
+    builder.add_net([3, 1])
+    builder.add_net([1, 4])
+    fm = FiducciaMattheyses(reorder=RCM)
+    fm.input_hypergraph(builder.build(), keep_isolated=False)
+    assert sorted(fm.cell_array) == [1, 3, 4]
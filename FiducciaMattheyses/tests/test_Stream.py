@@ -0,0 +1,43 @@
+import numpy as np
+from .. Benchmark import random_hypergraph
+from .. Hypergraph import HypergraphBuilder
+from .. Stream import assign, partition, LDG, FENNEL
+
+__author__ = 'gm'
+
+
+def test_assign():
+    builder = HypergraphBuilder(num_cells=9)
+    for net in ([0, 1, 2], [1, 2, 3], [4, 5, 6], [5, 6, 7]):
+        builder.add_net(net)
+    hg = builder.build()
+    nets = [(cells.tolist(), weight) for n, cells, weight in hg.nets()]
+    for method in (LDG, FENNEL):
+        labels, degree = assign(nets, hg.num_cells, method=method)
+        assert degree.tolist() == [1, 2, 2, 1, 1, 2, 2, 1, 0]
+        assert set(labels.tolist()) == {0, 1}
+        assert abs(int((labels == 0).sum()) - 4.5) <= 1.5  # every block stays below 5% over its target plus a cell
+
+    weighted, degree = assign(nets, hg.num_cells, r=0.25, cell_weights=[4, 1, 1, 1, 1, 1, 1, 1, 1])
+    assert abs(int(np.array([4, 1, 1, 1, 1, 1, 1, 1, 1])[weighted == 0].sum()) - 3) <= 4
+
+
+def test_partition():
+    hg = random_hypergraph(3000, 4500, seed=7)
+    # nets listed by their lowest cell, as a stream of a placed circuit would list them
+    nets = sorted(((cells.tolist(), weight) for n, cells, weight in hg.nets()), key=lambda net: min(net[0]))
+    greedy = partition(nets, hg.num_cells, refine=False, window=3000)
+    assert greedy.cutset == hg.cut(greedy.labels)
+    assert greedy.refined == 0
+    assert greedy.windows == 5
+
+    refined = partition(nets, hg.num_cells, window=3000)
+    assert refined.cutset == hg.cut(refined.labels)
+    assert refined.refined > 0
+    assert refined.cutset < greedy.cutset
+    assert refined.sizeA + refined.sizeB == hg.num_cells
+    assert refined.sizeA == int((refined.labels == 0).sum())
+    assert abs(refined.sizeA - 1500) <= max(abs(greedy.sizeA - 1500), 1)
+
+    random_labels = np.random.default_rng(0).integers(0, 2, hg.num_cells)
+    assert greedy.cutset < hg.cut(random_labels)
@@ -0,0 +1,97 @@
+from .. FiducciaMattheyses import FiducciaMattheyses
+from .. Benchmark import random_hypergraph
+from .. Sweep import sweep, format_table, SweepResult
+from . test_FiducciaMattheyses import assert_block
+
+__author__ = 'gm'
+
+
+def test_sweep():
+    hg = random_hypergraph(200, 300, seed=2)
+    fm = FiducciaMattheyses()
+    fm.input_hypergraph(hg)
+    cells = fm.cell_array[0]
+
+    results = sweep(fm, ratios=[0.3, 0.5], seeds=[None, 1])
+    assert [(res.r, res.seed) for res in results] == [(0.3, None), (0.3, 1), (0.5, None), (0.5, 1)]
+    for res in results:
+        assert isinstance(res, SweepResult)
+        assert res.sizeA + res.sizeB == 200
+        assert res.imbalance <= fm.smax
+        assert res.cutset >= 0
+    assert fm.cell_array[0] is cells  # nothing was rebuilt
+    assert_block(fm.blockA, fm)
+    assert_block(fm.blockB, fm)
+    assert len(format_table(results).splitlines()) == 5
+
+    # the same run on a fresh instance gives the same result
+    fresh = FiducciaMattheyses(seed=1, r=0.3)
+    fresh.input_hypergraph(hg)
+    fresh.find_mincut()
+    assert fresh.cutset == results[1].cutset
+
+    parallel = sweep(fm, ratios=[0.3, 0.5], seeds=[None, 1], processes=2)
+    assert [(res.r, res.seed, res.cutset) for res in parallel] == [(res.r, res.seed, res.cutset) for res in results]
+
+
+def test_reset():
+    hg = random_hypergraph(100, 150, seed=4)
+    fm = FiducciaMattheyses(seed=3)
+    fm.input_hypergraph(hg)
+    first = fm.find_mincut()
+
+    fm.reset()
+    assert fm.blockB.size == 0
+    assert fm.cutset == 0
+    assert fm.moves == 0
+    assert all(not cell.locked for cell in fm.cell_array.values())
+    assert_block(fm.blockA, fm)
+    assert fm.find_mincut() == first
+
+    fm.reset(r=0.25)
+    fm.find_mincut()
+    assert abs(fm.blockA.size - 25) <= fm.smax
+
+
+def test_reset_clears_run(tmp_path):
+    from .. Cache import PartitionCache
+    hg = random_hypergraph(100, 150, seed=5)
+    cache = PartitionCache(str(tmp_path))
+    FiducciaMattheyses(cache=cache, net_threshold=3).partition(hg)
+
+    fm = FiducciaMattheyses(cache=cache, net_threshold=3)
+    fm.partition(hg)
+    assert fm.cache_hit and fm.blockA is None  # answered by the cache, nothing was built
+    results = sweep(fm, ratios=[0.5])
+    fresh = FiducciaMattheyses(net_threshold=3)
+    fresh.input_hypergraph(hg)
+    fresh.find_mincut()
+    assert results[0].cutset == fresh.cutset
+    assert not fm.cache_hit
+    assert fm.large_cut == fresh.large_cut
+
+    fm.stopped = True
+    fm.reset()
+    assert (fm.large_cut, fm.stopped, fm.passes, fm.history) == (0, False, 0, [])
+
+    kernel = FiducciaMattheyses(jit=True, net_threshold=3)
+    kernel.input_hypergraph(hg)
+    kernel.find_mincut()
+    kernel.reset()
+    assert kernel.labels().tolist() == [0] * hg.num_cells
+    kernel.find_mincut()
+    assert kernel.cutset == fresh.cutset
+
+
+def test_sweep_mapped(tmp_path):
+    from .. Formats import write_binary
+    hg = random_hypergraph(200, 300, seed=6)
+    path = str(tmp_path / "mapped.fmhg")
+    write_binary(path, hg)
+    fm = FiducciaMattheyses()
+    fm.input_binary(path)
+    assert fm.hypergraph.path == path  # workers map the file instead of receiving the arrays
+    results = sweep(fm, ratios=[0.4, 0.5], processes=2)
+    plain = FiducciaMattheyses()
+    plain.input_hypergraph(hg)
+    assert [res.cutset for res in results] == [res.cutset for res in sweep(plain, ratios=[0.4, 0.5])]
@@ -0,0 +1,73 @@
+import pytest
+from .. Benchmark import random_hypergraph, time_selection
+from .. FiducciaMattheyses import FiducciaMattheyses
+from .. Trace import Trace
+from .. Util import LIFO
+
+__author__ = 'gm'
+
+
+def test_record(tmp_path):
+    hg = random_hypergraph(300, 450, seed=7)
+    trace = Trace()
+    fm = FiducciaMattheyses(trace=trace)
+    fm.input_hypergraph(hg)
+    fm.find_mincut()
+
+    records = trace.records
+    assert len(trace) == len(records)
+    passes = trace.by_pass()
+    assert len(passes) in (fm.passes, fm.passes + 1)  # the last pass may make no move
+    assert sum(len(moves) for moves in passes[1:]) == fm.moves
+    assert all(side == 0 for n, cell, side, gain, cutset in passes[0])  # the initial pass empties block A
+    for moves in passes:
+        assert len(set(move[1] for move in moves)) == len(moves)  # a cell moves at most once per pass
+
+    path = str(tmp_path / "run.trace")
+    trace.save(path)
+    loaded = Trace.load(path)
+    assert (loaded.records == records).all()
+
+    data = open(path, "rb").read()
+    for name, content, message in (("other", b"NOTTRACE" + data[8:], "not a trace file"),
+                                   ("header", data[:12], "number of records is missing"),
+                                   ("short", data[:-1], "truncated trace file")):
+        bad = str(tmp_path / name)
+        with open(bad, "wb") as f:
+            f.write(content)
+        with pytest.raises(ValueError, match=message):
+            Trace.load(bad)
+    wrong = records.copy()
+    wrong["side"][1] = 2
+    Trace(wrong).save(path)
+    with pytest.raises(ValueError, match="record 1 has side 2"):
+        Trace.load(path)
+
+
+def test_replay():
+    hg = random_hypergraph(300, 450, seed=8)
+    for settings in ({}, {"policy": LIFO, "lookahead": 2}, {"seed": 3}):
+        trace = Trace()
+        fm = FiducciaMattheyses(trace=trace, **settings)
+        fm.input_hypergraph(hg)
+        expected = fm.find_mincut()
+
+        replayed = Trace()
+        fm2 = FiducciaMattheyses(replay=trace, trace=replayed, **settings)
+        fm2.input_hypergraph(hg)
+        assert fm2.find_mincut() == expected
+        assert fm2.cutset == fm.cutset
+        assert fm2.passes == fm.passes
+        assert (replayed.records == trace.records).all()
+
+    # replaying a trace of another graph diverges
+    fm = FiducciaMattheyses(replay=trace)
+    fm.input_hypergraph(random_hypergraph(300, 450, seed=9))
+    with pytest.raises(ValueError, match="replay diverged"):
+        fm.find_mincut()
+
+
+def test_time_selection():
+    recording, replaying, trace = time_selection(random_hypergraph(200, 300, seed=10))
+    assert recording > 0 and replaying > 0
+    assert len(trace) > 0
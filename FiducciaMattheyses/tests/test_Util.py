@@ -1,3 +1,4 @@
+import random
 from .. Util import *
 from .. FiducciaMattheyses import FiducciaMattheyses
 from . test_FiducciaMattheyses import assert_block
@@ -341,3 +342,93 @@ def test_snapshots():
     assert_block(fm.blockB, fm)
 
     assert True
+
+
+def test_bucket_policies():
+    pmax = 2
+    c1 = Cell(0, "A")
+    c2 = Cell(1, "A")
+    c3 = Cell(2, "A")
+
+    fifo = BucketArray(pmax)
+    lifo = BucketArray(pmax, LIFO)
+    rand = BucketArray(pmax, RANDOM, random.Random(1))
+    for ba in (fifo, lifo, rand):
+        for c in (c1, c2, c3):
+            c.gain = 1
+            ba.add_cell(c)
+
+    assert fifo.get_candidate_base_cell() == c1
+    assert lifo.get_candidate_base_cell() == c3
+    assert all(rand.get_candidate_base_cell() in (c1, c2, c3) for i in range(10))
+
+
+def test_lookahead_gains():
+    pmax = 5
+    fm = FiducciaMattheyses(lookahead=3)
+    fm.blockA = Block("A", pmax, fm)
+    fm.blockB = Block("B", pmax, fm)
+
+    c1 = Cell(0, "A")
+    c2 = Cell(1, "A")
+    c3 = Cell(2, "A")
+    n1 = Net(0)  # c1 and c2, both in A
+    n2 = Net(1)  # c2 and c3, both in A
+    for n, cells in ((n1, (c1, c2)), (n2, (c2, c3))):
+        for c in cells:
+            n.add_cell(c)
+            c.add_net(n)
+        n.blockA_ref = fm.blockA
+        n.blockB_ref = fm.blockB
+    #
+    # this happens automatically in input routine, do it manually here
+    #
+    for c in (c1, c2, c3):
+        c.block = fm.blockA
+
+    # every net has binding number 2 on A and 0 on B
+    assert c1.lookahead_gains(3) == (1, 0)
+    assert c2.lookahead_gains(3) == (2, 0)
+    assert c2.lookahead_gains(2) == (2,)
+
+    c1.gain = -1
+    c2.gain = -1
+    c3.gain = -1
+    ba = fm.blockA.bucket_array
+    assert ba.lookahead == 3
+    ba.add_cell(c1)
+    ba.add_cell(c2)
+    ba.add_cell(c3)
+    assert ba.get_candidate_base_cell() == c2
+
+    c1.lock()  # n1 now has a locked cell in A, its binding number there is infinite
+    assert c2.lookahead_gains(3) == (1, 0)
+
+
+def test_yank_once(monkeypatch):
+    from .. Hypergraph import HypergraphBuilder
+    builder = HypergraphBuilder(num_cells=5)
+    for net in ([0, 1], [0, 1, 2], [0, 1, 3], [0, 2], [3, 4]):
+        builder.add_net(net)
+    fm = FiducciaMattheyses()
+    fm.input_hypergraph(builder.build())
+    fm.apply_partition([0, 0, 0, 0, 1])
+    ba = fm.blockA.bucket_array
+    yanked = []
+    yank_cell = BucketArray.yank_cell
+
+    def counted(bucket_array, cell):
+        yanked.append(cell.n)
+        yank_cell(bucket_array, cell)
+
+    monkeypatch.setattr(BucketArray, "yank_cell", counted)
+    fm.blockA.move_cell(fm.cell_array[0])
+    assert sorted(yanked) == [1, 2, 3]  # 1 and 2 are hit through more than one net, but yanked once
+    assert yanked == [3, 1, 2]  # in the order of the last change of their gain: net [0, 2] comes after [0, 1]
+    assert ba.pending is None and fm.blockB.bucket_array.pending is None
+    for cell in fm.cell_array.values():
+        if not cell.locked:
+            gain = cell.gain
+            cell.compute_gain()
+            assert cell.gain == gain
+            assert cell in cell.block.bucket_array[gain]
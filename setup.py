@@ -11,5 +11,14 @@ setup(name='fiduccia_mattheyses',
       install_requires=[
           'numpy',
       ],
+      extras_require={
+          'jit': ['numba'],
+      },
+      entry_points={
+          'console_scripts': [
+              'fm-partition = FiducciaMattheyses.Cli:main',
+              'fm-worker = FiducciaMattheyses.Cluster:main',
+          ],
+      },
       zip_safe=False)
 